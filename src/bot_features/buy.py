@@ -9,41 +9,113 @@
 
 """
 
-import datetime
 import time
 
-from pprint                                 import pprint
-from bot_features.low_level.kraken_enums    import *
-from bot_features.low_level.kraken_bot_base import KrakenBotBase
-from util.globals                           import G
-from util.colors                            import Color
-from bot_features.dca                       import DCA
-from bot_features.sell                      import Sell
-from bot_features.tradingview               import TradingView
-from my_sql.sql                             import SQL
+from concurrent.futures                       import ThreadPoolExecutor
+from queue                                    import Queue
+from threading                                import Lock, Thread
+from pprint                                   import pprint
+from bot_features.low_level.kraken_enums      import *
+from bot_features.low_level.kraken_bot_base   import KrakenBotBase
+from bot_features.low_level.kraken_websocket  import FillEvent, KrakenMarketData, KrakenPrivateFeed, get_market_data
+from bot_features.low_level.kraken_order_book import get_order_books
+from util.globals                             import G
+from util.colors                              import Color
+from bot_features.dca                         import DCA
+from bot_features.sell                        import Sell
+from bot_features.symbol_scheduler            import SymbolScheduler
+from bot_features.price_trigger_index         import PriceTriggerIndex
+from bot_features.tradingview                 import TradingView, get_signal_cache
+from bot_features.indicator_engine            import IndicatorEngine
+from my_sql.sql                               import SQL
+from my_sql.sql_pool                          import get_sql_pools
+from my_sql.sql_migrations                    import SQLMigrations
 
 
 class Buy(KrakenBotBase, TradingView):
     def __init__(self, parameter_dict: dict) -> None:
         super().__init__(parameter_dict)
-        self.dca:          DCA   = None
-        self.sell:         Sell  = Sell(parameter_dict)
-        self.total_profit: float = 0.0
-        self.obo_txid:     str   = ""
+        self.sell:         Sell              = Sell(parameter_dict, self.transport)
+        self.total_profit: float             = 0.0
+        self.pair_dict:    dict              = {}
+        self.pair_locks:   dict              = {}
+        self.fills:        Queue             = Queue()
+        self.profit_lock:  Lock              = Lock()
+        self.private_feed: KrakenPrivateFeed = KrakenPrivateFeed(self.get_web_sockets_token)
+        self.scheduler:    SymbolScheduler   = SymbolScheduler()
+        self.triggers:     PriceTriggerIndex = PriceTriggerIndex()
+        self.timings:      dict              = {} # symbol -> [checks, seconds] since the last report
+        return
+
+    def __init_signal_source(self, market_data: KrakenMarketData) -> None:
+        """With Signal_.LOCAL, buy signals are computed from kraken's OHLC instead of asking TradingView, 1 minute candles of the buy set come over the websocket."""
+        if Signal_.SOURCE != Signal_.LOCAL:
+            return
+
+        engine = IndicatorEngine(lambda pairs, minutes: self.run_concurrently([self.aio.get_ohlc_data(pair, minutes) for pair in pairs], return_exceptions=True))
+        engine.watch(market_data, list(self.pair_dict.values()))
+        get_signal_cache().set_source(engine.recommend)
         return
 
     def __init_loop_variables(self) -> None:
         """Initialize variables for the buy_loop."""
-        self.kraken_assets_dict = self.get_asset_info()[Dicts.RESULT]
-        self.account_balance    = self.get_parsed_account_balance()
-        self.asset_pairs_dict   = self.get_all_tradable_asset_pairs()[Dicts.RESULT]
-        
+        # bring the database up to the latest schema before anything reads it, and warn about queries that scan whole tables
+        migrations = SQLMigrations(SQL())
+        migrations.migrate()
+        migrations.check()
+
+        # independent requests, so fetch them at the same time
+        assets, account_balance = self.run_concurrently([self.aio.get_asset_info(), self.aio.get_account_balance()])
+
+        self.kraken_assets_dict = assets[Dicts.RESULT]
+        self.account_balance    = self.parse_account_balance(account_balance)
+
+        G.symbols.build(self.kraken_assets_dict, G.asset_pairs.get_pairs())
+        self.__resolve_buy_set()
+
+        # prices of the coins we trade are pushed over the websocket instead of polling Ticker
+        market_data = get_market_data()
+        market_data.subscribe(WSFeed.TICKER, list(self.pair_dict.values()))
+        get_order_books().subscribe(list(self.pair_dict.values()))
+        self.scheduler.watch(market_data)
+        self.__arm_triggers()
+        self.triggers.watch(market_data)
+        self.__init_signal_source(market_data)
+        market_data.start()
+
+        for symbol in Buy_.SET:
+            self.scheduler.schedule(symbol, 0)
+
+        # fills are pushed by the private feed and handled on their own thread, without waiting for buy_loop to get to the coin
+        self.private_feed.add_fill_callback(self.fills.put)
+        self.private_feed.start()
+
+        # orders go out over the websocket once it is up, REST is used until then and whenever it is down
+        self.gateway.start()
+        Thread(target=self.__fill_loop, name="fills", daemon=True).start()
+
         G.log.print_and_log(message=Color.BG_GREEN + "Account Value          " + Color.ENDC + f" ${self.__get_account_value()}")
         return
 
-    def __get_buy_time(self) -> str:
-        """Returns the next time to buy as specified in the config file."""
-        return ( datetime.timedelta(minutes=Buy_.TIME_MINUTES) + datetime.datetime.now() ).strftime("%H:%M:%S")
+    def __resolve_buy_set(self) -> None:
+        """Turn the symbols from the config file into kraken asset codes and look up their USD pairs once."""
+        buy_set        = set()
+        self.pair_dict = dict()
+
+        for symbol in Buy_.SET:
+            asset = G.symbols.get_asset(symbol)
+            pair  = G.symbols.resolve(symbol)
+
+            if len(asset) == 0 or len(pair) == 0:
+                G.log.print_and_log(Color.FG_YELLOW + f"No USD pair for {symbol}, skipping it{Color.ENDC}")
+                continue
+            
+            buy_set.add(asset)
+            self.pair_dict[asset] = pair
+            self.pair_locks[pair] = Lock()
+        
+        Buy_.SET = sorted(buy_set)
+        return
 
     def __place_base_order(self, order_min: float, symbol_pair: str) -> dict:
         """
@@ -54,133 +126,116 @@ class Buy(KrakenBotBase, TradingView):
         return self.market_order(Trade.BUY, order_min, symbol_pair)
     
     
-    def __has_order_filled(self, symbol_pair: str) -> bool:
-        """Check if the order has filled."""
-        try:
-            sql                       = SQL()
-            filled_trades_order_txids = dict()
-            
-            result_set = sql.con_query(f"SELECT symbol_pair FROM safety_orders WHERE symbol_pair='{symbol_pair}'")
-
-            # if symbol is not being traded, then nothing has been filled
-            if result_set.rowcount <= 0:
-                return False
-            
-            self.wait(timeout=Nap.NORMAL)
-            trade_history = self.get_trades_history()
+    def __get_closed(self, order_txids: list) -> list:
+        """
+            The orders of `order_txids` that Kraken reports closed.
+            A trade in the history only means the order started to fill, it is done once it is closed.
             
-            if not self.has_result(trade_history):
-                G.log.print_and_log("Can't get trade history")
-                self.wait(timeout=10)
-                raise Exception("Can't get trade history")
+        """
+        if len(order_txids) == 0:
+            return []
+        
+        try:
+            orders = self.get_orders_info(order_txids)
+        except Exception as e:
+            G.log.print_and_log(Color.FG_YELLOW + f"Can't get the status of {', '.join(order_txids)}{Color.ENDC} {e}")
+            return []
+        return [order_txid for order_txid in order_txids if orders.get(order_txid, {}).get(Dicts.STATUS) == Dicts.CLOSED]
+    
+    def __get_unfilled_txids(self) -> list:
+        """The txids of every buy and sell order in the database that hasn't filled yet, None if they can't be read."""
+        try:
+            sql       = SQL()
+            buy_rows  = sql.con_query("SELECT obo_txid FROM open_buy_orders WHERE filled=false").fetchall()
+            sell_rows = sql.con_query("SELECT oso_txid FROM open_sell_orders WHERE filled=false").fetchall()
+            return [row[0] for row in buy_rows + sell_rows]
+        except Exception as e:
+            G.log.print_and_log(e=e, error_type=type(e).__name__, filename=__file__, tb_lineno=e.__traceback__.tb_lineno)
+        return None
+    
+    def __get_filled_buy_orders(self, symbol_pair: str) -> list:
+        """The txids of the pair's open buy orders that have filled completely. G.trade_history is synced once per cycle in buy_loop."""
+        try:
+            sql = SQL()
             
-            self.wait(timeout=Nap.NORMAL)
             # get all open_buy_orders from the database to check whether the have been filled
-            result_set = sql.con_query(f"SELECT obo_txid FROM open_buy_orders WHERE filled=false AND symbol_pair='{symbol_pair}'")
+            result_set = sql.con_query("SELECT obo_txid FROM open_buy_orders WHERE filled=false AND symbol_pair=%s", (symbol_pair,))
             
             # if there is nothing to get, nothing has been filled
             if result_set.rowcount <= 0:
-                return False
-            
-            obo_txid_set              = {txid[0] for txid in result_set.fetchall()}
-            trade_history             = trade_history[Dicts.RESULT][Data.TRADES]
-            filled_trades_order_txids = {dictionary[Data.ORDER_TXID]: trade_txid for (trade_txid, dictionary) in trade_history.items()}
+                return []
             
-            for obo_txid in obo_txid_set:
-                if obo_txid in filled_trades_order_txids.keys():
-                    # open buy order has been filled!
-                    self.obo_txid = obo_txid # turn self.obo_txid into a list and append each filled trade?
-                    return True
+            return self.__get_closed(G.trade_history.get_filled(txid[0] for txid in result_set.fetchall()))
         except Exception as e:
             G.log.print_and_log(e=e, error_type=type(e).__name__, filename=__file__, tb_lineno=e.__traceback__.tb_lineno)
-        return False
+        return []
                 
     def __has_completed(self, symbol_pair: str) -> bool:
-            sql = SQL()
-            filled_trades_order_txids = dict()
-
-            try:
-                result_set = sql.con_query(f"SELECT symbol_pair FROM safety_orders WHERE symbol_pair='{symbol_pair}'")
-                
-                # if symbol is not in sql db, there is nothing to do.
-                if result_set.rowcount <= 0:
-                    return False
-                
-                bought_set = {symbol[0] for symbol in result_set.fetchall()}
-                
-                if symbol_pair not in bought_set:
-                    return False
-                
-                self.wait(timeout=Nap.NORMAL)
-                trade_history = self.get_trades_history()
-                
-                if not self.has_result(trade_history):
-                    G.log.print_and_log("Can't get trade history")
-                    self.wait(timeout=10)
-                    raise Exception("Can't get trade history")
-                
-                result_set = sql.con_query(f"SELECT oso_txid FROM open_sell_orders WHERE symbol_pair='{symbol_pair}' AND filled=false")
-                if result_set.rowcount <= 0:
-                    return False
-                
-                oso_txids = {txid[0] for txid in result_set.fetchall()}
-                
-                trade_history = trade_history[Dicts.RESULT][Data.TRADES]
-                for trade_txid, dictionary in trade_history.items():
-                    filled_trades_order_txids[dictionary[Data.ORDER_TXID]] = trade_txid
-                
-                filled_trades_order_txids = {dictionary[Data.ORDER_TXID]: trade_txid for (trade_txid, dictionary) in trade_history.items()}
-
-                for oso_txid in oso_txids:
-                    if oso_txid in filled_trades_order_txids.keys():
-                        return True
-            except Exception as e:
-                G.log.print_and_log(e=e, error_type=type(e).__name__, filename=__file__, tb_lineno=e.__traceback__.tb_lineno)
-            return False
-        
-    def __place_safety_orders(self, symbol_pair: str) -> None:
-        """Place safety orders."""
-        
-        sql = SQL()
-        self.wait(timeout=Nap.NORMAL)
+        """Check if the open sell order has filled completely. G.trade_history is synced once per cycle in buy_loop."""
+        try:
+            sql        = SQL()
+            result_set = sql.con_query("SELECT oso_txid FROM open_sell_orders WHERE symbol_pair=%s AND filled=false", (symbol_pair,))
+            
+            # if symbol is not in sql db, there is nothing to do.
+            if result_set.rowcount <= 0:
+                return False
+            
+            return len(self.__get_closed(G.trade_history.get_filled(txid[0] for txid in result_set.fetchall()))) > 0
+        except Exception as e:
+            G.log.print_and_log(e=e, error_type=type(e).__name__, filename=__file__, tb_lineno=e.__traceback__.tb_lineno)
+        return False
         
-        for price, quantity in self.dca.safety_orders.items():
-            try:
-                price_max_prec      = self.get_pair_decimals(symbol_pair)
-                rounded_price       = self.round_decimals_down(price, price_max_prec)
-                max_vol_prec        = self.get_max_volume_precision(symbol_pair)
-                rounded_quantity    = self.round_decimals_down(quantity, max_vol_prec)
-                limit_order_result  = self.limit_order(Trade.BUY, rounded_quantity, symbol_pair, rounded_price)
+    def __place_safety_orders(self, dca: DCA, symbol_pair: str, count: int) -> None:
+        """
+            Place the next `count` safety orders as one batch.
+            The orders the exchange accepted are marked placed and copied into open_buy_orders in one transaction.
+            
+        """
+        sql  = SQL()
+        rows = list(dca.safety_orders.values())[:count]
 
+        if len(rows) == 0:
+            return
+        
+        try:
+            price_max_prec = self.get_pair_decimals(symbol_pair)
+            max_vol_prec   = self.get_max_volume_precision(symbol_pair)
+            orders         = [(self.round_decimals_down(row[4], max_vol_prec), self.round_decimals_down(row[6], price_max_prec)) for row in rows]
+            results        = self.limit_orders(Trade.BUY, orders, symbol_pair)
+            placed         = []
+            values         = []
+            armed          = []
+
+            # results[i] is the order of rows[i], zip would quietly drop the rows of a short list
+            if len(results) != len(rows):
+                raise Exception(f"{len(results)} results for {len(rows)} safety orders of {symbol_pair}")
+
+            for row, limit_order_result in zip(rows, results):
                 if self.has_result(limit_order_result):
-                    result_set          = sql.con_query(f"SELECT MIN(safety_order_no) FROM safety_orders WHERE symbol_pair='{symbol_pair}' AND order_placed=false")
-                    safety_order_number = sql.parse_so_number(result_set)
+                    G.log.print_and_log(message=Color.BG_BLUE + f"Safety order {row[2]} placed  {Color.ENDC} {symbol_pair} {limit_order_result[Dicts.RESULT][Dicts.DESCR][Dicts.ORDER]}", money=True)
+                    obo_txid = limit_order_result[Dicts.RESULT][Data.TXID][0]
                     
-                    G.log.print_and_log(message=Color.BG_BLUE + f"Safety order {safety_order_number} placed  {Color.ENDC} {symbol_pair} {limit_order_result[Dicts.RESULT][Dicts.DESCR][Dicts.ORDER]}", money=True)
-                    obo_txid            = limit_order_result[Dicts.RESULT][Data.TXID][0]
-                    
-                    # change order_placed to true in safety_orders table
-                    sql.con_update(f"UPDATE safety_orders SET order_placed=true WHERE symbol_pair='{symbol_pair}' AND order_placed=false LIMIT 1")
-                    
-                    row = sql.con_get_row(SQLTable.SAFETY_ORDERS, symbol_pair, safety_order_number)
-                    
-                    # store open_buy_order row
-                    sql.con_update(f"""INSERT INTO open_buy_orders {sql.obo_columns} VALUES
-                                   ('{row[0]}', '{row[1]}',  {row[2]},    {row[3]},
-                                     {row[4]},   {row[5]},   {row[6]},    {row[7]},
-                                     {row[8]},   {row[9]},   {row[10]},   {row[11]},
-                                     {row[12]},  false,     '{obo_txid}', {row[14]})
-                                    """)
+                    placed.append(row[2])
+                    armed.append((row[6], obo_txid))
+                    values.append(tuple(row[:13]) + (False, obo_txid, row[14]))
+                elif len(limit_order_result[Dicts.ERROR]) > 0 and limit_order_result[Dicts.ERROR][0] == KError.INSUFFICIENT_FUNDS:
+                    G.log.print_and_log(Color.FG_YELLOW + f"Not enough USD to place safety order {row[2]}{Color.ENDC}: {symbol_pair}")
                 else:
-                    if limit_order_result[Dicts.ERROR][0] == KError.INSUFFICIENT_FUNDS:
-                        G.log.print_and_log(Color.FG_YELLOW + f"Not enough USD to place remaining safety orders{Color.ENDC}: {symbol_pair}")
-                        return
-                    elif limit_order_result[Dicts.ERROR][0] == KError.INVALID_VOLUME:
+                    if len(limit_order_result[Dicts.ERROR]) > 0 and limit_order_result[Dicts.ERROR][0] == KError.INVALID_VOLUME:
                         G.log.print_and_log(f"{symbol_pair} volume error.")
                     
                     G.log.print_and_log(message=f"{limit_order_result}", money=True)
-            except Exception as e:
-                G.log.print_and_log(e=e, error_type=type(e).__name__, filename=__file__, tb_lineno=e.__traceback__.tb_lineno)
+
+            if len(placed) > 0:
+                # change order_placed to true in safety_orders table and store the open_buy_order rows
+                sql.con_update_batch([
+                    (f"UPDATE safety_orders SET order_placed=true WHERE symbol_pair=%s AND safety_order_no IN ({sql.placeholders(len(placed))})", (symbol_pair, *placed)),
+                    sql.insert_many(SQLTable.OPEN_BUY_ORDERS, sql.obo_columns, values)])
+                
+                for price, obo_txid in armed:
+                    self.triggers.arm(symbol_pair, Trade.BUY, price, obo_txid)
+        except Exception as e:
+            G.log.print_and_log(e=e, error_type=type(e).__name__, filename=__file__, tb_lineno=e.__traceback__.tb_lineno)
         
         return
 
@@ -200,13 +255,12 @@ class Buy(KrakenBotBase, TradingView):
                     If SO1, is filled, the previous sell order should be cancelled and a new sell order should be placed: Base Order+SO1, required_price1
                     If SO2, is filled, the previous sell order should be cancelled and a new sell order should be placed: Base Order+SO1+SO2, required_price2
         """
-        self.wait(timeout=Nap.NORMAL)
         sql = SQL()
         
         try:
             if symbol_pair in sql.con_get_symbol_pairs():
                 # If the symbol is in the database then we have bought it before
-                self.dca = DCA(symbol_pair, symbol, 0, 0)
+                dca = DCA(symbol_pair, symbol, 0, 0)
             else:
                 return # THIS IS ONLY TO PREVENT THE CREATION OF ANY NEW TRADE!!! REMOVE WHEN DESIRED!!!
                 base_order_qty = self.get_order_min(symbol_pair)
@@ -225,8 +279,7 @@ class Buy(KrakenBotBase, TradingView):
                     base_order_txid      = base_order_result[Dicts.RESULT][Data.TXID][0]
                     base_order_row       = BaseOrderRow(symbol_pair, symbol, 0, DCA_.TARGET_PROFIT_PERCENT, base_order_qty, base_order_qty, base_order_price, base_order_price, base_order_req_price, DCA_.TARGET_PROFIT_PERCENT, base_order_profit, base_order_cost, base_order_cost, False, False, base_order_txid, 0)
                     
-                    self.dca       = DCA(symbol_pair, symbol, base_order_qty, base_order_price)
-                    self.sell.dca  = self.dca
+                    dca = DCA(symbol_pair, symbol, base_order_qty, base_order_price)
                     
                     # upon placing the base_order, pass in the txid into dca to write to db
                     self.sell.place_sell_limit_base_order(base_order_row)
@@ -241,7 +294,7 @@ class Buy(KrakenBotBase, TradingView):
             
             # if the max active orders are already put in, and are still active, there is nothing left to do.
             if num_open_orders < DCA_.SAFETY_ORDERS_ACTIVE_MAX:
-                self.__place_safety_orders(symbol_pair)
+                self.__place_safety_orders(dca, symbol_pair, DCA_.SAFETY_ORDERS_ACTIVE_MAX - num_open_orders)
         except Exception as e:
             G.log.print_and_log(e=e, error_type=type(e).__name__, filename=__file__, tb_lineno=e.__traceback__.tb_lineno)
         return
@@ -259,14 +312,15 @@ class Buy(KrakenBotBase, TradingView):
             sql = SQL()
                     
             if self.__has_completed(symbol_pair):
-                result_set      = sql.con_query(f"SELECT profit FROM open_sell_orders WHERE symbol_pair='{symbol_pair}' AND filled=false")        
+                result_set      = sql.con_query("SELECT profit FROM open_sell_orders WHERE symbol_pair=%s AND filled=false", (symbol_pair,))
                 profit          = result_set.fetchall()[0] if result_set.rowcount > 0 else 0
                 profit          = profit[0][0] if isinstance(profit[0], tuple) else profit[0]
                 
                 G.log.print_and_log(message=Color.BG_GREEN + f"Trade complete $$$     {Color.ENDC} {symbol_pair}, profit: {profit}", money=True)
-                self.total_profit += float(profit)
+                with self.profit_lock:
+                    self.total_profit += float(profit)
 
-                result_set      = sql.con_query(f"SELECT obo_txid FROM open_buy_orders WHERE symbol_pair='{symbol_pair}' AND filled=false")
+                result_set      = sql.con_query("SELECT obo_txid FROM open_buy_orders WHERE symbol_pair=%s AND filled=false", (symbol_pair,))
                 open_buy_orders = result_set.fetchall() if result_set.rowcount > 0 else []
                 
                 for txid in open_buy_orders:
@@ -276,9 +330,11 @@ class Buy(KrakenBotBase, TradingView):
                         self.cancel_order(txid[0])
                     
                 # remove rows associated with symbol_pair from all tables
-                sql.con_update(f"DELETE FROM safety_orders    WHERE symbol_pair='{symbol_pair}'")
-                sql.con_update(f"DELETE FROM open_buy_orders  WHERE symbol_pair='{symbol_pair}'")
-                sql.con_update(f"DELETE FROM open_sell_orders WHERE symbol_pair='{symbol_pair}'")
+                sql.con_update_batch([
+                    ("DELETE FROM safety_orders    WHERE symbol_pair=%s", (symbol_pair,)),
+                    ("DELETE FROM open_buy_orders  WHERE symbol_pair=%s", (symbol_pair,)),
+                    ("DELETE FROM open_sell_orders WHERE symbol_pair=%s", (symbol_pair,))])
+                self.triggers.clear(symbol_pair)
         except Exception as e:
             G.log.print_and_log(e=e, error_type=type(e).__name__, filename=__file__, tb_lineno=e.__traceback__.tb_lineno)
         return
@@ -296,42 +352,125 @@ class Buy(KrakenBotBase, TradingView):
             
         """
         try:
-            sql = SQL()
-                    
-            if self.__has_order_filled(symbol_pair):
-                sql.con_update(f"UPDATE open_buy_orders SET filled=true WHERE obo_txid='{self.obo_txid}' AND filled=false AND symbol_pair='{symbol_pair}'")
-                row = sql.con_query(f"SELECT * FROM {SQLTable.OPEN_BUY_ORDERS} WHERE symbol_pair='{symbol_pair}' AND obo_txid='{self.obo_txid}'")
-
-                if row.rowcount > 0:
-                    row = row.fetchall()[0]
-                    G.log.print_and_log(Color.BG_MAGENTA + f"""Safety order {row[2]} filled  {Color.ENDC} {row[0]}""")
-
-                    # if the txid is in the trade history, the order open_buy_order was filled.
-                    self.sell.start(symbol_pair, self.obo_txid)
+            for obo_txid in self.__get_filled_buy_orders(symbol_pair):
+                self.__fill_buy_order(symbol_pair, obo_txid)
         except Exception as e:
             G.log.print_and_log(e=e, error_type=type(e).__name__, filename=__file__, tb_lineno=e.__traceback__.tb_lineno)
         return
+
+    def __fill_buy_order(self, symbol_pair: str, obo_txid: str) -> None:
+        """
+            Mark the open buy order as filled and replace the sell order.
+            Only whoever flips filled from false to true goes on, so a fill seen by both buy_loop and the private feed is handled once.
+            Callers hold the pair's lock.
+            
+        """
+        sql = SQL()
+        
+        if sql.con_update("UPDATE open_buy_orders SET filled=true WHERE obo_txid=%s AND filled=false AND symbol_pair=%s", (obo_txid, symbol_pair)) <= 0:
+            return
+        
+        self.triggers.disarm(obo_txid)
+        row = sql.con_query(f"SELECT * FROM {SQLTable.OPEN_BUY_ORDERS} WHERE symbol_pair=%s AND obo_txid=%s", (symbol_pair, obo_txid))
+
+        if row.rowcount > 0:
+            row = row.fetchall()[0]
+            G.log.print_and_log(Color.BG_MAGENTA + f"""Safety order {row[2]} filled  {Color.ENDC} {row[0]}""")
+
+            # if the txid is in the trade history, the order open_buy_order was filled.
+            self.sell.start(symbol_pair, obo_txid)
+            
+            # the sell order was replaced, its new required price is the one to watch
+            self.triggers.replace(symbol_pair, Trade.SELL, sql.con_get_sell_order_prices(symbol_pair))
+        return
+
+    def __get_pair_lock(self, symbol_pair: str) -> Lock:
+        # pairs outside of Buy_.SET (left over from an earlier config) still need a lock, setdefault is atomic
+        return self.pair_locks.setdefault(symbol_pair, Lock())
+
+    def __on_fill(self, fill: FillEvent) -> None:
+        """
+            Find the order of a pushed fill in the database and run the same handling buy_loop would.
+            openOrders only sends a fill once the order closed. An ownTrades fill can be part of an order,
+            so it is only a hint to ask Kraken whether the order closed.
+            
+        """
+        if fill.source == WSFeed.OWN_TRADES and len(self.__get_closed([fill.order_txid])) == 0:
+            return
+        
+        sql = SQL()
+        
+        result_set = sql.con_query("SELECT symbol_pair FROM open_buy_orders WHERE obo_txid=%s AND filled=false", (fill.order_txid,))
+        if result_set.rowcount > 0:
+            symbol_pair = result_set.fetchone()[0]
+            with self.__get_pair_lock(symbol_pair):
+                self.__fill_buy_order(symbol_pair, fill.order_txid)
+            self.__wake(symbol_pair)
+            return
+        
+        result_set = sql.con_query("SELECT symbol_pair FROM open_sell_orders WHERE oso_txid=%s AND filled=false", (fill.order_txid,))
+        if result_set.rowcount > 0:
+            symbol_pair = result_set.fetchone()[0]
+            with self.__get_pair_lock(symbol_pair):
+                self.__update_completed_trades(symbol_pair)
+            self.__wake(symbol_pair)
+        return
+
+    def __arm_triggers(self) -> None:
+        """Load the open orders of every pair into self.triggers, kept up to date as orders are placed, filled and cancelled from then on."""
+        sql = SQL()
+        
+        for symbol_pair in self.pair_dict.values():
+            buy_levels, sell_levels = sql.con_get_order_prices(symbol_pair)
+            self.triggers.replace(symbol_pair, Trade.BUY,  buy_levels)
+            self.triggers.replace(symbol_pair, Trade.SELL, sell_levels)
+        
+        # a crossed order price may mean a fill, check the pair now instead of when it was scheduled
+        self.triggers.add_callback(lambda symbol_pair, side, price, txid: self.__wake(symbol_pair))
+        return
+
+    def __wake(self, symbol_pair: str) -> None:
+        """The pair's orders changed, so the interval it was scheduled with is stale."""
+        for symbol, pair in self.pair_dict.items():
+            if pair == symbol_pair:
+                self.scheduler.schedule_sooner(symbol, 0)
+        return
+
+    def __fill_loop(self) -> None:
+        while True:
+            fill = self.fills.get()
+            try:
+                self.__on_fill(fill)
+            except Exception as e:
+                G.log.print_and_log(e=e, error_type=type(e).__name__, filename=__file__, tb_lineno=e.__traceback__.tb_lineno)
     
     def __get_account_value(self) -> float:
         """Get account value by adding all coin quantities together and putting in USD terms."""
         total   = 0.0
         account = self.get_account_balance()
-        x_list  = ['XETC', 'XETH', 'XLTC', 'XMLN', 'XREP', 'XXBT', 'XXDG', 'XXLM', 'XXMR', 'XXRP', 'XZEC']
+        symbols = self.get_symbol_resolver()
 
         if self.has_result(account):
+            holdings = dict()
+            
             for symbol, quantity in account[Dicts.RESULT].items():
                 quantity = float(quantity)
-                if float(quantity) > 0:
-                    if symbol[-2:] == ".S": # coin is staked
-                        symbol = symbol[:-2]
-                    if symbol in x_list:
-                        symbol = symbol[1:]
-                    if symbol == StableCoins.ZUSD or symbol == StableCoins.USD or symbol == StableCoins.USDT:
+                if quantity > 0:
+                    # staked coins (DOT.S) resolve to the same pair as the plain coin
+                    asset = symbols.get_asset(symbol)
+                    if asset == StableCoins.ZUSD or asset == StableCoins.USD or asset == StableCoins.USDT:
                         total += quantity
                     else:
-                        bid_price = self.get_bid_price(symbol+StableCoins.USD)
-                        value = bid_price * quantity
-                        total += value
+                        symbol_pair = symbols.resolve(symbol)
+                        if len(symbol_pair) > 0:
+                            holdings[symbol_pair] = holdings.get(symbol_pair, 0.0) + quantity
+
+            # one Ticker request for every coin we hold
+            prices = self.get_tickers(list(holdings.keys()))
+            
+            for symbol_pair, quantity in holdings.items():
+                if symbol_pair in prices:
+                    total += prices[symbol_pair].bid * quantity
         return round(total, 2)
 
     def __get_bought_price(self, buy_result: dict) -> float:
@@ -341,7 +480,6 @@ class Buy(KrakenBotBase, TradingView):
         
         if self.has_result(buy_result):
             
-            self.wait(timeout=Nap.NORMAL)
             order_result = self.query_orders_info(buy_result[Dicts.RESULT][Data.TXID][0])
             if self.has_result(order_result):
                 for txid in order_result[Dicts.RESULT]:
@@ -356,28 +494,24 @@ class Buy(KrakenBotBase, TradingView):
             Prepare the symbol in order to pull data from TradingView
             
         """
-        self.wait(timeout=Nap.NORMAL)
         alt_name = self.get_alt_name(symbol)
         return self._is_buy(alt_name+StableCoins.USD)
 
     #----------------------------------------------------------------------------------------------------
     def __sell_all_assets(self) -> None:
         self.kraken_assets_dict = self.get_asset_info()[Dicts.RESULT]
-        self.asset_pairs_dict   = self.get_all_tradable_asset_pairs()[Dicts.RESULT]
         account                 = self.get_account_balance()
-        reg_list                = ['ETC', 'ETH', 'LTC', 'MLN', 'REP', 'XBT', 'XDG', 'XLM', 'XMR', 'XRP', 'ZEC']
+        symbol_pairs            = self.get_symbol_resolver().resolve_many(account.get(Dicts.RESULT, {}).keys())
 
         if self.has_result(account):
             account = account[Dicts.RESULT]
             for symbol, qty in account.items():
                 qty = float(qty)
                 if qty > 0 and symbol not in StableCoins.STABLE_COINS_LIST:
-                    if symbol[-2:] == ".S":
+                    if symbol[-2:] == ".S" or symbol not in symbol_pairs:
                         continue
-                    if symbol in reg_list:
-                        symbol = "X" + symbol
                         
-                    symbol_pair  = self.get_tradable_asset_pair(symbol)
+                    symbol_pair  = symbol_pairs[symbol]
                     qty_max_prec = self.get_max_volume_precision(symbol_pair)
                     qty          = self.round_decimals_down(qty, qty_max_prec)
                     result       = self.market_order(Trade.SELL, qty, symbol_pair)
@@ -411,27 +545,110 @@ class Buy(KrakenBotBase, TradingView):
 ### BUY_LOOP
 ##################################################################################################################################
 
+    def __check_symbol(self, symbol: str) -> float:
+        """
+            One check of one symbol, run on a worker of the buy_loop pool. Returns the seconds it took.
+            A symbol is out of the schedule while it is checked, so its steps still run in order,
+            and the pair lock keeps the fill thread out while they do.
+            
+        """
+        start_time  = time.time()
+        symbol_pair = self.pair_dict[symbol]
+        
+        try:
+            with self.__get_pair_lock(symbol_pair):
+                self.__update_completed_trades(symbol_pair)
+                self.__update_open_buy_orders(symbol_pair)
+                
+                if self.__is_buy(symbol):
+                    self.__place_limit_orders(symbol, symbol_pair)
+        except Exception as e:
+            G.log.print_and_log(e=e, error_type=type(e).__name__, filename=__file__, tb_lineno=e.__traceback__.tb_lineno)
+        finally:
+            # a fill or crossed price during the check asked for the next one sooner, keep that
+            self.scheduler.schedule_sooner(symbol, self.__get_check_interval(symbol_pair))
+        return time.time() - start_time
+
+    def __get_check_interval(self, symbol_pair: str) -> float:
+        """Seconds until the pair is checked again, from how close the price is to its open orders."""
+        try:
+            quote = self.get_tickers([symbol_pair]).get(symbol_pair)
+            price = (quote.ask + quote.bid) / 2 if quote is not None else None
+            return self.scheduler.get_interval(symbol_pair, price, self.triggers.get_levels(symbol_pair))
+        except Exception as e:
+            G.log.print_and_log(e=e, error_type=type(e).__name__, filename=__file__, tb_lineno=e.__traceback__.tb_lineno)
+        return Buy_.TIME_MINUTES * 60
+
+    def __get_sync_interval(self) -> float:
+        """TradesHistory syncs are spaced to use at most Schedule_.SYNC_BUDGET_SHARE of the private api counter."""
+        return RateLimit_.COSTS[Method.TRADE_HISTORY] / (G.rate_limiter.private.decay * Schedule_.SYNC_BUDGET_SHARE)
+
+    def __get_timings(self) -> str:
+        """Checks and average seconds per check of each symbol since the last report, slowest first."""
+        timings = sorted(self.timings.items(), key=lambda item: item[1][1] / item[1][0], reverse=True)
+        return ", ".join(f"{symbol} {checks}x {seconds / checks:.2f}s" for symbol, (checks, seconds) in timings)
+
+    def __report(self, start_time: float) -> None:
+        G.log.print_and_log(message=Color.FG_BRIGHT_BLACK + f"{sum(checks for checks, _ in self.timings.values())} checks in {self.get_elapsed_time(start_time)}" + Color.ENDC)
+        G.log.print_and_log(message=Color.FG_BRIGHT_BLACK + self.__get_timings() + Color.ENDC)
+        G.log.print_and_log(message=Color.FG_BRIGHT_BLACK + self.transport.stats.summary() + Color.ENDC)
+        G.log.print_and_log(message=Color.FG_BRIGHT_BLACK + G.rate_limiter.summary() + Color.ENDC)
+        G.log.print_and_log(message=Color.FG_BRIGHT_BLACK + G.public_cache.summary() + Color.ENDC)
+        G.log.print_and_log(message=Color.FG_BRIGHT_BLACK + get_signal_cache().summary() + Color.ENDC)
+        for pool in get_sql_pools():
+            G.log.print_and_log(message=Color.FG_BRIGHT_BLACK + pool.summary() + Color.ENDC)
+            pool.reset()
+        self.transport.stats.reset()
+        self.timings.clear()
+        print()
+        
+        G.log.print_and_log(message=Color.BG_GREEN + "Account Value          " + Color.ENDC + f" ${self.__get_account_value()}")
+        G.log.print_and_log(message=Color.BG_GREEN + "Total Profit           " + Color.ENDC + f" ${self.round_decimals_down(self.total_profit, DECIMAL_MAX)}")
+        return
+
     def buy_loop(self) -> None:
-        """The main function for trading coins."""
+        """
+            The main function for trading coins.
+            Instead of checking every symbol and then sleeping Buy_.TIME_MINUTES, each symbol is checked when self.scheduler says it is due:
+            every few seconds close to an order price, every Schedule_.IDLE_SECONDS with nothing open.
+            
+            Due symbols are checked Buy_.WORKERS at a time. Every request still goes through G.rate_limiter,
+            and TradesHistory is synced no more often than __get_sync_interval allows, fills in between arrive over the private feed.
+            
+        """
         self.__init_loop_variables()
+        pool        = ThreadPoolExecutor(max_workers=Buy_.WORKERS, thread_name_prefix="buy")
+        last_sync   = 0.0
+        last_report = time.time()
         
         while True:
-            start_time = time.time()
+            due = self.scheduler.pop_due()
             
-            for symbol in Buy_.SET:
-                symbol_pair = self.get_tradable_asset_pair(symbol)
-                self.wait(message=f"Checking {symbol}", timeout=Nap.NORMAL)
+            if len(due) > 0:
+                if time.time() - last_sync >= self.__get_sync_interval():
+                    last_sync = time.time()
+                    order_txids = self.__get_unfilled_txids()
+                    if order_txids is None or not self.sync_trade_history(order_txids):
+                        G.log.print_and_log(Color.FG_YELLOW + f"Trade history is not up to date, fills will be picked up next sync{Color.ENDC}")
                 
-                self.__update_completed_trades(symbol_pair)
-                self.__update_open_buy_orders(symbol_pair)
+                G.log.print_and_log(f"Checking {', '.join(due)}")
                 
-                if self.__is_buy(symbol):
-                    self.__place_limit_orders(symbol, symbol_pair)
+                # stale TradingView signals of every due symbol in one bulk request per interval, the checks then read them from the cache
+                try:
+                    self._prefetch_buy([self.get_alt_name(symbol) + StableCoins.USD for symbol in due])
+                except Exception as e:
+                    G.log.print_and_log(e=e, error_type=type(e).__name__, filename=__file__, tb_lineno=e.__traceback__.tb_lineno)
+                
+                # map returns once every due symbol is done and rescheduled
+                for symbol, seconds in zip(due, pool.map(self.__check_symbol, due)):
+                    timing     = self.timings.setdefault(symbol, [0, 0.0])
+                    timing[0] += 1
+                    timing[1] += seconds
             
-            G.log.print_and_log(message=Color.FG_BRIGHT_BLACK + f"Checked all coins in {self.get_elapsed_time(start_time)}" + Color.ENDC)
-            print()
+            if time.time() - last_report >= Buy_.TIME_MINUTES * 60:
+                self.__report(last_report)
+                last_report = time.time()
             
-            self.wait(message=Color.FG_BRIGHT_BLACK + f"Waiting till {self.__get_buy_time()} to buy" + Color.ENDC, timeout=Buy_.TIME_MINUTES*60)
-            G.log.print_and_log(message=Color.BG_GREEN + "Account Value          " + Color.ENDC + f" ${self.__get_account_value()}")
-            G.log.print_and_log(message=Color.BG_GREEN + "Total Profit           " + Color.ENDC + f" ${self.round_decimals_down(self.total_profit, DECIMAL_MAX)}")
+            # returns early when the fill thread or a price trigger moves a symbol up
+            self.scheduler.wait(timeout=min(Schedule_.IDLE_SECONDS, max(0.0, last_report + Buy_.TIME_MINUTES * 60 - time.time())))
         return
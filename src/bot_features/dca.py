@@ -62,7 +62,7 @@ class DCA(DCA_):
     def __has_safety_order_table(self) -> bool:
         """Returns True if safety orders exists."""
         sql = SQL()
-        result_set = sql.con_query(f"SELECT * FROM safety_orders WHERE symbol_pair='{self.symbol_pair}'")
+        result_set = sql.con_query("SELECT * FROM safety_orders WHERE symbol_pair=%s", (self.symbol_pair,))
 
         if result_set.rowcount <= 0:
             return False
@@ -214,35 +214,35 @@ class DCA(DCA_):
         """Set the Dataframe with the values calculated in previous functions."""
         order_numbers = [i for i in range(1, DCA_.SAFETY_ORDERS_MAX+1)]
 
-        sql = SQL()
+        sql  = SQL()
+        rows = []
         
         for i in range(DCA_.SAFETY_ORDERS_MAX):
-            sql.con_update(f"""INSERT INTO safety_orders {sql.so_columns} VALUES (
-               '{self.symbol_pair}', 
-               '{self.symbol}', 
-                {order_numbers[i]}, 
-                {self.percentage_deviation_levels[i]},
-                {self.quantities[i]},
-                {self.total_quantities[i]},
-                {self.price_levels[i]},
-                {self.average_price_levels[i]}, 
-                {self.required_price_levels[i]}, 
-                {self.required_change_percentage_levels[i]},
-                {self.profit_levels[i]},
-                {self.cost_levels[i]},
-                {self.total_cost_levels[i]},
-                false,
-                so_no)""")
+            rows.append((
+                self.symbol_pair,
+                self.symbol,
+                order_numbers[i],
+                self.percentage_deviation_levels[i],
+                self.quantities[i],
+                self.total_quantities[i],
+                self.price_levels[i],
+                self.average_price_levels[i],
+                self.required_price_levels[i],
+                self.required_change_percentage_levels[i],
+                self.profit_levels[i],
+                self.cost_levels[i],
+                self.total_cost_levels[i],
+                False,
+                None)) # so_no, given by AUTO_INCREMENT
+        
+        # the whole ladder in one multi-row INSERT
+        sql.con_insert_many(SQLTable.SAFETY_ORDERS, sql.so_columns, rows)
         return
     
     def __set_buy_orders(self) -> None:
-        """Read rows in the .xlsx file into memory."""
+        """Read the next safety orders to place into memory, keyed by safety order number."""
         sql = SQL()
 
-        quantities = sql.con_get_quantities(self.symbol_pair)
-        prices     = sql.con_get_prices(self.symbol_pair)
-        iterations = len(prices) if len(prices) < DCA_.SAFETY_ORDERS_ACTIVE_MAX else DCA_.SAFETY_ORDERS_ACTIVE_MAX
-
-        for i in range(iterations):
-            self.safety_orders[prices[i]] = quantities[i]
+        for row in sql.con_get_safety_orders(self.symbol_pair, DCA_.SAFETY_ORDERS_ACTIVE_MAX):
+            self.safety_orders[row[2]] = row
         return
@@ -0,0 +1,385 @@
+"""indicator_engine.py: TradingView's technical summary computed locally with numpy from kraken's OHLC candles, every symbol in one array pass."""
+
+import numpy as np
+import time
+import warnings
+
+from threading                               import Lock
+from typing                                  import Optional
+from numpy.lib.stride_tricks                 import sliding_window_view
+from util.globals                            import G
+from bot_features.low_level.kraken_enums     import *
+from bot_features.low_level.kraken_websocket import KrakenMarketData
+
+
+# TradingView interval -> (kraken OHLC interval in minutes, kraken candles per TradingView candle, TradingView candle seconds, candle start offset from the epoch in seconds)
+# kraken has no 2h candles, they are built from 1h ones. kraken's weekly candles start on thursday like the epoch
+# while TradingView's start on monday, so weeks are built from daily candles instead (about 100 of them from 720 days).
+# 1M isn't here and is left to TradingView.
+KRAKEN_INTERVALS = {
+    "1m":  (1,    1, 60,               0),
+    "5m":  (5,    1, 5 * 60,           0),
+    "15m": (15,   1, 15 * 60,          0),
+    "30m": (30,   1, 30 * 60,          0),
+    "1h":  (60,   1, 60 * 60,          0),
+    "2h":  (60,   2, 2 * 60 * 60,      0),
+    "4h":  (240,  1, 4 * 60 * 60,      0),
+    "1d":  (1440, 1, 24 * 60 * 60,     0),
+    "1W":  (1440, 7, 7 * 24 * 60 * 60, 4 * 24 * 60 * 60),
+}
+
+# columns of a candle array
+TIME, OPEN, HIGH, LOW, CLOSE, VWAP, VOLUME = range(7)
+
+
+######################################################################
+### ROLLING WINDOWS
+### Every series is (symbols, candles) with the oldest candle first.
+### Symbols with a shorter history are padded with nan at the front,
+### and a value whose window reaches into the padding is nan too.
+######################################################################
+
+def _shift(x: np.ndarray, k: int) -> np.ndarray:
+    """x[k] in pine, the value k candles ago."""
+    out = np.full_like(x, np.nan)
+    out[:, k:] = x[:, :-k]
+    return out
+
+def _window(x: np.ndarray, n: int) -> np.ndarray:
+    """(symbols, candles, n) view of the last n values at every candle, the first n - 1 candles are nan."""
+    padded = np.concatenate([np.full((x.shape[0], n - 1), np.nan), x], axis=1)
+    return sliding_window_view(padded, n, axis=1)
+
+def _sum(x: np.ndarray, n: int) -> np.ndarray:
+    return _window(x, n).sum(axis=2)
+
+def _sma(x: np.ndarray, n: int) -> np.ndarray:
+    return _window(x, n).mean(axis=2)
+
+def _highest(x: np.ndarray, n: int) -> np.ndarray:
+    return _window(x, n).max(axis=2)
+
+def _lowest(x: np.ndarray, n: int) -> np.ndarray:
+    return _window(x, n).min(axis=2)
+
+def _wma(x: np.ndarray, n: int) -> np.ndarray:
+    weights = np.arange(1, n + 1, dtype=float)
+    return _window(x, n) @ weights / weights.sum()
+
+def _smooth(x: np.ndarray, alpha: float, seed: np.ndarray) -> np.ndarray:
+    """
+    Exponential smoothing along the candles, vectorised over the symbols.
+    Each symbol starts from seed at its first candle where seed isn't nan, like pine's ema and rma.
+
+    """
+    out  = np.full_like(x, np.nan)
+    prev = np.full(x.shape[0], np.nan)
+    for t in range(x.shape[1]):
+        prev      = np.where(np.isnan(prev), seed[:, t], prev + alpha * (x[:, t] - prev))
+        out[:, t] = prev
+    return out
+
+def _ema(x: np.ndarray, n: int) -> np.ndarray:
+    return _smooth(x, 2 / (n + 1), x)
+
+def _rma(x: np.ndarray, n: int) -> np.ndarray:
+    """Wilder's moving average, used by RSI and ADX."""
+    return _smooth(x, 1 / n, _sma(x, n))
+
+def _ratio(numerator: np.ndarray, denominator: np.ndarray) -> np.ndarray:
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(denominator != 0, numerator / denominator, np.nan)
+
+def _rsi(close: np.ndarray, n: int) -> np.ndarray:
+    change = close - _shift(close, 1)
+    up     = _rma(np.where(np.isnan(change), np.nan, np.maximum(change, 0)), n)
+    down   = _rma(np.where(np.isnan(change), np.nan, np.maximum(-change, 0)), n)
+    return np.where(down == 0, 100.0, 100 - 100 / (1 + _ratio(up, down)))
+
+def _stoch(close: np.ndarray, high: np.ndarray, low: np.ndarray, n: int) -> np.ndarray:
+    lowest = _lowest(low, n)
+    return 100 * _ratio(close - lowest, _highest(high, n) - lowest)
+
+
+######################################################################
+### VOTES
+### +1 buy, -1 sell, 0 neutral and nan where the history is too short,
+### following the rules tradingview_ta applies to TradingView's values.
+######################################################################
+
+def _vote(buy: np.ndarray, sell: np.ndarray, *inputs: np.ndarray) -> np.ndarray:
+    vote = np.where(buy, 1.0, np.where(sell, -1.0, 0.0))
+    for value in inputs:
+        vote[np.isnan(value)] = np.nan
+    return vote
+
+def _cross_vote(k: np.ndarray, d: np.ndarray, low: float, high: float) -> np.ndarray:
+    """Stochastic rule: %K crossing %D below `low` buys, crossing it above `high` sells."""
+    k0, d0, k1, d1 = k[:, -1], d[:, -1], k[:, -2], d[:, -2]
+    return _vote((k0 < low) & (d0 < low) & (k0 > d0) & (k1 < d1), (k0 > high) & (d0 > high) & (k0 < d0) & (k1 > d1), k0, d0, k1, d1)
+
+def _price_vote(ma: np.ndarray, close: np.ndarray) -> np.ndarray:
+    """Moving average rule: below the price buys, above it sells."""
+    return _vote(ma < close, ma > close, ma, close)
+
+def _oscillator_votes(o: np.ndarray, h: np.ndarray, l: np.ndarray, c: np.ndarray) -> list:
+    votes = []
+
+    # RSI (14)
+    rsi = _rsi(c, 14)
+    votes.append(_vote((rsi[:, -1] < 30) & (rsi[:, -2] < rsi[:, -1]), (rsi[:, -1] > 70) & (rsi[:, -2] > rsi[:, -1]), rsi[:, -1], rsi[:, -2]))
+
+    # Stochastic %K (14, 3, 3)
+    k = _sma(_stoch(c, h, l, 14), 3)
+    votes.append(_cross_vote(k, _sma(k, 3), 20, 80))
+
+    # CCI (20)
+    tp  = (h + l + c) / 3
+    sma = _sma(tp, 20)
+    cci = _ratio(tp - sma, 0.015 * np.abs(_window(tp, 20) - sma[:, :, None]).mean(axis=2))
+    votes.append(_vote((cci[:, -1] < -100) & (cci[:, -1] > cci[:, -2]), (cci[:, -1] > 100) & (cci[:, -1] < cci[:, -2]), cci[:, -1], cci[:, -2]))
+
+    # ADX (14) with +DI and -DI crossing
+    up       = h - _shift(h, 1)
+    down     = _shift(l, 1) - l
+    c1       = _shift(c, 1)
+    tr       = np.fmax(h - l, np.fmax(np.abs(h - c1), np.abs(l - c1)))
+    atr      = _rma(tr, 14)
+    plus_di  = 100 * _ratio(_rma(np.where((up > down) & (up > 0), up, 0.0), 14), atr)
+    minus_di = 100 * _ratio(_rma(np.where((down > up) & (down > 0), down, 0.0), 14), atr)
+    adx      = _rma(100 * _ratio(np.abs(plus_di - minus_di), plus_di + minus_di), 14)
+    votes.append(_vote((adx[:, -1] > 20) & (plus_di[:, -2] < minus_di[:, -2]) & (plus_di[:, -1] > minus_di[:, -1]),
+                       (adx[:, -1] > 20) & (plus_di[:, -2] > minus_di[:, -2]) & (plus_di[:, -1] < minus_di[:, -1]), adx[:, -1], plus_di[:, -2], minus_di[:, -2]))
+
+    # Awesome Oscillator
+    hl2          = (h + l) / 2
+    ao           = _sma(hl2, 5) - _sma(hl2, 34)
+    ao0, ao1, ao2 = ao[:, -1], ao[:, -2], ao[:, -3]
+    votes.append(_vote(((ao0 > 0) & (ao1 < 0)) | ((ao0 > 0) & (ao1 > 0) & (ao0 > ao1) & (ao2 > ao1)),
+                       ((ao0 < 0) & (ao1 > 0)) | ((ao0 < 0) & (ao1 < 0) & (ao0 < ao1) & (ao2 < ao1)), ao0, ao1, ao2))
+
+    # Momentum (10)
+    mom = c - _shift(c, 10)
+    votes.append(_vote(mom[:, -1] > mom[:, -2], mom[:, -1] < mom[:, -2], mom[:, -1], mom[:, -2]))
+
+    # MACD (12, 26, 9)
+    macd   = _ema(c, 12) - _ema(c, 26)
+    signal = _ema(macd, 9)
+    votes.append(_vote(macd[:, -1] > signal[:, -1], macd[:, -1] < signal[:, -1], macd[:, -1], signal[:, -1]))
+
+    # Stochastic RSI (3, 3, 14, 14)
+    rsi_k = _sma(_stoch(rsi, rsi, rsi, 14), 3)
+    votes.append(_cross_vote(rsi_k, _sma(rsi_k, 3), 20, 80))
+
+    # Williams %R (14)
+    wr = -100 * _ratio(_highest(h, 14) - c, _highest(h, 14) - _lowest(l, 14))
+    votes.append(_vote((wr[:, -1] < -80) & (wr[:, -1] > wr[:, -2]), (wr[:, -1] > -20) & (wr[:, -1] < wr[:, -2]), wr[:, -1], wr[:, -2]))
+
+    # Bull Bear Power (13), the trend being the direction of its EMA
+    ema13 = _ema(c, 13)
+    bull  = h - ema13
+    bear  = l - ema13
+    trend = ema13[:, -1] - ema13[:, -2]
+    votes.append(_vote((trend > 0) & (bear[:, -1] < 0) & (bear[:, -1] > bear[:, -2]), (trend < 0) & (bull[:, -1] > 0) & (bull[:, -1] < bull[:, -2]), trend, bear[:, -2], bull[:, -2]))
+
+    # Ultimate Oscillator (7, 14, 28)
+    low_or_close = np.fmin(l, c1)
+    bp           = c - low_or_close
+    tr           = np.fmax(h, c1) - low_or_close
+    uo           = 100 * (4 * _ratio(_sum(bp, 7), _sum(tr, 7)) + 2 * _ratio(_sum(bp, 14), _sum(tr, 14)) + _ratio(_sum(bp, 28), _sum(tr, 28))) / 7
+    votes.append(_vote(uo[:, -1] > 70, uo[:, -1] < 30, uo[:, -1]))
+    return votes
+
+def _moving_average_votes(h: np.ndarray, l: np.ndarray, c: np.ndarray, v: np.ndarray) -> list:
+    close = c[:, -1]
+    votes = []
+
+    for n in (10, 20, 30, 50, 100, 200):
+        votes.append(_price_vote(_ema(c, n)[:, -1], close))
+        votes.append(_price_vote(_sma(c, n)[:, -1], close))
+
+    # Ichimoku base line (9, 26, 52, 26): above the cloud with the conversion line over the base line buys
+    conversion = (_highest(h, 9) + _lowest(l, 9)) / 2
+    base       = (_highest(h, 26) + _lowest(l, 26)) / 2
+    lead_a     = _shift((conversion + base) / 2, 25)[:, -1]
+    lead_b     = _shift((_highest(h, 52) + _lowest(l, 52)) / 2, 25)[:, -1]
+    votes.append(_vote((close > np.fmax(lead_a, lead_b)) & (conversion[:, -1] > base[:, -1]),
+                       (close < np.fmin(lead_a, lead_b)) & (conversion[:, -1] < base[:, -1]), lead_a, lead_b, base[:, -1]))
+
+    # VWMA (20)
+    votes.append(_price_vote(_ratio(_sum(c * v, 20), _sum(v, 20))[:, -1], close))
+
+    # Hull MA (9)
+    votes.append(_price_vote(_wma(2 * _wma(c, 4) - _wma(c, 9), 3)[:, -1], close))
+    return votes
+
+
+######################################################################
+### ENGINE
+######################################################################
+
+class IndicatorEngine():
+    def __init__(self, fetch_ohlc) -> None:
+        """
+        fetch_ohlc: callable(pairs, minutes) returning the raw OHLC responses of the pairs, in order.
+
+        recommend() scores the 11 oscillators and 15 moving averages of TradingView's technical summary
+        for every pair at once: each votes +1, -1 or 0 on the latest (still open) candle,
+        the summary is the mean of the oscillator average and the moving average average,
+        and it is turned into STRONG_SELL ... STRONG_BUY with tradingview_ta's thresholds.
+        Indicators are seeded the way pine seeds them, so values close to a threshold can come out differently than on TradingView.
+
+        With watch(), 1 minute candles are kept up to date from the websocket ohlc feed and need no requests.
+
+        """
+        self.__lock:        Lock             = Lock()
+        self.__fetch_ohlc                    = fetch_ohlc
+        self.__live:        dict             = {} # pair -> [candle row] of 1 minute candles from the websocket
+        self.__watched:     set              = set()
+        self.__market_data: KrakenMarketData = None
+        return
+
+    def supports(self, interval: str) -> bool:
+        return interval in KRAKEN_INTERVALS
+
+######################################################################
+### CANDLES
+######################################################################
+
+    def __parse(self, response: dict) -> np.ndarray:
+        """(candles, 7) array of a raw OHLC response, None if it failed."""
+        if len(response.get(Dicts.ERROR, [])) > 0 or Dicts.RESULT not in response.keys():
+            return None
+        rows = next(candles for name, candles in response[Dicts.RESULT].items() if name != "last")
+        return np.array([row[:7] for row in rows], dtype=float).reshape(-1, 7)
+
+    def __resample(self, candles: np.ndarray, seconds: int, offset: int = 0) -> np.ndarray:
+        """Merge candles into candles of `seconds` starting `offset` seconds after the epoch's, like TradingView's."""
+        if len(candles) == 0:
+            return candles
+        starts, first = np.unique((candles[:, TIME] - offset) // seconds, return_index=True)
+        last          = np.append(first[1:], len(candles)) - 1
+        merged        = np.empty((len(first), 7))
+        merged[:, TIME]   = starts * seconds + offset
+        merged[:, OPEN]   = candles[first, OPEN]
+        merged[:, HIGH]   = np.maximum.reduceat(candles[:, HIGH], first)
+        merged[:, LOW]    = np.minimum.reduceat(candles[:, LOW], first)
+        merged[:, CLOSE]  = candles[last, CLOSE]
+        merged[:, VOLUME] = np.add.reduceat(candles[:, VOLUME], first)
+        merged[:, VWAP]   = _ratio(np.add.reduceat(candles[:, VWAP] * candles[:, VOLUME], first)[None, :], merged[None, :, VOLUME])[0]
+        return merged
+
+    def get_candles(self, pairs: list, interval: str) -> dict:
+        """{pair: (candles, 7) array} in `interval`, live ones where the websocket has them and fetched ones for the rest."""
+        minutes, factor, seconds, offset = KRAKEN_INTERVALS[interval]
+        candles = dict()
+
+        if minutes == WebSocket_.OHLC_INTERVAL and self.__market_data is not None and self.__market_data.is_connected():
+            # a pair without a trade for a while has no updates either, fetch it rather than trust an old candle
+            oldest = time.time() - 2 * seconds
+            with self.__lock:
+                for pair in pairs:
+                    rows = self.__live.get(G.asset_pairs.resolve(pair) or pair)
+                    if rows is not None and rows[-1][TIME] >= oldest:
+                        candles[pair] = np.array(rows, dtype=float)
+
+        missing = [pair for pair in pairs if pair not in candles]
+        if len(missing) > 0:
+            for pair, response in zip(missing, self.__fetch_ohlc(missing, minutes)):
+                parsed = self.__parse(response) if isinstance(response, dict) else None
+                if parsed is not None:
+                    candles[pair] = parsed
+                    if minutes == WebSocket_.OHLC_INTERVAL:
+                        self.__seed(pair, parsed)
+
+        if factor > 1:
+            candles = {pair: self.__resample(rows, seconds, offset) for pair, rows in candles.items()}
+        return candles
+
+    def __seed(self, pair: str, candles: np.ndarray) -> None:
+        pair = G.asset_pairs.resolve(pair) or pair
+        if pair in self.__watched and len(candles) > 0:
+            with self.__lock:
+                self.__live[pair] = [list(row) for row in candles[-Signal_.CANDLES:]]
+        return
+
+    def watch(self, market_data: KrakenMarketData, pairs: list) -> None:
+        """Keep the pairs' 1 minute candles current from market_data's ohlc feed, seeded by the first fetch of each pair."""
+        self.__market_data = market_data
+        self.__watched.update(G.asset_pairs.resolve(pair) or pair for pair in pairs)
+        market_data.add_callback(WSFeed.OHLC, self.__on_ohlc)
+        market_data.subscribe(WSFeed.OHLC, pairs, interval=WebSocket_.OHLC_INTERVAL)
+        return
+
+    def __on_ohlc(self, feed: str, pair: str, data: list) -> None:
+        """data: [time, etime, open, high, low, close, vwap, volume, count] of the candle ending at etime."""
+        start = float(data[1]) - WebSocket_.OHLC_INTERVAL * 60
+        row   = [start] + [float(value) for value in data[2:8]]
+
+        with self.__lock:
+            rows = self.__live.get(pair)
+            if rows is None:
+                return
+            if rows[-1][TIME] == start:
+                rows[-1] = row
+            elif rows[-1][TIME] == start - WebSocket_.OHLC_INTERVAL * 60:
+                rows.append(row)
+                del rows[:-Signal_.CANDLES]
+            elif rows[-1][TIME] < start:
+                # candles were missed while disconnected, fetch them again on the next recommend
+                del self.__live[pair]
+        return
+
+######################################################################
+### SUMMARY
+######################################################################
+
+    def __stack(self, candles: list) -> np.ndarray:
+        """(7, symbols, candles) array of the last Signal_.CANDLES candles of each symbol, nan padded at the front."""
+        length  = min(Signal_.CANDLES, max(len(rows) for rows in candles))
+        stacked = np.full((7, len(candles), length), np.nan)
+        for i, rows in enumerate(candles):
+            rows                          = rows[-length:]
+            stacked[:, i, length-len(rows):] = rows.T
+        return stacked
+
+    def get_scores(self, candles: list) -> np.ndarray:
+        """TradingView's Recommend.All, -1 to 1, for each candle array. nan without enough history."""
+        _, o, h, l, c, _, v = self.__stack(candles)
+        if c.shape[1] < 3:
+            return np.full(len(candles), np.nan)
+
+        # symbols without enough history have all nan columns, their mean is nan without a warning
+        with np.errstate(invalid="ignore"), warnings.catch_warnings():
+            warnings.simplefilter("ignore", RuntimeWarning)
+            oscillators     = np.nanmean(np.stack(_oscillator_votes(o, h, l, c)), axis=0)
+            moving_averages = np.nanmean(np.stack(_moving_average_votes(h, l, c, v)), axis=0)
+            return np.nanmean(np.stack([oscillators, moving_averages]), axis=0)
+
+    def classify(self, score: float) -> Optional[str]:
+        """tradingview_ta's Compute.Recommend thresholds, None for a nan score."""
+        if np.isnan(score):
+            return None
+        if score > 0.5:
+            return Signal_.STRONG_BUY
+        if score > 0.1:
+            return Signal_.BUY
+        if score >= -0.1:
+            return Signal_.NEUTRAL
+        if score >= -0.5:
+            return Signal_.SELL
+        return Signal_.STRONG_SELL
+
+    def recommend(self, pairs: list, interval: str) -> dict:
+        """{pair: recommendation} like TradingView's summary, [] for pairs without candles. None for intervals it can't do."""
+        if not self.supports(interval):
+            return None
+
+        candles = {pair: rows for pair, rows in self.get_candles(pairs, interval).items() if len(rows) > 0}
+        result  = {pair: [] for pair in pairs}
+        if len(candles) > 0:
+            for pair, score in zip(candles.keys(), self.get_scores(list(candles.values()))):
+                recommendation = self.classify(score)
+                if recommendation is not None:
+                    result[pair] = recommendation
+        return result
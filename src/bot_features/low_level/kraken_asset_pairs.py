@@ -0,0 +1,169 @@
+"""kraken_asset_pairs.py: Typed AssetPairs index that is built once, persisted for warm starts and shared by every bot."""
+
+import json
+import os
+import time
+
+from typing                              import NamedTuple
+from threading                           import Lock, Thread
+from util.log                            import Log
+from bot_features.low_level.kraken_enums import *
+
+
+class PairInfo(NamedTuple):
+    pair:          str
+    altname:       str
+    wsname:        str
+    base:          str
+    quote:         str
+    ordermin:      float
+    pair_decimals: int
+    lot_decimals:  int
+    cost_decimals: int
+    tick_size:     float
+
+
+class AssetPairIndex():
+    def __init__(self, path: str = ASSET_PAIRS_JSON) -> None:
+        """
+        Pair metadata keyed by kraken's pair name (XXBTZUSD).
+        Lookups also accept the altname (XBTUSD) and the websocket name (XBT/USD).
+
+        """
+        self.__lock:   Lock   = Lock()
+        self.__index:  tuple  = ({}, {}) # (pairs, names), swapped in one assignment so readers never see half of a refresh
+        self.__thread: Thread = None
+        self.path:     str    = path
+        self.updated:  float  = 0.0
+        self.log:      Log    = Log() # util.globals imports this module, so it can't use G.log
+        return
+
+    def __len__(self) -> int:
+        return len(self.__index[0])
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.__index[1]
+
+    def __parse(self, pair: str, info: dict) -> PairInfo:
+        pair_decimals = int(info[Dicts.PAIR_DECIMALS])
+        return PairInfo(
+            pair          = pair,
+            altname       = info.get(Dicts.ALT_NAME, pair),
+            wsname        = info.get(Dicts.WS_NAME, ""),
+            base          = info.get(Dicts.BASE, ""),
+            quote         = info.get(Dicts.QUOTE, ""),
+            ordermin      = float(info.get(Dicts.ORDER_MIN, 0)),
+            pair_decimals = pair_decimals,
+            lot_decimals  = int(info[Dicts.LOT_DECIMALS]),
+            cost_decimals = int(info.get(Dicts.COST_DECIMALS, DECIMAL_MAX)),
+            tick_size     = float(info.get(Dicts.TICK_SIZE, 10 ** -pair_decimals)))
+
+    def __set(self, pairs: dict, updated: float) -> None:
+        names = {}
+        for info in pairs.values():
+            for name in (info.pair, info.altname, info.wsname):
+                if len(name) > 0:
+                    names[name] = info.pair
+
+        self.__index = (pairs, names)
+        self.updated = updated
+        return
+
+    def build(self, result: dict) -> None:
+        """Build the index from the result of the AssetPairs endpoint."""
+        self.__set({pair: self.__parse(pair, info) for pair, info in result.items()}, time.time())
+        return
+
+    def save(self) -> None:
+        directory = os.path.dirname(self.path)
+        if len(directory) > 0 and not os.path.exists(directory):
+            os.makedirs(directory)
+
+        # write to a temp file first so a crash never leaves a half written index behind
+        with open(self.path + ".tmp", FileMode.WRITE_TRUNCATE) as file:
+            json.dump({"updated": self.updated, "fields": list(PairInfo._fields), "pairs": [list(info) for info in self.__index[0].values()]}, file)
+        os.replace(self.path + ".tmp", self.path)
+        return
+
+    def load(self) -> bool:
+        """Load the index saved by a previous run. Returns False if there is none or it can't be read."""
+        if not os.path.exists(self.path):
+            return False
+        try:
+            with open(self.path, FileMode.READ_ONLY) as file:
+                saved = json.load(file)
+            if saved["fields"] != list(PairInfo._fields):
+                return False
+            self.__set({row[0]: PairInfo(*row) for row in saved["pairs"]}, saved["updated"])
+            return True
+        except Exception as e:
+            self.log.print_and_log(e=e, error_type=type(e).__name__, filename=__file__, tb_lineno=e.__traceback__.tb_lineno)
+        return False
+
+    def is_stale(self) -> bool:
+        return time.time() - self.updated > AssetPairs_.REFRESH_SECONDS
+
+    def refresh(self, fetch) -> bool:
+        """
+        fetch: callable returning the raw AssetPairs response.
+        Keeps the current index if the request fails.
+
+        """
+        try:
+            response = fetch()
+            if len(response.get(Dicts.ERROR, [])) > 0 or Dicts.RESULT not in response.keys():
+                self.log.print_and_log(f"AssetPairs refresh failed: {response.get(Dicts.ERROR)}")
+                return False
+            self.build(response[Dicts.RESULT])
+            self.save()
+            return True
+        except Exception as e:
+            self.log.print_and_log(e=e, error_type=type(e).__name__, filename=__file__, tb_lineno=e.__traceback__.tb_lineno)
+        return False
+
+    def ensure_loaded(self, fetch, stop_event=None) -> None:
+        """
+        Load from disk for an instant warm start and only fetch if there is nothing on disk.
+        A background thread then refreshes the index, straight away if what was loaded is stale.
+
+        stop_event: the thread exits once this event is set.
+
+        """
+        with self.__lock:
+            if self.__thread is not None:
+                return
+
+            if len(self) == 0 and not self.load():
+                self.refresh(fetch)
+
+            if len(self) == 0:
+                raise Exception("Could not load the AssetPairs index")
+
+            self.__thread = Thread(target=self.__refresh_loop, args=(fetch, stop_event), name="asset-pairs-refresh", daemon=True)
+            self.__thread.start()
+        return
+
+    def __refresh_loop(self, fetch, stop_event) -> None:
+        while True:
+            if self.is_stale():
+                self.refresh(fetch)
+
+            # a failed refresh leaves the index stale, so try again in a minute rather than spinning
+            timeout = max(60.0, AssetPairs_.REFRESH_SECONDS - (time.time() - self.updated))
+            if stop_event is not None:
+                if stop_event.wait(timeout):
+                    return
+            else:
+                time.sleep(timeout)
+
+    def resolve(self, name: str) -> str:
+        """Kraken's pair name for any pair name, altname or wsname. Empty string if unknown."""
+        return self.__index[1].get(name, "")
+
+    def get(self, name: str) -> PairInfo:
+        """Raises KeyError for unknown pairs, like the nested dict lookups it replaces."""
+        pairs, names = self.__index
+        return pairs[names[name]]
+
+    def get_pairs(self) -> list:
+        return list(self.__index[0].values())
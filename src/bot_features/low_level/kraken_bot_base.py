@@ -1,24 +1,141 @@
 """spot.py: Supports base functionality for buying, selling and transfering. Meant to be inherited from for additional classes"""
 
-import ast
-import requests
+import random
 
-from datetime                                import datetime
-from util.globals                            import G
-from bot_features.low_level.kraken_rest_api  import KrakenRestAPI
-from bot_features.low_level.kraken_enums     import *
+from datetime                                     import datetime
+from util.globals                                 import G
+from util.colors                                  import Color
+from bot_features.low_level.kraken_rest_api       import KrakenRestAPI, Quote
+from bot_features.low_level.kraken_rest_api_async import AsyncKrakenRestAPI, get_runner
+from bot_features.low_level.kraken_transport      import KrakenTransport
+from bot_features.low_level.kraken_websocket      import KrakenOrderGateway, get_market_data, get_order_gateway
+from bot_features.low_level.kraken_order_book     import OrderBook, get_order_books
+from bot_features.low_level.kraken_enums          import *
 
 
 class KrakenBotBase(KrakenRestAPI):
-    def __init__(self, parameter_dict: dict) -> None:
+    def __init__(self, parameter_dict: dict, transport: KrakenTransport = None) -> None:
         """
         Returns new Spot object with specified data
+        Pass in the transport of another bot to share its connection pool and latency stats.
         
         """
-        super().__init__(key=parameter_dict[KRAKEN_API_KEY], secret=parameter_dict[KRAKEN_SECRET_KEY])
-        self.asset_pairs_dict: dict = {}
+        super().__init__(key=parameter_dict[KRAKEN_API_KEY], secret=parameter_dict[KRAKEN_SECRET_KEY], transport=transport)
+        self.aio:     AsyncKrakenRestAPI = AsyncKrakenRestAPI(key=self.key, secret=self.secret, transport=self.transport)
+        self.gateway: KrakenOrderGateway = get_order_gateway(self.get_web_sockets_token)
+
+        # shared by every bot in the process, only the first one to get here loads it
+        G.asset_pairs.ensure_loaded(self.__fetch_asset_pairs, G.event)
         return
+
+    def run_concurrently(self, coroutines: list, return_exceptions: bool = False) -> list:
+        """
+        Run coroutines from self.aio concurrently on the shared event loop and return their results in order.
+        For example: self.run_concurrently([self.aio.get_ticker_information(pair) for pair in pairs])
+        
+        """
+        return get_runner().gather(coroutines, return_exceptions=return_exceptions)
        
+    def market_order(self, type: str, volume: str, pair: str) -> dict:
+        """Placed over the websocket order gateway while it is connected, over REST otherwise."""
+        result = self.__reconcile(self.gateway.add_order(Data.MARKET, type, volume, pair))
+        return result if result is not None else super().market_order(type, volume, pair)
+
+    def limit_order(self, type: str, volume: str, pair: str, price: str) -> dict:
+        """Placed over the websocket order gateway while it is connected, over REST otherwise."""
+        result = self.__reconcile(self.gateway.add_order(Data.LIMIT, type, volume, pair, price))
+        return result if result is not None else super().limit_order(type, volume, pair, price)
+
+    def __reconcile(self, result: dict) -> dict:
+        """
+        An addOrder the gateway sent without getting an answer may still have been placed.
+        Look it up by its userref in the open and closed orders, and return it as placed if it is there,
+        so a live order is never reported as failed and placed again. Otherwise the gateway's error stands.
+
+        """
+        if result is None or Data.USER_REF not in result.keys():
+            return result
+
+        userref = result[Data.USER_REF]
+        for response, key in ((self.get_open_orders(trades=False, userref=userref), Dicts.OPEN), (self.get_closed_orders(userref=userref), Dicts.CLOSED)):
+            if len(response.get(Dicts.ERROR, [])) > 0 or Dicts.RESULT not in response.keys():
+                G.log.print_and_log(Color.FG_YELLOW + f"Can't look up the unanswered order {userref}{Color.ENDC} {response.get(Dicts.ERROR)}")
+                return result
+
+            for txid, order in response[Dicts.RESULT].get(key, {}).items():
+                G.log.print_and_log(Color.FG_YELLOW + f"Unanswered order {userref} was placed{Color.ENDC} {txid}")
+                return {Dicts.ERROR: [], Dicts.RESULT: {Dicts.DESCR: {Dicts.ORDER: order[Dicts.DESCR][Dicts.ORDER]}, Data.TXID: [txid]}}
+        return result
+
+    def limit_orders(self, type: str, orders: list, pair: str) -> list:
+        """
+        Place several limit orders for one pair, orders being [(volume, price), ...].
+        They go out with AddOrderBatch, up to ORDER_BATCH_MAX per request, a lone leftover order goes through limit_order.
+
+        Returns one result per order, in the order given and shaped like a limit_order result,
+        so {"error": [], "result": {"descr": ..., "txid": [txid]}} or {"error": [message]}.
+        If a whole batch is rejected, each of its orders gets the batch's error.
+        Kraken answers a batch with its orders in the order they were sent. Every order of a batch also carries the batch's userref,
+        so if the answer doesn't have one entry per order, the orders are matched by price in OpenOrders instead.
+
+        """
+        info    = G.asset_pairs.get(pair)
+        results = []
+
+        for i in range(0, len(orders), ORDER_BATCH_MAX):
+            chunk = orders[i:i+ORDER_BATCH_MAX]
+            if len(chunk) < ORDER_BATCH_MIN:
+                results.extend(self.limit_order(type, volume, pair, price) for volume, price in chunk)
+                continue
+
+            userref = random.randint(1, 2**31 - 1)
+            batch   = [{Data.ORDER_TYPE: Data.LIMIT,
+                        Data.TYPE:       type,
+                        Data.VOLUME:     f"{float(volume):.{info.lot_decimals}f}",
+                        Data.PRICE:      f"{float(price):.{info.pair_decimals}f}",
+                        Data.USER_REF:   userref} for volume, price in chunk]
+            response = self.add_order_batch(batch, pair)
+
+            if len(response.get(Dicts.ERROR, [])) > 0 or Dicts.RESULT not in response.keys():
+                results.extend({Dicts.ERROR: response.get(Dicts.ERROR, [])} for _ in chunk)
+                continue
+
+            if len(response[Dicts.RESULT][Data.ORDERS]) != len(chunk):
+                G.log.print_and_log(Color.FG_YELLOW + f"AddOrderBatch answered {len(response[Dicts.RESULT][Data.ORDERS])} of {len(chunk)} orders{Color.ENDC} {pair}, matching them by price")
+                results.extend(self.__match_batch(chunk, userref, info.pair_decimals))
+                continue
+
+            for order in response[Dicts.RESULT][Data.ORDERS]:
+                if Dicts.ERROR in order.keys():
+                    results.append({Dicts.ERROR: [order[Dicts.ERROR]]})
+                else:
+                    results.append({Dicts.ERROR: [], Dicts.RESULT: {Dicts.DESCR: order.get(Dicts.DESCR, {}), Data.TXID: [order[Data.TXID]]}})
+        return results
+
+    def __match_batch(self, chunk: list, userref: int, pair_decimals: int) -> list:
+        """One result per (volume, price) of a batch tagged `userref`, from the open orders with that userref."""
+        response = self.get_open_orders(trades=False, userref=userref)
+        if len(response.get(Dicts.ERROR, [])) > 0 or Dicts.RESULT not in response.keys():
+            return [{Dicts.ERROR: response.get(Dicts.ERROR, [KError.BATCH_UNMATCHED])} for _ in chunk]
+
+        by_price = {round(float(order[Dicts.DESCR][Data.PRICE]), pair_decimals): (txid, order) for txid, order in response[Dicts.RESULT].get(Dicts.OPEN, {}).items()}
+        results  = []
+        for _, price in chunk:
+            match = by_price.get(round(float(price), pair_decimals))
+            if match is None:
+                results.append({Dicts.ERROR: [KError.BATCH_UNMATCHED]})
+            else:
+                results.append({Dicts.ERROR: [], Dicts.RESULT: {Dicts.DESCR: {Dicts.ORDER: match[1][Dicts.DESCR][Dicts.ORDER]}, Data.TXID: [match[0]]}})
+        return results
+
+    def cancel_order(self, txid: str) -> dict:
+        result = self.gateway.cancel_order(txid)
+        return result if result is not None else super().cancel_order(txid)
+
+    def cancel_all_orders(self) -> dict:
+        result = self.gateway.cancel_all()
+        return result if result is not None else super().cancel_all_orders()
+
     def get_current_time(self) -> str:
         """Returns the current time in hours:minutes:seconds format."""
         return datetime.now().strftime("%H:%M:%S")
@@ -45,75 +162,143 @@ class KrakenBotBase(KrakenRestAPI):
         not in the dictionary, the pair cannot be used to buy or sell.
         
         """
-        response = requests.get(URL_ASSET_PAIRS)
-        return ast.literal_eval(response.text)
+        return self.query_url(URL_ASSET_PAIRS, Method.ASSET_PAIRS)
+
+    def __fetch_asset_pairs(self) -> dict:
+        """Used by the background refresh of G.asset_pairs, so it has to skip the response cache."""
+        self.invalidate_cache(Method.ASSET_PAIRS)
+        return self.get_all_tradable_asset_pairs()
             
     def get_order_min(self, symbol_pair: str) -> float:  
         """
         Returns the min quantity of coin we can order per USD.
         
         """
-        return float(self.asset_pairs_dict[symbol_pair][Dicts.ORDER_MIN])
+        return G.asset_pairs.get(symbol_pair).ordermin
     
     def get_max_price_precision(self, symbol_pair: str) -> int:
         """
         Returns the maximum price precision in number of decimals
         
         """
-        return int(self.asset_pairs_dict[symbol_pair][Dicts.PAIR_DECIMALS])
+        return G.asset_pairs.get(symbol_pair).pair_decimals
 
     def get_max_volume_precision(self, symbol_pair: str) -> int:
         """
         Returns the maximum volume precision in terms number of decimals
         
         """
-        return int(self.asset_pairs_dict[symbol_pair][Dicts.LOT_DECIMALS])
+        return G.asset_pairs.get(symbol_pair).lot_decimals
         
     def get_withdrawal_precision_max(self, symbol: str) -> int:
         """Gets maximum decimal places when withdrawal of coin"""
         return int(self.get_asset_info()[Dicts.RESULT][symbol][Dicts.DECIMALS])
         
+    def get_tickers(self, pairs: list) -> dict:
+        """
+        Returns {pair: Quote(ask, bid, last)} for every pair in `pairs`, keyed by the name it was asked for.
+        Kraken's Ticker endpoint takes a comma separated list of pairs,
+        so this is one request per TICKER_BATCH_MAX pairs and the batches are sent concurrently.
+        
+        Pairs that kraken does not list are left out, because a single unknown pair fails the whole request.
+        Pairs with a live quote from the websocket ticker feed are answered without a request.
+        
+        """
+        market_data = get_market_data()
+        requested   = {}
+        table       = {}
+        
+        for pair in pairs:
+            if pair in G.asset_pairs:
+                # pairs subscribed to on the websocket are pushed to us, so they don't need a request
+                quote = market_data.get_quote(pair)
+                book  = get_order_books().get(pair)
+                if quote is not None:
+                    # a live order book has the best prices as of its last update, the ticker only moves on trades
+                    table[pair] = quote if book is None else Quote(book.best_ask(), book.best_bid(), quote.last)
+                else:
+                    # kraken answers with the canonical pair name (XXBTZUSD) even when asked for the altname (XBTUSD)
+                    requested.setdefault(G.asset_pairs.resolve(pair), []).append(pair)
+
+        canonical_pairs = list(requested.keys())
+        batches         = [canonical_pairs[i:i+TICKER_BATCH_MAX] for i in range(0, len(canonical_pairs), TICKER_BATCH_MAX)]
+        responses       = self.run_concurrently([self.aio.get_ticker_information(pair=",".join(batch)) for batch in batches])
+
+        for response in responses:
+            if not self.has_result(response):
+                G.log.print_and_log(f"get_tickers: {response[Dicts.ERROR]}")
+                continue
+            for key, ticker in response[Dicts.RESULT].items():
+                quote = self.parse_quote(ticker)
+                for pair in requested.get(key, [key]):
+                    table[pair] = quote
+        return table
+
     def get_ask_price(self, symbol_pair: str) -> float:
         """
         Gets the current ask price for a symbol pair on kraken. 
         
         """
-        current_price = self.get_ticker_information(pair=symbol_pair)
-        current_price = self.parse_ticker_information(current_price)
-        return self.parse_ask_price(current_price)
+        return self.get_tickers([symbol_pair]).get(symbol_pair, Quote(0.0, 0.0, 0.0)).ask
 
     def get_bid_price(self, symbol_pair: str) -> float:
         """Gets the current bid price for a symbol pair"""
-        current_price = self.get_ticker_information(pair=symbol_pair)
-        current_price = self.parse_ticker_information(current_price)
-        return self.parse_bid_price(current_price)
+        return self.get_tickers([symbol_pair]).get(symbol_pair, Quote(0.0, 0.0, 0.0)).bid
+
+    def get_order_book(self, symbol_pair: str) -> OrderBook:
+        """The live order book of a pair subscribed with get_order_books().subscribe, None while it isn't in sync."""
+        return get_order_books().get(symbol_pair)
+
+    def get_symbol_resolver(self):
+        """G.symbols, built from the (cached) Assets response and G.asset_pairs the first time it is needed."""
+        if not G.symbols.is_built():
+            G.symbols.build(self.get_asset_info()[Dicts.RESULT], G.asset_pairs.get_pairs())
+        return G.symbols
 
     def get_alt_name(self, symbol: str) -> str:
-        assets = self.get_asset_info()
-        return assets[Dicts.RESULT][symbol][Dicts.ALT_NAME]
+        return self.get_symbol_resolver().get_altname(symbol)
 
     def get_tradable_asset_pair(self, symbol: str) -> str:
         """Returns the asset pair that matches the symbol and can be traded with either USD or ZUSD."""
-        while len(symbol) > 0:
-            if symbol + StableCoins.USD in self.asset_pairs_dict.keys():
-                return symbol + StableCoins.USD
-            elif symbol + StableCoins.ZUSD in self.asset_pairs_dict.keys():
-                return symbol + StableCoins.ZUSD
-            else:
-                """
-                If we couldn't find the symbol pair, try removing the first character in the symbol and search again
-                This will probably happen with symbols like "XXDG"
-                
-                """
-                symbol = symbol[1:]
-        return "NOT FOUND"
+        symbol_pair = self.get_symbol_resolver().resolve(symbol)
+        return symbol_pair if len(symbol_pair) > 0 else "NOT FOUND"
+
+    def get_orders_info(self, txids: list) -> dict:
+        """{txid: order} of every txid, QUERY_ORDERS_MAX per QueryOrders call. Raises if a call fails."""
+        orders = dict()
+        for i in range(0, len(txids), QUERY_ORDERS_MAX):
+            response = self.query_orders_info(",".join(txids[i:i+QUERY_ORDERS_MAX]), trades=False)
+            if len(response.get(Dicts.ERROR, [])) > 0 or Dicts.RESULT not in response.keys():
+                raise Exception(f"QueryOrders failed: {response.get(Dicts.ERROR)}")
+            orders.update(response[Dicts.RESULT])
+        return orders
+
+    def get_oldest_open_time(self, txids: list) -> float:
+        """When the oldest of the orders was opened, None if Kraken knows none of them."""
+        opened = [float(order[Dicts.OPEN_TIME]) for order in self.get_orders_info(txids).values() if Dicts.OPEN_TIME in order]
+        return min(opened) if len(opened) > 0 else None
+
+    def sync_trade_history(self, order_txids: list = None) -> bool:
+        """
+        Pull the trades made since the last sync into G.trade_history. Returns False if it couldn't be brought up to date.
+        order_txids: the orders still waiting for a fill. The first sync reaches back to when the oldest of them was opened,
+                     and once synced the older trades of every other order are pruned.
+
+        """
+        get_since = (lambda: self.get_oldest_open_time(order_txids)) if order_txids else None
+        if not G.trade_history.sync(lambda start, ofs: self.get_trades_history(start=start, ofs=ofs), get_since):
+            return False
+
+        if order_txids is not None:
+            G.trade_history.prune(set(order_txids))
+        return True
 
     def get_pair_decimals(self, symbol_pair: str) -> int:
         """Returns pair_decimals: this is the maximum amount of decimals you can use to order the coin in terms of USD.
         For example, if you want to order 1 FILUSD, the max decimals you can use for price will be determined by the pair_decimals key.
         If pair_decimals is 3, then 60.111 will be the most specific price you can use.
         If pair_decimals is 4, then 60.1111 will be the most specific price you can use."""
-        return self.asset_pairs_dict[symbol_pair][Dicts.PAIR_DECIMALS]
+        return G.asset_pairs.get(symbol_pair).pair_decimals
 
     def has_result(self, dictionary: dict) -> bool:
         """Returns True if "result" is returned in dict.
@@ -0,0 +1,71 @@
+"""kraken_cache.py: Size bounded TTL cache in front of Kraken's public endpoints."""
+
+import time
+
+from collections import OrderedDict
+from threading   import Lock
+
+
+class TTLCache():
+    def __init__(self, max_size: int = 256) -> None:
+        """
+        Least recently used entries are evicted once max_size is reached.
+        Cached responses are shared between callers, so they must not be modified.
+
+        """
+        self.__lock:    Lock        = Lock()
+        self.__entries: OrderedDict = OrderedDict()
+        self.max_size:  int         = max_size
+        self.hits:      int         = 0
+        self.misses:    int         = 0
+        self.evictions: int         = 0
+        return
+
+    def get(self, key: tuple) -> tuple:
+        """Returns (True, value) on a hit and (False, None) on a miss or an expired entry."""
+        with self.__lock:
+            entry = self.__entries.get(key)
+
+            if entry is None or entry[0] <= time.monotonic():
+                if entry is not None:
+                    del self.__entries[key]
+                self.misses += 1
+                return False, None
+
+            self.__entries.move_to_end(key)
+            self.hits += 1
+            return True, entry[1]
+
+    def set(self, key: tuple, value, ttl: float) -> None:
+        with self.__lock:
+            self.__entries[key] = (time.monotonic() + ttl, value)
+            self.__entries.move_to_end(key)
+
+            while len(self.__entries) > self.max_size:
+                self.__entries.popitem(last=False)
+                self.evictions += 1
+        return
+
+    def invalidate(self, method: str = None) -> None:
+        """Drop every entry of one endpoint, or everything if no endpoint is given."""
+        with self.__lock:
+            if method is None:
+                self.__entries.clear()
+            else:
+                for key in [key for key in self.__entries.keys() if key[0] == method]:
+                    del self.__entries[key]
+        return
+
+    def get_stats(self) -> dict:
+        with self.__lock:
+            lookups = self.hits + self.misses
+            return {
+                "size":      len(self.__entries),
+                "hits":      self.hits,
+                "misses":    self.misses,
+                "evictions": self.evictions,
+                "hit_rate":  round(self.hits / lookups, 3) if lookups > 0 else 0.0}
+
+    def summary(self) -> str:
+        stats = self.get_stats()
+        return f"cache {stats['hits']} hits, {stats['misses']} misses ({round(100 * stats['hit_rate'], 1)}%), {stats['size']} entries"
@@ -4,12 +4,19 @@ from enum import auto
 DECIMAL_MAX = 8
 
 # Base
+TICKER_BATCH_MAX  = 100
+ORDER_BATCH_MIN   = 2
+ORDER_BATCH_MAX   = 15
+QUERY_ORDERS_MAX  = 50
 KRAKEN_API_KEY    = 'kraken_api_key'
 KRAKEN_SECRET_KEY = 'kraken_secret_key'
 URL_ASSET_PAIRS   = 'https://api.kraken.com/0/public/AssetPairs'
 
-KRAKEN_COINS_JSON = "src/kraken_files/json_files/kraken_coins.json"
-CONFIG_JSON       = 'src/kraken_files/json_files/config.json'
+KRAKEN_COINS_JSON  = "src/kraken_files/json_files/kraken_coins.json"
+CONFIG_JSON        = 'src/kraken_files/json_files/config.json'
+ASSET_PAIRS_JSON   = "src/kraken_files/json_files/asset_pairs_index.json"
+NONCE_DIR          = "src/kraken_files/nonce"
+TRADE_HISTORY_JSON = "src/kraken_files/json_files/trade_history.json"
 
 
 class Buy_:
@@ -18,6 +25,43 @@ class Buy_:
     TIME_MINUTES = 1
     USD_TO_SPEND = auto()
     SET          = set()
+    WORKERS      = 4 # symbols processed at the same time, each symbol still by one worker at a time
+
+class Schedule_:
+    MIN_SECONDS       = 5
+    MAX_SECONDS       = 300
+    IDLE_SECONDS      = 300  # no orders open, only the buy signal to look at
+    SIGMAS            = 3.0  # check again before reaching the nearest order price would be a move this many deviations large
+    FAR_DISTANCE      = 0.10 # without a volatility estimate, an order this far away (10%) gets MAX_SECONDS
+    VOLATILITY_ALPHA  = 0.05 # weight of each ticker update in the volatility EWMA
+    SYNC_BUDGET_SHARE = 0.5  # share of the private api counter's decay that TradesHistory syncs may use
+
+class Signal_:
+    TRADINGVIEW = "tradingview"
+    LOCAL       = "local"       # computed from kraken's OHLC by the IndicatorEngine
+    SOURCE      = TRADINGVIEW
+    CANDLES     = 720           # the most kraken's OHLC returns, enough for the 200 candle averages
+    STRONG_BUY  = "STRONG_BUY"
+    BUY         = "BUY"
+    NEUTRAL     = "NEUTRAL"
+    SELL        = "SELL"
+    STRONG_SELL = "STRONG_SELL"
+
+class SQLPool_:
+    SIZE           = 8
+    TIMEOUT        = 10 # seconds to wait for a connection when all of them are in use
+    PING_SECONDS   = 60 # a connection idle longer than this is pinged before it is used again
+    STATEMENTS_MAX = 64 # prepared statements kept open per connection
+
+class Storage_:
+    MYSQL             = "mysql"
+    SQLITE            = "sqlite"
+    BACKEND           = MYSQL
+    SQLITE_FILE       = "src/kraken_files/dca.sqlite3"
+    SQLITE_BUSY_MS    = 5000              # how long a write waits for another connection's write transaction
+    SQLITE_CACHE_KB   = 16000             # page cache per connection
+    SQLITE_MMAP_BYTES = 256 * 1024 * 1024 # database file reads go through a memory map up to this size
+    SQLITE_STATEMENTS = 128               # compiled statements sqlite3 keeps per connection
 
 class DCA_:
     TARGET_PROFIT_PERCENT        = auto()
@@ -42,6 +86,13 @@ class Dicts:
     PAIR_DECIMALS = "pair_decimals"
     LOT_DECIMALS = "lot_decimals"
     ALT_NAME = "altname"
+    WS_NAME = "wsname"
+    BASE = "base"
+    QUOTE = "quote"
+    COST_DECIMALS = "cost_decimals"
+    TICK_SIZE = "tick_size"
+    COUNT = "count"
+    TIME = "time"
     RESULT = "result"
     ERROR = "error"
     DECIMALS = "decimals"
@@ -49,6 +100,9 @@ class Dicts:
     ASSET = "Asset"
     DESCR = "descr"
     OPEN = "open"
+    STATUS = "status"
+    OPEN_TIME = "opentm"
+    CLOSED = "closed"
     # For ticker information
     ASK_PRICE = "a"
     BID_PRICE = "b"
@@ -77,6 +131,14 @@ class Coins:
     DOGE = "XXDG"
 
 
+class SymbolAliases:
+    # common tickers that kraken spells differently
+    ALIASES = {
+        "BTC":  "XBT",
+        "DOGE": "XDG",
+    }
+
+
 class Trade:
     ZUSD = "ZUSD"
     MARKET = "market"
@@ -121,6 +183,7 @@ class Method:
 
     # User Trading
     ADD_ORDER = "AddOrder"
+    ADD_ORDER_BATCH = "AddOrderBatch"
     CANCEL_ORDER = "CancelOrder"
     CANCEL_ALL = "CancelAll"
     CANCEL_ALL_ORDERS_AFTER = "CancelAllOrdersAfter"
@@ -146,6 +209,130 @@ class Method:
     GET_WEBSOCKETS_TOKEN = "GetWebSocketsToken"
 
 
+class Transport_:
+    POOL_CONNECTIONS = 4
+    POOL_MAXSIZE     = 16
+    TIMEOUT          = 10
+    RETRIES_MAX      = 4
+    BACKOFF_BASE     = 0.5
+    BACKOFF_MAX      = 8.0
+
+    # seconds, for endpoints that need more (or less) than TIMEOUT
+    TIMEOUTS = {
+        Method.ASSETS:          20,
+        Method.ASSET_PAIRS:     20,
+        Method.TRADE_HISTORY:   30,
+        Method.LEDGERS:         30,
+        Method.CLOSED_ORDERS:   30,
+        Method.ADD_ORDER:       5,
+        Method.ADD_ORDER_BATCH: 10,
+        Method.CANCEL_ORDER:    5,
+        Method.CANCEL_ALL:      5,
+    }
+
+    # An order endpoint that times out or returns a 5xx may still have been executed by Kraken,
+    # so these are only retried when the request was rejected outright (rate limit).
+    NO_RETRY = {
+        Method.ADD_ORDER,
+        Method.ADD_ORDER_BATCH,
+        Method.CANCEL_ORDER,
+        Method.CANCEL_ALL,
+        Method.CANCEL_ALL_ORDERS_AFTER,
+        Method.WITHDRAWL,
+        Method.WALLET_TRANSFER,
+        Method.STAKE,
+        Method.UNSTAKE,
+    }
+
+
+class Cache_:
+    MAX_SIZE = 256
+
+    # seconds a successful public response is reused for
+    TTLS = {
+        Method.ASSETS:        3600,
+        Method.ASSET_PAIRS:   3600,
+        Method.SYSTEM_STATUS: 30,
+        Method.SERVER_TIME:   1,
+    }
+
+
+class AssetPairs_:
+    REFRESH_SECONDS = 3600
+
+
+class TradeHistory_:
+    # each sync asks for trades from this many seconds before the newest stored one, duplicates are dropped by txid
+    OVERLAP_SECONDS = 60
+    PAGES_MAX       = 200
+
+
+class WebSocket_:
+    URL_PUBLIC        = "wss://ws.kraken.com/"
+    URL_PRIVATE       = "wss://ws-auth.kraken.com/"
+    CONNECT_TIMEOUT   = 10
+    RECV_TIMEOUT      = 1
+    # kraken sends a heartbeat every second on an idle connection, so this long without any frame means it is dead
+    HEARTBEAT_TIMEOUT = 10
+    BACKOFF_BASE      = 1.0
+    BACKOFF_MAX       = 30.0
+    QUEUE_MAX         = 10000
+    ORDER_TIMEOUT     = 5
+    BOOK_DEPTH        = 10
+    OHLC_INTERVAL     = 1
+
+
+class WSFeed:
+    TICKER      = "ticker"
+    SPREAD      = "spread"
+    TRADE       = "trade"
+    OHLC        = "ohlc"
+    BOOK        = "book"
+    OWN_TRADES  = "ownTrades"
+    OPEN_ORDERS = "openOrders"
+
+
+class WSEvent:
+    SUBSCRIBE           = "subscribe"
+    UNSUBSCRIBE         = "unsubscribe"
+    HEARTBEAT           = "heartbeat"
+    SUBSCRIPTION_STATUS = "subscriptionStatus"
+    SYSTEM_STATUS       = "systemStatus"
+    ADD_ORDER           = "addOrder"
+    CANCEL_ORDER        = "cancelOrder"
+    CANCEL_ALL          = "cancelAll"
+    OK                  = "ok"
+    ERROR               = "error"
+
+
+class RateLimit_:
+    TIER = "starter"
+
+    # (counter maximum, counter decrease per second) for each verification tier
+    # https://docs.kraken.com/rest/#section/Rate-Limits/REST-API-Rate-Limits
+    TIERS = {
+        "starter":      (15, 0.33),
+        "intermediate": (20, 0.5),
+        "pro":          (20, 1.0),
+    }
+
+    # every private call not listed here costs 1.
+    # Orders are limited per pair by the matching engine, not by the api counter.
+    COSTS = {
+        Method.TRADE_HISTORY:           2,
+        Method.LEDGERS:                 2,
+        Method.ADD_ORDER:               0,
+        Method.ADD_ORDER_BATCH:         0,
+        Method.CANCEL_ORDER:            0,
+        Method.CANCEL_ALL:              0,
+        Method.CANCEL_ALL_ORDERS_AFTER: 0,
+    }
+
+    # public endpoints have their own budget, roughly one call per second
+    PUBLIC_MAX   = 10
+    PUBLIC_DECAY = 1.0
+
+
 class Data:
     TXID = "txid"
     TRADES = "trades"
@@ -159,7 +346,12 @@ class Data:
     TYPE = "type"
     ASSET = "asset"
     START = "start"
+    ORDERS = "orders"
+    END = "end"
+    OFS = "ofs"
     PAIR = "pair"
+    INTERVAL = "interval"
+    SINCE = "since"
     TIMEOUT = "timeout"
     ORDER_TYPE = "ordertype"
     TYPE = "type"
@@ -265,6 +457,8 @@ class ConfigKeys:
 
     # buy
     BUY_SET = "buy_set"
+    BUY_WORKERS = "buy_workers" # optional
+    SIGNAL_SOURCE = "signal_source" # optional: tradingview or local
 
     # dca
     DCA_TARGET_PROFIT_PERCENT = "dca_target_profit_percent"
@@ -277,9 +471,32 @@ class ConfigKeys:
     DCA_SAFETY_ORDER_STEP_SCALE = "dca_safety_order_step_scale"
     DCA_SAFETY_ORDER_PRICE_DEVIATION = "dca_safety_order_price_deviation"
 
+    # transport (optional)
+    TRANSPORT_POOL_MAXSIZE = "transport_pool_maxsize"
+    TRANSPORT_TIMEOUT      = "transport_timeout"
+    TRANSPORT_RETRIES_MAX  = "transport_retries_max"
+
+    # mysql connection pool (optional)
+    SQL_POOL_SIZE    = "sql_pool_size"
+    SQL_POOL_TIMEOUT = "sql_pool_timeout"
+
+    # storage (optional): mysql, or sqlite for an embedded database file
+    STORAGE_BACKEND = "storage_backend"
+    SQLITE_FILE     = "sqlite_file"
+
+    # rate limit (optional): starter, intermediate or pro
+    KRAKEN_TIER = "kraken_tier"
+
 class KError:
     INSUFFICIENT_FUNDS = 'EOrder:Insufficient funds'
     INVALID_VOLUME     = 'EGeneral:Invalid arguments:volume'
+    RATE_LIMIT         = 'EAPI:Rate limit exceeded'
+    INVALID_NONCE      = 'EAPI:Invalid nonce'
+    # not kraken's, returned by the websocket order gateway when a request went out but no answer came back
+    WS_TIMEOUT         = 'EGeneral:Websocket request timed out'
+    WS_DISCONNECTED    = 'EGeneral:Websocket closed before the request was answered'
+    # not kraken's either, an order of an AddOrderBatch that the response left out and OpenOrders doesn't have
+    BATCH_UNMATCHED    = 'EGeneral:Batch order missing from the response'
           
 class SQLTable:
     SAFETY_ORDERS     = "safety_orders"
@@ -0,0 +1,105 @@
+"""kraken_nonce.py: Strictly increasing nonces for one API key, shared by every thread and every process using that key."""
+
+import hashlib
+import os
+import sys
+import time
+
+from threading                           import Lock
+from util.globals                        import G
+from bot_features.low_level.kraken_enums import *
+
+if sys.platform == "win32":
+    import msvcrt
+else:
+    import fcntl
+
+
+class NonceGenerator():
+    def __init__(self, key: str, directory: str = NONCE_DIR) -> None:
+        """
+        Kraken rejects any nonce that isn't larger than the last one it saw for the key,
+        so the millisecond clock breaks as soon as two calls share a millisecond or NTP steps the clock back.
+
+        A nonce is max(microseconds since epoch, last nonce + 1).
+        The last nonce is kept in a small file per key, read and written under an exclusive file lock,
+        so worker processes sharing the key continue each other's sequence.
+        If the file can't be opened the generator is still strictly increasing within this process.
+
+        """
+        self.__lock:  Lock = Lock()
+        self.__fd:    int  = None
+        self.last:    int  = 0
+        self.path:    str  = os.path.join(directory, "nonce_" + hashlib.sha256(key.encode()).hexdigest()[:16])
+
+        try:
+            if not os.path.exists(directory):
+                os.makedirs(directory, exist_ok=True)
+            self.__fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+        except Exception as e:
+            G.log.print_and_log(e=e, error_type=type(e).__name__, filename=__file__, tb_lineno=e.__traceback__.tb_lineno)
+        return
+
+    def __lock_file(self) -> None:
+        os.lseek(self.__fd, 0, os.SEEK_SET)
+        if sys.platform == "win32":
+            msvcrt.locking(self.__fd, msvcrt.LK_LOCK, 1)
+        else:
+            fcntl.flock(self.__fd, fcntl.LOCK_EX)
+        return
+
+    def __unlock_file(self) -> None:
+        if sys.platform == "win32":
+            os.lseek(self.__fd, 0, os.SEEK_SET)
+            msvcrt.locking(self.__fd, msvcrt.LK_UNLCK, 1)
+        else:
+            fcntl.flock(self.__fd, fcntl.LOCK_UN)
+        return
+
+    def __read_shared(self) -> int:
+        os.lseek(self.__fd, 0, os.SEEK_SET)
+        text = os.read(self.__fd, 32).strip()
+        return int(text) if len(text) > 0 else 0
+
+    def __write_shared(self, nonce: int) -> None:
+        # fixed width, so a shorter number never leaves digits of the previous one behind
+        os.lseek(self.__fd, 0, os.SEEK_SET)
+        os.write(self.__fd, str(nonce).zfill(20).encode())
+        return
+
+    def next(self) -> int:
+        with self.__lock:
+            nonce = max(time.time_ns() // 1000, self.last + 1)
+
+            if self.__fd is not None:
+                self.__lock_file()
+                try:
+                    nonce = max(nonce, self.__read_shared() + 1)
+                    self.__write_shared(nonce)
+                finally:
+                    self.__unlock_file()
+
+            self.last = nonce
+            return nonce
+
+    def close(self) -> None:
+        with self.__lock:
+            if self.__fd is not None:
+                os.close(self.__fd)
+                self.__fd = None
+        return
+
+
+######################################################################
+### SHARED PER KEY
+######################################################################
+
+_generators:      dict = {}
+_generators_lock: Lock = Lock()
+
+def get_nonce_generator(key: str) -> NonceGenerator:
+    """ One generator per API key per process, so the sync and async clients draw from the same sequence. """
+    with _generators_lock:
+        if key not in _generators:
+            _generators[key] = NonceGenerator(key)
+    return _generators[key]
@@ -0,0 +1,276 @@
+"""kraken_order_book.py: Level 2 order books kept in memory from the websocket book feed and checked against kraken's checksums."""
+
+import zlib
+
+from array                                   import array
+from bisect                                  import bisect_left, bisect_right
+from itertools                               import accumulate
+from threading                               import Lock
+from util.globals                            import G
+from util.colors                             import Color
+from bot_features.low_level.kraken_enums     import *
+from bot_features.low_level.kraken_websocket import KrakenMarketData, get_market_data
+
+
+class BookSide():
+    def __init__(self, descending: bool) -> None:
+        """
+        Price levels in two parallel array('d'), kept sorted so the best price is always at index 0.
+        Bids are stored with negated prices, so both sides sort ascending and share the same bisect code.
+
+        Cumulative volume and cost are rebuilt lazily after a change, which makes depth queries a bisect.
+
+        """
+        self.__sign:     float = -1.0 if descending else 1.0
+        self.__keys:     array = array('d')
+        self.__volumes:  array = array('d')
+        self.__cum_vol:  array = array('d')
+        self.__cum_cost: array = array('d')
+        self.__dirty:    bool  = False
+        return
+
+    def __len__(self) -> int:
+        return len(self.__keys)
+
+    def clear(self) -> None:
+        del self.__keys[:]
+        del self.__volumes[:]
+        self.__dirty = True
+        return
+
+    def update(self, price: float, volume: float) -> None:
+        """A volume of 0 removes the level."""
+        key = self.__sign * price
+        i   = bisect_left(self.__keys, key)
+
+        if i < len(self.__keys) and self.__keys[i] == key:
+            if volume == 0:
+                del self.__keys[i]
+                del self.__volumes[i]
+            else:
+                self.__volumes[i] = volume
+        elif volume != 0:
+            self.__keys.insert(i, key)
+            self.__volumes.insert(i, volume)
+        self.__dirty = True
+        return
+
+    def truncate(self, depth: int) -> None:
+        """Levels pushed out of the subscribed depth get no more updates, so they have to go."""
+        if len(self.__keys) > depth:
+            del self.__keys[depth:]
+            del self.__volumes[depth:]
+        return
+
+    def best(self) -> tuple:
+        """(price, volume) of the best level, (0.0, 0.0) for an empty side."""
+        if len(self.__keys) == 0:
+            return 0.0, 0.0
+        return self.__sign * self.__keys[0], self.__volumes[0]
+
+    def levels(self, count: int) -> list:
+        return [(self.__sign * key, volume) for key, volume in zip(self.__keys[:count], self.__volumes[:count])]
+
+    def __cumulate(self) -> None:
+        if self.__dirty:
+            self.__cum_vol  = array('d', accumulate(self.__volumes))
+            self.__cum_cost = array('d', accumulate(self.__sign * key * volume for key, volume in zip(self.__keys, self.__volumes)))
+            self.__dirty    = False
+        return
+
+    def volume_to(self, price: float) -> float:
+        """Volume resting at prices at least as good as `price`."""
+        self.__cumulate()
+        i = bisect_right(self.__keys, self.__sign * price)
+        return self.__cum_vol[i - 1] if i > 0 else 0.0
+
+    def fill(self, volume: float) -> tuple:
+        """
+        (worst price, average price) of taking `volume` from this side.
+        (0.0, 0.0) if the book doesn't hold that much.
+
+        """
+        self.__cumulate()
+        i = bisect_left(self.__cum_vol, volume)
+        if volume <= 0 or i >= len(self.__cum_vol):
+            return 0.0, 0.0
+
+        price = self.__sign * self.__keys[i]
+        cost  = (self.__cum_cost[i - 1] if i > 0 else 0.0) + price * (volume - (self.__cum_vol[i - 1] if i > 0 else 0.0))
+        return price, cost / volume
+
+
+class OrderBook():
+    def __init__(self, pair: str, depth: int) -> None:
+        """
+        One pair's book, built from a snapshot and then kept current with updates.
+        Each update carries a CRC32 of the top 10 levels, computed over the price and volume strings kraken sent,
+        so the number of decimals kraken uses for each is learned from the snapshot.
+
+        """
+        self.__lock:            Lock     = Lock()
+        self.pair:              str      = pair
+        self.depth:             int      = depth
+        self.asks:              BookSide = BookSide(descending=False)
+        self.bids:              BookSide = BookSide(descending=True)
+        self.price_decimals:    int      = 0
+        self.volume_decimals:   int      = 0
+        self.synced:            bool     = False
+        self.generation:        int      = -1
+        self.updates:           int      = 0
+        self.checksum_failures: int      = 0
+        return
+
+    def __decimals(self, value: str) -> int:
+        return len(value) - value.index(".") - 1 if "." in value else 0
+
+    def __apply(self, side: BookSide, levels: list) -> None:
+        for level in levels:
+            side.update(float(level[0]), float(level[1]))
+        return
+
+    def apply_snapshot(self, data: dict, generation: int) -> None:
+        """data: {"as": [[price, volume, timestamp], ...], "bs": [...]}"""
+        with self.__lock:
+            self.asks.clear()
+            self.bids.clear()
+
+            first = (data.get("as") or data.get("bs") or [["0", "0"]])[0]
+            self.price_decimals  = self.__decimals(first[0])
+            self.volume_decimals = self.__decimals(first[1])
+
+            self.__apply(self.asks, data.get("as", []))
+            self.__apply(self.bids, data.get("bs", []))
+            self.synced     = True
+            self.generation = generation
+        return
+
+    def apply_update(self, data: list) -> bool:
+        """
+        data: the update objects of one message, {"a": [...]} and/or {"b": [...]}, the last one carries the checksum "c".
+        Returns False and marks the book out of sync if the checksum doesn't match.
+        Until the next snapshot arrives, updates are ignored and return True, so a mismatch is reported once.
+
+        """
+        with self.__lock:
+            if not self.synced:
+                return True
+
+            checksum = None
+            for part in data:
+                self.__apply(self.asks, part.get("a", []))
+                self.__apply(self.bids, part.get("b", []))
+                checksum = part.get("c", checksum)
+
+            self.asks.truncate(self.depth)
+            self.bids.truncate(self.depth)
+            self.updates += 1
+
+            if checksum is not None and self.__checksum() != int(checksum):
+                self.synced             = False
+                self.checksum_failures += 1
+                return False
+            return True
+
+    def __checksum(self) -> int:
+        def digits(value: float, decimals: int) -> str:
+            return f"{value:.{decimals}f}".replace(".", "").lstrip("0")
+
+        text = "".join(digits(price, self.price_decimals) + digits(volume, self.volume_decimals)
+                       for side in (self.asks, self.bids) for price, volume in side.levels(10))
+        return zlib.crc32(text.encode())
+
+    def best_bid(self) -> float:
+        with self.__lock:
+            return self.bids.best()[0]
+
+    def best_ask(self) -> float:
+        with self.__lock:
+            return self.asks.best()[0]
+
+    def mid(self) -> float:
+        with self.__lock:
+            return (self.bids.best()[0] + self.asks.best()[0]) / 2
+
+    def spread(self) -> float:
+        with self.__lock:
+            return self.asks.best()[0] - self.bids.best()[0]
+
+    def bid_volume_to(self, price: float) -> float:
+        """Volume bid at `price` or higher, what a sell limit order at `price` could fill against right away."""
+        with self.__lock:
+            return self.bids.volume_to(price)
+
+    def ask_volume_to(self, price: float) -> float:
+        """Volume offered at `price` or lower, what a buy limit order at `price` could fill against right away."""
+        with self.__lock:
+            return self.asks.volume_to(price)
+
+    def buy_price(self, volume: float) -> tuple:
+        """(worst price, average price) of a market buy of `volume`."""
+        with self.__lock:
+            return self.asks.fill(volume)
+
+    def sell_price(self, volume: float) -> tuple:
+        """(worst price, average price) of a market sell of `volume`."""
+        with self.__lock:
+            return self.bids.fill(volume)
+
+
+class OrderBooks():
+    def __init__(self, market_data: KrakenMarketData, depth: int = WebSocket_.BOOK_DEPTH) -> None:
+        """
+        The book feed of a KrakenMarketData connection turned into one OrderBook per pair.
+        A book whose checksum fails is resubscribed once, kraken answers a subscribe with a fresh snapshot
+        and the updates that arrive before it are dropped.
+
+        """
+        self.__books:       dict             = {} # pair -> OrderBook
+        self.__market_data: KrakenMarketData = market_data
+        self.depth:         int              = depth
+        market_data.add_callback(WSFeed.BOOK, self.__on_book)
+        return
+
+    def subscribe(self, pairs: list) -> None:
+        for pair in pairs:
+            pair = G.asset_pairs.resolve(pair) or pair
+            self.__books.setdefault(pair, OrderBook(pair, self.depth))
+        self.__market_data.subscribe(WSFeed.BOOK, pairs, depth=self.depth)
+        return
+
+    def get(self, pair: str) -> OrderBook:
+        """The pair's book, or None unless it is in sync on the current connection."""
+        book = self.__books.get(G.asset_pairs.resolve(pair) or pair)
+        if book is None or not book.synced or not self.__market_data.is_connected() or book.generation != self.__market_data.reconnects:
+            return None
+        return book
+
+    def __on_book(self, feed: str, pair: str, data) -> None:
+        book = self.__books.get(pair)
+        if book is None:
+            return
+
+        parts = data if isinstance(data, list) else [data]
+        if "as" in parts[0] or "bs" in parts[0]:
+            book.apply_snapshot(parts[0], self.__market_data.reconnects)
+        elif not book.apply_update(parts):
+            G.log.print_and_log(Color.FG_YELLOW + f"Order book checksum mismatch {pair}, resubscribing{Color.ENDC}")
+            self.__market_data.unsubscribe(WSFeed.BOOK, [pair], depth=self.depth)
+            self.__market_data.subscribe(WSFeed.BOOK, [pair], depth=self.depth)
+        return
+
+
+######################################################################
+### SHARED
+######################################################################
+
+_order_books:      OrderBooks = None
+_order_books_lock: Lock       = Lock()
+
+def get_order_books() -> OrderBooks:
+    """ Books on the shared market data connection, see kraken_websocket.get_market_data. """
+    global _order_books
+    with _order_books_lock:
+        if _order_books is None:
+            _order_books = OrderBooks(get_market_data())
+    return _order_books
@@ -0,0 +1,113 @@
+"""kraken_rate_limiter.py: Process-wide rate limiter modelled on Kraken's decaying api call counter."""
+
+import asyncio
+import time
+
+from threading                           import Lock
+from bot_features.low_level.kraken_enums import *
+
+
+class CallCounter():
+    def __init__(self, maximum: float, decay: float) -> None:
+        """
+        Every call adds its cost to the counter and the counter goes down by `decay` every second.
+        A call that would push the counter over `maximum` has to wait until enough has decayed.
+
+        The cost is reserved as soon as the wait is known, so callers that arrive later
+        queue up behind it instead of all waking up at the same moment.
+
+        """
+        self.__lock:    Lock  = Lock()
+        self.maximum:   float = maximum
+        self.decay:     float = decay
+        self.counter:   float = 0.0
+        self.last_time: float = time.monotonic()
+        self.waited:    float = 0.0
+        return
+
+    def __update(self, now: float) -> None:
+        self.counter   = max(0.0, self.counter - (now - self.last_time) * self.decay)
+        self.last_time = now
+        return
+
+    def reserve(self, cost: float) -> float:
+        """Reserve cost on the counter and return how many seconds the caller has to wait first."""
+        if cost <= 0:
+            return 0.0
+
+        with self.__lock:
+            self.__update(time.monotonic())
+            wait          = max(0.0, (self.counter + cost - self.maximum) / self.decay)
+            self.counter += cost
+            self.waited  += wait
+        return wait
+
+    def penalize(self) -> None:
+        """Kraken said we are over the limit, so our counter is behind. Assume it is full."""
+        with self.__lock:
+            self.__update(time.monotonic())
+            self.counter = max(self.counter, self.maximum)
+        return
+
+    def configure(self, maximum: float, decay: float) -> None:
+        with self.__lock:
+            self.__update(time.monotonic())
+            self.maximum = maximum
+            self.decay   = decay
+        return
+
+    def get_level(self) -> float:
+        with self.__lock:
+            self.__update(time.monotonic())
+            return round(self.counter, 2)
+
+
+class RateLimiter():
+    def __init__(self, tier: str = RateLimit_.TIER) -> None:
+        """
+        One limiter for the whole process: every KrakenRestAPI and AsyncKrakenRestAPI
+        instance acquires from it before it sends a request.
+
+        """
+        maximum, decay = RateLimit_.TIERS[tier]
+
+        self.tier:    str         = tier
+        self.private: CallCounter = CallCounter(maximum, decay)
+        self.public:  CallCounter = CallCounter(RateLimit_.PUBLIC_MAX, RateLimit_.PUBLIC_DECAY)
+        return
+
+    def set_tier(self, tier: str) -> None:
+        if tier not in RateLimit_.TIERS:
+            raise Exception(f"Unknown kraken tier {tier}, expected one of {list(RateLimit_.TIERS.keys())}")
+        self.tier = tier
+        self.private.configure(*RateLimit_.TIERS[tier])
+        return
+
+    def get_cost(self, method: str, private: bool) -> float:
+        return RateLimit_.COSTS.get(method, 1) if private else 1
+
+    def __reserve(self, method: str, private: bool) -> float:
+        counter = self.private if private else self.public
+        return counter.reserve(self.get_cost(method, private))
+
+    def acquire(self, method: str, private: bool) -> None:
+        """Block the calling thread until the call fits in the budget."""
+        wait = self.__reserve(method, private)
+        if wait > 0:
+            time.sleep(wait)
+        return
+
+    async def async_acquire(self, method: str, private: bool) -> None:
+        """Same as acquire() but only suspends the calling coroutine."""
+        wait = self.__reserve(method, private)
+        if wait > 0:
+            await asyncio.sleep(wait)
+        return
+
+    def penalize(self, private: bool) -> None:
+        (self.private if private else self.public).penalize()
+        return
+
+    def summary(self) -> str:
+        return f"rate limit [{self.tier}] private {self.private.get_level()}/{self.private.maximum}, waited {round(self.private.waited, 1)}s; " \
+               f"public {self.public.get_level()}/{self.public.maximum}, waited {round(self.public.waited, 1)}s"
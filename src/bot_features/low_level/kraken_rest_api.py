@@ -1,26 +1,32 @@
-import base64
 import datetime
-import hashlib
-import hmac
 import math
 import time
-import requests
-import urllib.parse
 
-from pprint                              import pprint
-from util.globals                        import G
-from bot_features.low_level.kraken_enums import *
+from typing                                  import NamedTuple
+from pprint                                  import pprint
+from util.globals                            import G
+from bot_features.low_level.kraken_enums     import *
+from bot_features.low_level.kraken_nonce     import get_nonce_generator
+from bot_features.low_level.kraken_signer    import KrakenSigner
+from bot_features.low_level.kraken_transport import KrakenTransport
+
+
+class Quote(NamedTuple):
+    ask:  float
+    bid:  float
+    last: float
 
 
 class KrakenRestAPI():
-    def __init__(self, key: str, secret: str) -> None:
+    def __init__(self, key: str, secret: str, transport: KrakenTransport = None) -> None:
         """ Create an object with authentication information. """
         self.key           = key
         self.secret        = secret
+        self.signer        = KrakenSigner(secret) if secret else None
+        self.nonces        = get_nonce_generator(key) if key else None
         self.uri           = 'https://api.kraken.com'
         self.apiversion    = '0'
-        self.session       = requests.Session()
-        self.response      = None
+        self.transport     = transport if transport is not None else KrakenTransport()
         self._json_options = {}
 
     def json_options(self, **kwargs):
@@ -30,60 +36,74 @@ class KrakenRestAPI():
 
     def close(self) -> None:
         """ Close this session."""
-        self.session.close()
+        self.transport.close()
         return
 
+    def get_latency_stats(self) -> dict:
+        """ Per-endpoint latency stats of every call made through the transport. """
+        return self.transport.stats.get()
+
     def load_key(self, key: str, secret: str) -> None:
         """ Load kraken key and kraken secret. """
         self.key    = key
         self.secret = secret
+        self.signer = KrakenSigner(secret)
+        self.nonces = get_nonce_generator(key)
         return
 
-    def __query(self, urlpath: str, data: dict, headers: dict = None, timeout: int = None):
+    def __query(self, urlpath: str, method: str, prepare=None, timeout: int = None, private: bool = False):
         """ Low-level query handling. """
-        if data is None:
-            data = {}
-        if headers is None:
-            headers = {}
-        url           = self.uri + urlpath
-        self.response = self.session.post(url, data=data, headers=headers, timeout=timeout)
-        if self.response.status_code not in (200, 201, 202):
-            self.response.raise_for_status()
-        return self.response.json(**self._json_options)
+        url = self.uri + urlpath
+        return self.transport.request("POST", url, method, prepare=prepare, timeout=timeout, json_options=self._json_options, private=private)
 
     def __query_public(self, method: str, data: dict = None, timeout: int = None):
-        """ Performs an API query that does not require a valid key/secret pair. """
+        """ Performs an API query that does not require a valid key/secret pair. 
+            Endpoints listed in Cache_.TTLS are answered from G.public_cache while fresh. """
         if data is None:
             data = {}
         urlpath = '/' + self.apiversion + '/public/' + method
-        return self.__query(urlpath, data, timeout = timeout)
+        return self.__cached(method, (urlpath, tuple(sorted(data.items()))),
+                             lambda: self.__query(urlpath, method, prepare=lambda: (data, {}), timeout=timeout))
+
+    def __cached(self, method: str, key: tuple, fetch) -> dict:
+        """ Return the cached response for (method, key) or fetch and cache it if it has no errors. """
+        if method not in Cache_.TTLS:
+            return fetch()
+
+        found, response = G.public_cache.get((method,) + key)
+        if not found:
+            response = fetch()
+            if isinstance(response, dict) and len(response.get(Dicts.ERROR, [])) == 0:
+                G.public_cache.set((method,) + key, response, Cache_.TTLS[method])
+        return response
+
+    def invalidate_cache(self, method: str = None) -> None:
+        """ Forget cached responses of one public endpoint, or all of them. """
+        G.public_cache.invalidate(method)
+        return
 
-    def __query_private(self, method: str, data=None, timeout=None):
-        """ Performs an API query that requires a valid key/secret pair. """
+    def __query_private(self, method: str, data=None, timeout=None, json_body: bool = False):
+        """ Performs an API query that requires a valid key/secret pair. json_body sends data as JSON, for nested parameters. """
         if data is None:
             data = {}
 
         if not self.key or not self.secret:
             raise Exception('Either key or secret is not set! (Use `load_key()`.')
 
-        data['nonce'] = self.__nonce()
-        urlpath       = '/' + self.apiversion + '/private/' + method
-        headers       = { 'API-Key': self.key, 'API-Sign': self.__sign(data, urlpath) }
-        return self.__query(urlpath, data, headers, timeout = timeout)
+        urlpath = '/' + self.apiversion + '/private/' + method
+
+        def prepare() -> tuple:
+            # every attempt needs a fresh nonce and signature, the signed bytes are the bytes that get sent
+            data['nonce']   = self.nonces.next()
+            body, signature = self.signer.sign_request(urlpath, data, json_body)
+            headers         = { 'API-Key': self.key, 'API-Sign': signature, 'Content-Type': 'application/json' if json_body else 'application/x-www-form-urlencoded' }
+            return body, headers
 
-    def __nonce(self) -> int:
-        """ An always-increasing unsigned integer (up to 64 bits wide) """
-        return int(1000*time.time())
+        return self.__query(urlpath, method, prepare=prepare, timeout=timeout, private=True)
 
-    def __sign(self, data: dict, urlpath: str) -> str:
-        """ Sign request data according to Kraken's scheme. """
-        postdata  = urllib.parse.urlencode(data)
-        # Unicode-objects must be encoded before hashing
-        encoded   = (str(data['nonce']) + postdata).encode()
-        message   = urlpath.encode() + hashlib.sha256(encoded).digest()
-        signature = hmac.new(base64.b64decode(self.secret), message, hashlib.sha512)
-        sigdigest = base64.b64encode(signature.digest())
-        return sigdigest.decode()
+    def query_url(self, url: str, method: str, timeout: int = None) -> dict:
+        """ GET a full public url through the same pooled transport. """
+        return self.__cached(method, (url,), lambda: self.transport.request("GET", url, method, timeout=timeout, json_options=self._json_options))
 
 
 ######################################################################
@@ -96,8 +116,8 @@ class KrakenRestAPI():
     def get_trade_balance(self) -> dict:
         return self.__query_private(method=Method.TRADE_BALANCE)
 
-    def get_open_orders(self, trades: bool = True) -> dict:
-        return self.__query_private(method=Method.OPEN_ORDERS, data={Data.TRADES: trades})
+    def get_open_orders(self, trades: bool = True, userref: int = None) -> dict:
+        return self.__query_private(method=Method.OPEN_ORDERS, data={Data.TRADES: trades, Data.USER_REF: userref})
 
     def get_closed_orders(self, userref: int = None) -> dict:
         return self.__query_private(method=Method.CLOSED_ORDERS, data={Data.USER_REF: userref})
@@ -105,8 +125,9 @@ class KrakenRestAPI():
     def query_orders_info(self, txid: str, trades: bool = True) -> dict:
         return self.__query_private(method=Method.QUERY_ORDERS, data={Data.TXID: txid, Data.TRADES: trades})
 
-    def get_trades_history(self, trades: bool = True) -> dict:
-        return self.__query_private(method=Method.TRADE_HISTORY, data={Data.TRADES: trades})
+    def get_trades_history(self, trades: bool = True, start: float = None, end: float = None, ofs: int = None) -> dict:
+        """ start and end are exclusive unix timestamps or trade txids, ofs is the offset into the 50 trade pages. """
+        return self.__query_private(method=Method.TRADE_HISTORY, data={Data.TRADES: trades, Data.START: start, Data.END: end, Data.OFS: ofs})
 
     def query_trades_info(self, txid: str, trades: bool = True) -> dict:
         return self.__query_private(method=Method.QUERY_TRADES, data={Data.TXID: txid, Data.TRADES: trades})
@@ -146,6 +167,10 @@ class KrakenRestAPI():
     def limit_order(self, type: str, volume: str, pair: str, price: str) -> dict:
         return self.__query_private(method=Method.ADD_ORDER, data={Data.ORDER_TYPE: Data.LIMIT, Data.TYPE: type, Data.VOLUME: volume, Data.PAIR: pair, Data.PRICE: price})
 
+    def add_order_batch(self, orders: list, pair: str) -> dict:
+        """ orders: 2 to 15 dicts of AddOrder parameters for the one pair, prices and volumes as strings. """
+        return self.__query_private(method=Method.ADD_ORDER_BATCH, data={Data.ORDERS: orders, Data.PAIR: pair}, json_body=True)
+
     def limit_order_conditional_close(self, type: str, volume: str, pair: str, price: str, cc_price: str, cc_volume: str) -> dict:
         return self.__query_private(method=Method.ADD_ORDER, data={Data.ORDER_TYPE: Data.LIMIT, Data.TYPE: type, Data.VOLUME: volume, Data.PAIR: pair, Data.PRICE: price,
                                                                    Data.CC_PAIR: pair, Data.CC_TYPE: type, Data.CC_ORDER_TYPE: Data.LIMIT, Data.CC_PRICE: cc_price, Data.CC_VOLUME: cc_volume})
@@ -235,8 +260,9 @@ class KrakenRestAPI():
     def get_ticker_information(self, pair: str) -> dict:
         return self.__query_public(method=Method.MARKET_DATA, data={Data.PAIR: pair})
 
-    def get_ohlc_data(self, pair: str) -> dict:
-        return self.__query_public(method=Method.OHLC, data={Data.PAIR: pair})
+    def get_ohlc_data(self, pair: str, interval: int = None, since: float = None) -> dict:
+        """ interval is the candle length in minutes (1 by default), since a unix timestamp to return the candles after. """
+        return self.__query_public(method=Method.OHLC, data={Data.PAIR: pair, Data.INTERVAL: interval, Data.SINCE: since})
 
     def get_order_book(self, pair: str) -> dict:
         return self.__query_public(method=Method.ORDER_BOOK, data={Data.PAIR: pair})
@@ -258,7 +284,9 @@ class KrakenRestAPI():
         elif decimals == 0:
             return math.floor(number)
         factor = 10 ** decimals
-        return math.floor(number * factor) / factor
+        # number * factor can land just under the whole number it is, 2.3 * 100 is 229.99999999999997.
+        # 15 significant digits are exact in a double and drop that error before flooring.
+        return math.floor(float(f"{number * factor:.15g}")) / factor
 
 
 ###################################################################################################
@@ -290,6 +318,15 @@ class KrakenRestAPI():
             return 0
         return float(result)
 
+    @staticmethod
+    def parse_quote(ticker: dict) -> Quote:
+        """Compact (ask, bid, last) from one pair of a Ticker response. Missing prices are 0."""
+        prices = []
+        for key in (Dicts.ASK_PRICE, Dicts.BID_PRICE, Dicts.LAST_TRADE_CLOSE):
+            value = ticker[key][0] if key in ticker.keys() and len(ticker[key]) > 0 else ""
+            prices.append(float(value) if len(value) > 0 else 0.0)
+        return Quote(*prices)
+
     def parse_account_balance(self, response: dict) -> dict:
         result = dict()
         if Trade.RESULT in response.keys():
@@ -0,0 +1,363 @@
+"""kraken_rest_api_async.py: asyncio version of KrakenRestAPI so many requests can be in flight at once on one event loop."""
+
+import asyncio
+import json
+import time
+import urllib.parse
+import aiohttp
+
+from threading                               import Lock, Thread
+from util.globals                            import G
+from util.colors                             import Color
+from bot_features.low_level.kraken_enums     import *
+from bot_features.low_level.kraken_nonce     import get_nonce_generator
+from bot_features.low_level.kraken_signer    import KrakenSigner
+from bot_features.low_level.kraken_transport import KrakenTransport
+
+
+class AsyncKrakenRestAPI():
+    def __init__(self, key: str, secret: str, transport: KrakenTransport = None) -> None:
+        """
+        Same public/private method surface as KrakenRestAPI, but every endpoint is a coroutine.
+        The transport supplies the pool size, timeouts, retry policy and latency stats,
+        so a sync and an async client built on the same transport report into the same stats.
+
+        """
+        self.key           = key
+        self.secret        = secret
+        self.signer        = KrakenSigner(secret) if secret else None
+        self.nonces        = get_nonce_generator(key) if key else None
+        self.uri           = 'https://api.kraken.com'
+        self.apiversion    = '0'
+        self.transport     = transport if transport is not None else KrakenTransport()
+        self.session       = None
+        self._json_options = {}
+
+    def json_options(self, **kwargs):
+        """ Set keyword arguments to be passed to JSON deserialization. """
+        self._json_options = kwargs
+        return self
+
+    async def close(self) -> None:
+        """ Close this session."""
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
+        return
+
+    def load_key(self, key: str, secret: str) -> None:
+        """ Load kraken key and kraken secret. """
+        self.key    = key
+        self.secret = secret
+        self.signer = KrakenSigner(secret)
+        self.nonces = get_nonce_generator(key)
+        return
+
+    async def __get_session(self) -> aiohttp.ClientSession:
+        """ The session has to be created inside the running event loop. """
+        if self.session is None or self.session.closed:
+            connector    = aiohttp.TCPConnector(limit=self.transport.pool_maxsize, keepalive_timeout=60)
+            self.session = aiohttp.ClientSession(connector=connector)
+        return self.session
+
+    async def __request(self, http_method: str, url: str, method: str, prepare=None, timeout: int = None, private: bool = False) -> dict:
+        """ Low-level query handling with the same retry policy as KrakenTransport.request. """
+        session = await self.__get_session()
+        timeout = timeout if timeout is not None else self.transport.get_timeout(method)
+        attempt = 0
+
+        while True:
+            await self.transport.rate_limiter.async_acquire(method, private)
+
+            body, headers = prepare() if prepare is not None else (None, {})
+            start_time    = time.perf_counter()
+            error         = None
+            result        = None
+
+            try:
+                async with session.request(http_method, url, data=body, headers=headers, timeout=aiohttp.ClientTimeout(total=timeout)) as response:
+                    if response.status not in (200, 201, 202) and response.status < 500:
+                        self.transport.stats.record(method, time.perf_counter() - start_time, error=True, retries=attempt)
+                    response.raise_for_status()
+                    result = json.loads(await response.text(), **self._json_options)
+            except aiohttp.ClientResponseError as e:
+                if e.status < 500:
+                    raise
+                error = e
+            except (aiohttp.ClientConnectionError, asyncio.TimeoutError) as e:
+                error = e
+
+            elapsed        = time.perf_counter() - start_time
+            rate_limit     = error is None and self.transport.is_rate_limited(result)
+            nonce_rejected = error is None and private and self.transport.is_nonce_rejected(result)
+            can_retry      = attempt < self.transport.retries_max and (rate_limit or nonce_rejected or (error is not None and self.transport.is_retry_safe(method)))
+
+            if rate_limit:
+                self.transport.rate_limiter.penalize(private)
+
+            if not can_retry:
+                self.transport.stats.record(method, elapsed, error=error is not None or rate_limit or nonce_rejected, retries=attempt)
+                if error is not None:
+                    raise error
+                return result
+
+            delay = self.transport.backoff_delay(attempt)
+            G.log.print_and_log(Color.FG_YELLOW + f"Retrying {method} in {round(delay, 2)}s{Color.ENDC} {self.transport.get_retry_reason(rate_limit, nonce_rejected, error)}")
+            await asyncio.sleep(delay)
+            attempt += 1
+
+    def __encode(self, data: dict) -> str:
+        """ Url-encode the request body, leaving out parameters that were not given. """
+        return urllib.parse.urlencode({key: value for key, value in data.items() if value is not None})
+
+    async def __query_public(self, method: str, data: dict = None, timeout: int = None):
+        """ Performs an API query that does not require a valid key/secret pair. """
+        if data is None:
+            data = {}
+        urlpath = '/' + self.apiversion + '/public/' + method
+        headers = {'Content-Type': 'application/x-www-form-urlencoded'}
+        return await self.__cached(method, (urlpath, tuple(sorted(data.items()))),
+                                   lambda: self.__request("POST", self.uri + urlpath, method, prepare=lambda: (self.__encode(data), headers), timeout=timeout))
+
+    async def __cached(self, method: str, key: tuple, fetch) -> dict:
+        """ Same cache as KrakenRestAPI, so sync and async clients share hits. """
+        if method not in Cache_.TTLS:
+            return await fetch()
+
+        found, response = G.public_cache.get((method,) + key)
+        if not found:
+            response = await fetch()
+            if isinstance(response, dict) and len(response.get(Dicts.ERROR, [])) == 0:
+                G.public_cache.set((method,) + key, response, Cache_.TTLS[method])
+        return response
+
+    async def __query_private(self, method: str, data=None, timeout=None, json_body: bool = False):
+        """ Performs an API query that requires a valid key/secret pair. json_body sends data as JSON, for nested parameters. """
+        if data is None:
+            data = {}
+
+        if not self.key or not self.secret:
+            raise Exception('Either key or secret is not set! (Use `load_key()`.')
+
+        urlpath = '/' + self.apiversion + '/private/' + method
+
+        def prepare() -> tuple:
+            # every attempt needs a fresh nonce and signature
+            data['nonce']   = self.nonces.next()
+            body, signature = self.signer.sign_request(urlpath, data, json_body)
+            headers         = { 'API-Key': self.key, 'API-Sign': signature, 'Content-Type': 'application/json' if json_body else 'application/x-www-form-urlencoded' }
+            return body, headers
+
+        return await self.__request("POST", self.uri + urlpath, method, prepare=prepare, timeout=timeout, private=True)
+
+    async def query_url(self, url: str, method: str, timeout: int = None) -> dict:
+        """ GET a full public url through the same session. """
+        return await self.__cached(method, (url,), lambda: self.__request("GET", url, method, timeout=timeout))
+
+######################################################################
+### USER DATA
+######################################################################
+
+    async def get_account_balance(self) -> dict:
+        return await self.__query_private(method=Method.BALANCE)
+
+    async def get_trade_balance(self) -> dict:
+        return await self.__query_private(method=Method.TRADE_BALANCE)
+
+    async def get_open_orders(self, trades: bool = True, userref: int = None) -> dict:
+        return await self.__query_private(method=Method.OPEN_ORDERS, data={Data.TRADES: trades, Data.USER_REF: userref})
+
+    async def get_closed_orders(self, userref: int = None) -> dict:
+        return await self.__query_private(method=Method.CLOSED_ORDERS, data={Data.USER_REF: userref})
+
+    async def query_orders_info(self, txid: str, trades: bool = True) -> dict:
+        return await self.__query_private(method=Method.QUERY_ORDERS, data={Data.TXID: txid, Data.TRADES: trades})
+
+    async def get_trades_history(self, trades: bool = True, start: float = None, end: float = None, ofs: int = None) -> dict:
+        """ start and end are exclusive unix timestamps or trade txids, ofs is the offset into the 50 trade pages. """
+        return await self.__query_private(method=Method.TRADE_HISTORY, data={Data.TRADES: trades, Data.START: start, Data.END: end, Data.OFS: ofs})
+
+    async def query_trades_info(self, txid: str, trades: bool = True) -> dict:
+        return await self.__query_private(method=Method.QUERY_TRADES, data={Data.TXID: txid, Data.TRADES: trades})
+
+    async def get_open_positions(self, docalcs: bool = True) -> dict:
+        return await self.__query_private(method=Method.OPEN_POSITIONS, data={Data.DOCALCS: docalcs})
+
+    async def get_ledger_info(self, asset: str, start: int) -> dict:
+        return await self.__query_private(method=Method.LEDGERS, data={Data.ASSET: asset, Data.START: start})
+
+    async def get_trade_volume(self, pair: str, fee_info: str = True) -> dict:
+        return await self.__query_private(method=Method.TRADE_VOLUME, data={Data.FEE_INFO: fee_info, Data.PAIR: pair})
+
+    async def request_export_report(self, file_name: str = ExportReport.DEFAULT_NAME, format: str = ExportReport.DEFAULT_FORMAT, report: str = ExportReport.REPORT) -> dict:
+        return await self.__query_private(method=Method.ADD_EXPORT, data={Data.DESCRIPTION: file_name, Data.FORMAT: format, Data.REPORT: report})
+
+    async def get_export_report_status(self, report: str = ExportReport.REPORT) -> dict:
+        return await self.__query_private(method=Method.EXPORT_STATUS, data={Data.REPORT: report})
+
+    async def retrieve_data_export(self, id: str) -> dict:
+        return await self.__query_private(method=Method.RETRIEVE_EXPORT, data={Data.ID: id})
+
+    async def delete_export_report(self, id: str, type: str = ExportReport.DELETE) -> dict:
+        return await self.__query_private(method=Method.REMOVE_EXPORT, data={Data.ID: id, Data.TYPE: type})
+
+
+######################################################################
+### USER TRADING
+######################################################################
+
+    async def add_order(self, ordertype: str, type: str, volume: str, pair: str, price: str) -> dict:
+        return await self.__query_private(method=Method.ADD_ORDER, data={Data.ORDER_TYPE: ordertype, Data.TYPE: type, Data.VOLUME: volume, Data.PAIR: pair, Data.PRICE: price})
+
+    async def market_order(self, type: str, volume: str, pair: str) -> dict:
+        return await self.__query_private(method=Method.ADD_ORDER, data={Data.ORDER_TYPE: Data.MARKET, Data.TYPE: type, Data.VOLUME: volume, Data.PAIR: pair, Data.PRICE: Data.MARKET_PRICE})
+
+    async def limit_order(self, type: str, volume: str, pair: str, price: str) -> dict:
+        return await self.__query_private(method=Method.ADD_ORDER, data={Data.ORDER_TYPE: Data.LIMIT, Data.TYPE: type, Data.VOLUME: volume, Data.PAIR: pair, Data.PRICE: price})
+
+    async def add_order_batch(self, orders: list, pair: str) -> dict:
+        """ orders: 2 to 15 dicts of AddOrder parameters for the one pair, prices and volumes as strings. """
+        return await self.__query_private(method=Method.ADD_ORDER_BATCH, data={Data.ORDERS: orders, Data.PAIR: pair}, json_body=True)
+
+    async def limit_order_conditional_close(self, type: str, volume: str, pair: str, price: str, cc_price: str, cc_volume: str) -> dict:
+        return await self.__query_private(method=Method.ADD_ORDER, data={Data.ORDER_TYPE: Data.LIMIT, Data.TYPE: type, Data.VOLUME: volume, Data.PAIR: pair, Data.PRICE: price,
+                                                                   Data.CC_PAIR: pair, Data.CC_TYPE: type, Data.CC_ORDER_TYPE: Data.LIMIT, Data.CC_PRICE: cc_price, Data.CC_VOLUME: cc_volume})
+
+    async def cancel_order(self, txid: str) -> dict:
+        return await self.__query_private(method=Method.CANCEL_ORDER, data={Data.TXID: txid})
+    
+    async def cancel_all_orders(self) -> dict:
+        return await self.__query_private(method=Method.CANCEL_ALL, data={})
+
+    async def cancel_all_orders_after_x(self, timeout: str) -> dict:
+        return await self.__query_private(method=Method.CANCEL_ALL_ORDERS_AFTER, data={Data.TIMEOUT: timeout})
+
+
+######################################################################
+### USER FUNDING
+######################################################################
+
+    async def get_deposit_methods(self, asset: str) -> dict:
+        return await self.__query_private(method=Method.DEPOSIT_METHODS, data={Data.ASSET: asset})
+
+    async def get_deposit_address(self, asset: str, method: str, new: bool) -> dict:
+        return await self.__query_private(method=Method.DEPOSIT_ADDRESS, data={Data.ASSET: asset, Data.METHOD: method, Data.NEW: new})
+        
+    async def get_status_of_recent_deposits(self, asset: str) -> dict:
+        return await self.__query_private(method=Method.DEPOSIT_STATUS, data={Data.ASSET: asset})
+
+    async def get_withdrawal_information(self, asset: str, key: str, amount: str) -> dict:
+        return await self.__query_private(method=Method.WITHDRAWL_INFO, data={Data.ASSET: asset, Data.KEY: key, Data.AMOUNT: amount})
+
+    async def withdraw_funds(self, asset: str, key: str, amount: str) -> dict:
+        return await self.__query_private(method=Method.WITHDRAWL, data={Data.ASSET: asset, Data.KEY: key, Data.AMOUNT: amount})
+
+    async def get_withdraw_status(self, asset: str) -> dict:
+        return await self.__query_private(method=Method.WITHDRAWL_STATUS, data={Data.ASSET: asset})
+
+    async def request_withdrawl_cancelation(self, asset: str, refid: str) -> dict:
+        return await self.__query_private(method=Method.WITHDRAWL_CANCEL, data={Data.ASSET: asset, Data.REFID: refid})
+
+    async def request_wallet_transfer(self, asset: str, amount: str, from_: str, to_: str) -> dict:
+        return await self.__query_private(method=Method.WALLET_TRANSFER, data={Data.ASSET: asset, Data.AMOUNT: amount, Data.FROM: from_, Data.TO: to_})
+
+
+######################################################################
+### USER STAKING
+######################################################################
+
+    async def stake_asset(self, asset: str, amount: str, method: str) -> dict:
+        return await self.__query_private(method=Method.STAKE, data={Data.ASSET: asset, Data.AMOUNT: amount, Data.METHOD: method})
+
+    async def unstake_asset(self, asset: str, amount: str, method: str) -> dict:
+        return await self.__query_private(method=Method.UNSTAKE, data={Data.ASSET: asset, Data.AMOUNT: amount, Data.METHOD: method})
+    
+    async def get_stakeable_assets(self) -> dict:
+        return await self.__query_private(method=Method.STAKEABLE_ASSETS, data={})
+
+    async def get_pending_staking_transactions(self) -> dict:
+        return await self.__query_private(method=Method.PENDING, data={})
+
+    async def get_staking_transactions(self) -> dict:
+        return await self.__query_private(method=Method.TRANSACTIONS, data={})
+
+######################################################################
+### WEBSOCKETS AUTHENTICATION
+######################################################################
+
+    async def get_web_sockets_token(self) -> dict:
+        return await self.__query_private(method=Method.GET_WEBSOCKETS_TOKEN, data={})
+
+
+######################################################################
+### MARKET DATA
+######################################################################
+
+    async def get_server_time(self) -> dict:
+        return await self.__query_public(method=Method.SERVER_TIME, data={})
+
+    async def get_system_status(self) -> dict:
+        return await self.__query_public(method=Method.SYSTEM_STATUS, data={})
+
+    async def get_asset_info(self) -> dict:
+        return await self.__query_public(method=Method.ASSETS, data={})
+
+    async def get_tradable_asset_pairs(self, pairs: str) -> dict:
+        return await self.__query_public(method=Method.ASSET_PAIRS, data={Data.PAIR: pairs})
+
+    async def get_ticker_information(self, pair: str) -> dict:
+        return await self.__query_public(method=Method.MARKET_DATA, data={Data.PAIR: pair})
+
+    async def get_ohlc_data(self, pair: str, interval: int = None, since: float = None) -> dict:
+        """ interval is the candle length in minutes (1 by default), since a unix timestamp to return the candles after. """
+        return await self.__query_public(method=Method.OHLC, data={Data.PAIR: pair, Data.INTERVAL: interval, Data.SINCE: since})
+
+    async def get_order_book(self, pair: str) -> dict:
+        return await self.__query_public(method=Method.ORDER_BOOK, data={Data.PAIR: pair})
+
+    async def get_recent_trades(self, pair: str) -> dict:
+        return await self.__query_public(method=Method.RECENT_TRADES, data={Data.PAIR: pair})
+    
+
+######################################################################
+### RUNNER
+######################################################################
+
+class AsyncRunner():
+    def __init__(self) -> None:
+        """
+        Runs an event loop on a daemon thread so that synchronous code (Buy, Sell)
+        can hand coroutines to it and block only on the results it needs.
+
+        """
+        self.loop   = asyncio.new_event_loop()
+        self.thread = Thread(target=self.__run, name="kraken-asyncio", daemon=True)
+        self.thread.start()
+        return
+
+    def __run(self) -> None:
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_forever()
+        return
+
+    def run(self, coroutine, timeout: float = None):
+        """ Run one coroutine on the loop and wait for its result. """
+        return asyncio.run_coroutine_threadsafe(coroutine, self.loop).result(timeout)
+
+    def gather(self, coroutines: list, return_exceptions: bool = False, timeout: float = None) -> list:
+        """ Run all coroutines concurrently and return their results in the same order. """
+        async def gather_all():
+            return await asyncio.gather(*coroutines, return_exceptions=return_exceptions)
+        return self.run(gather_all(), timeout)
+
+
+_runner:      AsyncRunner = None
+_runner_lock: Lock        = Lock()
+
+def get_runner() -> AsyncRunner:
+    """ One event loop thread per process, created on first use. """
+    global _runner
+    with _runner_lock:
+        if _runner is None:
+            _runner = AsyncRunner()
+    return _runner
@@ -0,0 +1,45 @@
+"""kraken_signer.py: Signs private requests with a secret that is decoded once and an HMAC state that is keyed once."""
+
+import base64
+import hashlib
+import hmac
+import json
+import urllib.parse
+
+
+class KrakenSigner():
+    def __init__(self, secret: str) -> None:
+        """
+        API-Sign = b64(HMAC-SHA512(b64decode(secret), urlpath + SHA256(nonce + postdata)))
+
+        Keying an HMAC hashes the secret into the inner and outer pads, so that is done once here
+        and every signature starts from a copy of the keyed state.
+        The body is encoded once by sign_request and the same bytes are signed and sent.
+
+        """
+        self.__hmac: hmac.HMAC = hmac.new(base64.b64decode(secret), digestmod=hashlib.sha512)
+        self.__paths: dict     = {} # urlpath -> urlpath.encode()
+        return
+
+    def encode(self, data: dict) -> bytes:
+        """ Url-encode the request body, leaving out parameters that were not given. """
+        return urllib.parse.urlencode({key: value for key, value in data.items() if value is not None}).encode()
+
+    def encode_json(self, data: dict) -> bytes:
+        """ JSON body for endpoints that take nested parameters (AddOrderBatch). """
+        return json.dumps({key: value for key, value in data.items() if value is not None}, separators=(",", ":")).encode()
+
+    def sign(self, urlpath: str, nonce: int, postdata: bytes) -> str:
+        path = self.__paths.get(urlpath)
+        if path is None:
+            path = self.__paths[urlpath] = urlpath.encode()
+
+        signature = self.__hmac.copy()
+        signature.update(path)
+        signature.update(hashlib.sha256(str(nonce).encode() + postdata).digest())
+        return base64.b64encode(signature.digest()).decode()
+
+    def sign_request(self, urlpath: str, data: dict, json_body: bool = False) -> tuple:
+        """ data must already hold the nonce. Returns (body, signature) where body is what goes on the wire. """
+        postdata = self.encode_json(data) if json_body else self.encode(data)
+        return postdata, self.sign(urlpath, data['nonce'], postdata)
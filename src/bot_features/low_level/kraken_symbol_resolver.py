@@ -0,0 +1,93 @@
+"""kraken_symbol_resolver.py: Maps any spelling of an asset to its canonical asset code and its tradable USD pair."""
+
+from bot_features.low_level.kraken_enums import *
+
+
+class SymbolResolver():
+    def __init__(self) -> None:
+        """
+        Precomputed lookup tables, derived from the Assets and AssetPairs endpoints, so that
+        XXBT, XBT, XBT/USD, BTC and XBT.S all resolve to (XXBT, XXBTZUSD) with one dict lookup.
+
+        """
+        # (names, pairs): name -> (asset, altname, pair) and pair -> asset, swapped in one assignment on rebuild
+        self.__index: tuple = ({}, {})
+        return
+
+    def is_built(self) -> bool:
+        return len(self.__index[0]) > 0
+
+    def build(self, assets: dict, pairs: list) -> None:
+        """
+        assets: result of the Assets endpoint {asset: {altname, ...}}
+        pairs:  PairInfo of every tradable pair
+
+        """
+        usd_pairs = dict()
+        for info in pairs:
+            # ".d" pairs are the dark pool, they can't be traded with normal orders
+            if info.quote in (StableCoins.ZUSD, StableCoins.USD) and not info.pair.endswith(".d"):
+                usd_pairs.setdefault(info.base, info)
+
+        names     = dict()
+        pair_back = dict()
+
+        for asset, details in assets.items():
+            # staked variants (DOT.S) are resolved through the plain asset in __lookup
+            if "." in asset:
+                continue
+            altname = details.get(Dicts.ALT_NAME, asset)
+            info    = usd_pairs.get(asset)
+            entry   = (asset, altname, info.pair if info is not None else "")
+            names.setdefault(asset,   entry)
+            names.setdefault(altname, entry)
+
+        for base, info in usd_pairs.items():
+            entry = names.get(base, (base, base, info.pair))
+            names.setdefault(info.wsname.split("/")[0], entry)
+            pair_back[info.pair]    = base
+            pair_back[info.altname] = base
+            pair_back[info.wsname]  = base
+
+        for alias, altname in SymbolAliases.ALIASES.items():
+            if altname in names:
+                names.setdefault(alias, names[altname])
+
+        self.__index = (names, pair_back)
+        return
+
+    def __lookup(self, symbol: str) -> tuple:
+        names = self.__index[0]
+        entry = names.get(symbol)
+
+        # staked and opt-in rewards balances (DOT.S, XBT.M) trade as the plain asset
+        if entry is None and "." in symbol:
+            entry = names.get(symbol.split(".")[0])
+        return entry
+
+    def resolve(self, symbol: str) -> str:
+        """The tradable USD/ZUSD pair for the symbol, or an empty string if it has none."""
+        entry = self.__lookup(symbol.upper())
+        return entry[2] if entry is not None else ""
+
+    def resolve_many(self, symbols: list) -> dict:
+        """{symbol: pair} for a whole portfolio. Symbols without a USD pair are left out."""
+        result = dict()
+        for symbol in symbols:
+            pair = self.resolve(symbol)
+            if len(pair) > 0:
+                result[symbol] = pair
+        return result
+
+    def get_asset(self, symbol: str) -> str:
+        """Kraken's asset code (XETH for ETH), or an empty string if the symbol is unknown."""
+        entry = self.__lookup(symbol.upper())
+        return entry[0] if entry is not None else ""
+
+    def get_altname(self, symbol: str) -> str:
+        entry = self.__lookup(symbol.upper())
+        return entry[1] if entry is not None else ""
+
+    def get_base_asset(self, pair: str) -> str:
+        """The asset code traded by a pair name, altname or wsname."""
+        return self.__index[1].get(pair, "")
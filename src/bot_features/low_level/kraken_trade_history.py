@@ -0,0 +1,188 @@
+"""kraken_trade_history.py: Local copy of the account's trade history, synced incrementally and indexed by order txid and pair."""
+
+import json
+import os
+import time
+
+from threading                           import Lock
+from util.log                            import Log
+from bot_features.low_level.kraken_enums import *
+
+
+class TradeHistory():
+    def __init__(self, path: str = TRADE_HISTORY_JSON) -> None:
+        """
+        Every trade of the account keyed by trade txid, plus two indexes:
+            ordertxid -> [trade txid]  answers "has this order filled?" with one dict lookup
+            pair      -> [trade txid]
+
+        sync() only asks TradesHistory for trades newer than the cursor, the time of the newest stored trade,
+        so after the first sync a cycle costs one page no matter how many symbols are checked.
+        The first sync goes back to when the oldest order still waiting for a fill was opened,
+        and prune() drops the trades the cursor has passed that no such order needs, so the saved file stays small.
+
+        """
+        self.__lock:     Lock  = Lock() # guards the trades and indexes
+        self.__sync:     Lock  = Lock() # one sync at a time, without blocking pushed trades while it pages
+        self.__load:     Lock  = Lock()
+        self.__trades:   dict  = {}
+        self.__by_order: dict  = {}
+        self.__by_pair:  dict  = {}
+        self.__loaded:   bool  = False
+        self.path:       str   = path
+        self.cursor:     float = 0.0
+        self.synced:     float = 0.0
+        self.log:        Log   = Log() # util.globals imports this module, so it can't use G.log
+        return
+
+    def __len__(self) -> int:
+        return len(self.__trades)
+
+    def __add(self, trade_txid: str, trade: dict) -> bool:
+        """Returns False for a trade that is already stored."""
+        if trade_txid in self.__trades:
+            return False
+
+        self.__trades[trade_txid] = trade
+        self.__by_order.setdefault(trade[Data.ORDER_TXID], []).append(trade_txid)
+        self.__by_pair.setdefault(trade[Data.PAIR], []).append(trade_txid)
+        return True
+
+    def __remove(self, trade_txid: str) -> None:
+        trade = self.__trades.pop(trade_txid)
+        for index, key in ((self.__by_order, trade[Data.ORDER_TXID]), (self.__by_pair, trade[Data.PAIR])):
+            index[key].remove(trade_txid)
+            if len(index[key]) == 0:
+                del index[key]
+        return
+
+    def save(self) -> None:
+        directory = os.path.dirname(self.path)
+        if len(directory) > 0 and not os.path.exists(directory):
+            os.makedirs(directory)
+
+        with self.__lock:
+            saved = json.dumps({"cursor": self.cursor, "trades": self.__trades})
+        with open(self.path + ".tmp", FileMode.WRITE_TRUNCATE) as file:
+            file.write(saved)
+        os.replace(self.path + ".tmp", self.path)
+        return
+
+    def load(self) -> bool:
+        """Load the trades saved by a previous run. Returns False if there are none or they can't be read."""
+        self.__loaded = True
+        if not os.path.exists(self.path):
+            return False
+        try:
+            with open(self.path, FileMode.READ_ONLY) as file:
+                saved = json.load(file)
+            with self.__lock:
+                for trade_txid, trade in saved["trades"].items():
+                    self.__add(trade_txid, trade)
+            self.cursor = float(saved["cursor"])
+            return True
+        except Exception as e:
+            self.log.print_and_log(e=e, error_type=type(e).__name__, filename=__file__, tb_lineno=e.__traceback__.tb_lineno)
+        return False
+
+    def __ensure_loaded(self) -> None:
+        with self.__load:
+            if not self.__loaded:
+                self.load()
+        return
+
+    def sync(self, fetch, get_since=None) -> bool:
+        """
+        fetch:     callable(start, ofs) returning the raw TradesHistory response.
+        get_since: callable returning the time the first sync reaches back to, or None for only new trades.
+                   It is only called while nothing was synced yet.
+
+        Pages through everything newer than the cursor, newest first.
+        Trades placed while paging push older ones onto the next page, so a page can repeat trades but never skip one.
+        The cursor only moves once every page was read, so a failed first sync is resumed from the start next time.
+        Returns False if a request failed.
+
+        """
+        self.__ensure_loaded()
+        with self.__sync:
+            ofs      = 0
+            new      = 0
+            complete = False
+
+            try:
+                since = self.cursor
+                if since <= 0:
+                    since = get_since() if get_since is not None else None
+                    since = since if since is not None else time.time()
+
+                # with nothing newer, the next sync starts where this one did
+                start  = since - TradeHistory_.OVERLAP_SECONDS
+                newest = since
+
+                for _ in range(TradeHistory_.PAGES_MAX):
+                    response = fetch(start, ofs)
+                    if len(response.get(Dicts.ERROR, [])) > 0 or Dicts.RESULT not in response.keys():
+                        self.log.print_and_log(f"TradesHistory sync failed: {response.get(Dicts.ERROR)}")
+                        break
+
+                    trades = response[Dicts.RESULT][Data.TRADES]
+                    with self.__lock:
+                        for trade_txid, trade in trades.items():
+                            newest = max(newest, float(trade[Dicts.TIME]))
+                            if self.__add(trade_txid, trade):
+                                new += 1
+
+                    ofs += len(trades)
+                    if len(trades) == 0 or ofs >= int(response[Dicts.RESULT][Dicts.COUNT]):
+                        complete = True
+                        break
+            except Exception as e:
+                self.log.print_and_log(e=e, error_type=type(e).__name__, filename=__file__, tb_lineno=e.__traceback__.tb_lineno)
+
+            if complete:
+                self.cursor = newest
+                self.synced = time.time()
+
+            if new > 0:
+                self.save()
+            return complete
+
+    def prune(self, keep) -> int:
+        """
+        Forget the trades older than the sync overlap unless their order is in `keep`, the orders still waiting for a fill.
+        Saves if any were dropped, returns how many.
+
+        """
+        horizon = self.cursor - TradeHistory_.OVERLAP_SECONDS
+        with self.__lock:
+            dropped = [trade_txid for trade_txid, trade in self.__trades.items() if float(trade[Dicts.TIME]) < horizon and trade[Data.ORDER_TXID] not in keep]
+            for trade_txid in dropped:
+                self.__remove(trade_txid)
+
+        if len(dropped) > 0:
+            self.save()
+        return len(dropped)
+
+    def add_trades(self, trades: dict) -> list:
+        """
+        Store trades pushed by the ownTrades feed, {trade txid: trade} with kraken's pair name in the pair field.
+        Returns the txids that weren't stored yet. The cursor isn't moved, the next sync() fills any gap.
+
+        """
+        self.__ensure_loaded()
+        with self.__lock:
+            return [trade_txid for trade_txid, trade in trades.items() if self.__add(trade_txid, trade)]
+
+    def has_filled(self, order_txid: str) -> bool:
+        """True once any trade of the order is in the history, a partial fill counts."""
+        return order_txid in self.__by_order
+
+    def get_filled(self, order_txids) -> list:
+        """The order txids that have filled, in the order they were given."""
+        return [order_txid for order_txid in order_txids if order_txid in self.__by_order]
+
+    def get_order_trades(self, order_txid: str) -> list:
+        return [self.__trades[trade_txid] for trade_txid in self.__by_order.get(order_txid, [])]
+
+    def get_pair_trades(self, pair: str) -> list:
+        return [self.__trades[trade_txid] for trade_txid in self.__by_pair.get(pair, [])]
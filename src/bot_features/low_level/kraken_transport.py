@@ -0,0 +1,180 @@
+"""kraken_transport.py: Pooled keep-alive HTTP transport that every Kraken REST call goes through."""
+
+import random
+import time
+import requests
+
+from threading                                  import Lock
+from requests.adapters                          import HTTPAdapter
+from util.globals                               import G
+from util.colors                                import Color
+from bot_features.low_level.kraken_enums        import *
+from bot_features.low_level.kraken_rate_limiter import RateLimiter
+
+
+class LatencyStats():
+    def __init__(self) -> None:
+        """Per-endpoint call counters and latencies in seconds."""
+        self.__lock:  Lock = Lock()
+        self.__stats: dict = {}
+        return
+
+    def record(self, endpoint: str, seconds: float, error: bool = False, retries: int = 0) -> None:
+        with self.__lock:
+            stats = self.__stats.setdefault(endpoint, {"calls": 0, "errors": 0, "retries": 0, "total": 0.0, "min": seconds, "max": seconds})
+            stats["calls"]   += 1
+            stats["errors"]  += int(error)
+            stats["retries"] += retries
+            stats["total"]   += seconds
+            stats["min"]      = min(stats["min"], seconds)
+            stats["max"]      = max(stats["max"], seconds)
+        return
+
+    def get(self) -> dict:
+        """Returns {endpoint: {calls, errors, retries, avg_ms, min_ms, max_ms}}."""
+        result = dict()
+        with self.__lock:
+            for endpoint, stats in self.__stats.items():
+                result[endpoint] = {
+                    "calls":   stats["calls"],
+                    "errors":  stats["errors"],
+                    "retries": stats["retries"],
+                    "avg_ms":  round(1000 * stats["total"] / stats["calls"], 1),
+                    "min_ms":  round(1000 * stats["min"], 1),
+                    "max_ms":  round(1000 * stats["max"], 1)}
+        return result
+
+    def reset(self) -> None:
+        with self.__lock:
+            self.__stats.clear()
+        return
+
+    def summary(self) -> str:
+        """One line summary over all endpoints."""
+        stats   = self.get()
+        calls   = sum(s["calls"]   for s in stats.values())
+        errors  = sum(s["errors"]  for s in stats.values())
+        retries = sum(s["retries"] for s in stats.values())
+
+        if calls == 0:
+            return "no api calls"
+
+        avg_ms  = round(sum(s["avg_ms"] * s["calls"] for s in stats.values()) / calls, 1)
+        slowest = max(stats.items(), key=lambda item: item[1]["max_ms"])
+        return f"{calls} api calls, avg {avg_ms}ms, {retries} retries, {errors} errors, slowest {slowest[0]} {slowest[1]['max_ms']}ms"
+
+
+class KrakenTransport():
+    def __init__(self, pool_connections: int = None, pool_maxsize: int = None, retries_max: int = None,
+                 backoff_base: float = None, backoff_max: float = None, rate_limiter: RateLimiter = None) -> None:
+        """
+        Keep-alive session with a bounded connection pool.
+        Every request gets a timeout, and failed requests are retried with jittered exponential backoff.
+        Each attempt first acquires from the rate limiter, which is the process-wide G.rate_limiter by default.
+
+        """
+        self.pool_connections: int          = pool_connections if pool_connections is not None else Transport_.POOL_CONNECTIONS
+        self.pool_maxsize:     int          = pool_maxsize     if pool_maxsize     is not None else Transport_.POOL_MAXSIZE
+        self.retries_max:      int          = retries_max      if retries_max      is not None else Transport_.RETRIES_MAX
+        self.backoff_base:     float        = backoff_base     if backoff_base     is not None else Transport_.BACKOFF_BASE
+        self.backoff_max:      float        = backoff_max      if backoff_max      is not None else Transport_.BACKOFF_MAX
+        self.stats:            LatencyStats = LatencyStats()
+        self.rate_limiter:     RateLimiter  = rate_limiter     if rate_limiter     is not None else G.rate_limiter
+        self.session                        = requests.Session()
+
+        # retries are handled here rather than by urllib3 so that private calls are re-signed with a fresh nonce
+        adapter = HTTPAdapter(pool_connections=self.pool_connections, pool_maxsize=self.pool_maxsize, pool_block=True, max_retries=0)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://",  adapter)
+        return
+
+    def close(self) -> None:
+        self.session.close()
+        return
+
+    def get_timeout(self, endpoint: str) -> float:
+        return Transport_.TIMEOUTS.get(endpoint, Transport_.TIMEOUT)
+
+    def backoff_delay(self, attempt: int) -> float:
+        """Full jitter: a random delay between 0 and base * 2^attempt, capped at backoff_max."""
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+    def is_rate_limited(self, response: dict) -> bool:
+        return isinstance(response, dict) and KError.RATE_LIMIT in response.get(Dicts.ERROR, [])
+
+    def is_nonce_rejected(self, response: dict) -> bool:
+        """
+        Nonces are drawn in order but requests can reach Kraken out of order when several threads or clients share the key.
+        Kraken rejects the late one before running it, so even an order can be resent with a new nonce.
+
+        """
+        return isinstance(response, dict) and KError.INVALID_NONCE in response.get(Dicts.ERROR, [])
+
+    def get_retry_reason(self, rate_limit: bool, nonce_rejected: bool, error: Exception) -> str:
+        if rate_limit:
+            return KError.RATE_LIMIT
+        if nonce_rejected:
+            return KError.INVALID_NONCE
+        return type(error).__name__
+
+    def is_retry_safe(self, endpoint: str) -> bool:
+        return endpoint not in Transport_.NO_RETRY
+
+    def request(self, http_method: str, url: str, endpoint: str, prepare=None, timeout: float = None, json_options: dict = None, private: bool = False) -> dict:
+        """
+        Send a request and return the decoded json.
+        private: charge the private api counter instead of the public one.
+
+        prepare: callable returning (data, headers). It is called once per attempt
+                 so that private requests get a new nonce and signature on every retry.
+                 A private call whose nonce was rejected is retried like a rate limited one.
+
+        """
+        timeout      = timeout if timeout is not None else self.get_timeout(endpoint)
+        json_options = json_options if json_options is not None else {}
+        attempt      = 0
+
+        while True:
+            self.rate_limiter.acquire(endpoint, private)
+
+            data, headers = prepare() if prepare is not None else ({}, {})
+            start_time    = time.perf_counter()
+            error         = None
+            result        = None
+
+            try:
+                response = self.session.request(http_method, url, data=data, headers=headers, timeout=timeout)
+
+                if response.status_code >= 500:
+                    response.raise_for_status()
+                elif response.status_code not in (200, 201, 202):
+                    # 4xx will not get better by retrying
+                    self.stats.record(endpoint, time.perf_counter() - start_time, error=True, retries=attempt)
+                    response.raise_for_status()
+
+                result = response.json(**json_options)
+            except requests.exceptions.HTTPError as e:
+                if e.response is not None and e.response.status_code < 500:
+                    raise
+                error = e
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                error = e
+
+            elapsed        = time.perf_counter() - start_time
+            rate_limit     = error is None and self.is_rate_limited(result)
+            nonce_rejected = error is None and private and self.is_nonce_rejected(result)
+            can_retry      = attempt < self.retries_max and (rate_limit or nonce_rejected or (error is not None and self.is_retry_safe(endpoint)))
+
+            if rate_limit:
+                self.rate_limiter.penalize(private)
+
+            if not can_retry:
+                self.stats.record(endpoint, elapsed, error=error is not None or rate_limit or nonce_rejected, retries=attempt)
+                if error is not None:
+                    raise error
+                return result
+
+            delay = self.backoff_delay(attempt)
+            G.log.print_and_log(Color.FG_YELLOW + f"Retrying {endpoint} in {round(delay, 2)}s{Color.ENDC} {self.get_retry_reason(rate_limit, nonce_rejected, error)}")
+            G.event.wait(delay)
+            attempt += 1
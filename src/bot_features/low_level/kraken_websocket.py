@@ -0,0 +1,525 @@
+"""kraken_websocket.py: Long-lived Kraken WebSocket connections that reconnect, resubscribe and hand every update to callbacks or queues."""
+
+import itertools
+import json
+import queue
+import random
+import time
+import websocket
+
+from typing                                 import NamedTuple
+from concurrent.futures                     import Future, TimeoutError
+from threading                              import Event, Lock, Thread
+from util.globals                           import G
+from util.colors                            import Color
+from bot_features.low_level.kraken_enums    import *
+from bot_features.low_level.kraken_rest_api import KrakenRestAPI, Quote
+
+
+class KrakenWebSocket():
+    def __init__(self, url: str, name: str) -> None:
+        """
+        One connection on its own daemon thread.
+
+        A connection that hasn't delivered a frame (kraken's heartbeats included) for WebSocket_.HEARTBEAT_TIMEOUT seconds
+        is closed and reopened with full jitter backoff, after which _on_open is called so subclasses can resubscribe.
+
+        """
+        self.__send_lock: Lock                = Lock()
+        self.__stop:      Event               = Event()
+        self.__ws:        websocket.WebSocket = None
+        self.__thread:    Thread              = None
+        self.url:         str                 = url
+        self.name:        str                 = name
+        self.connected:   Event               = Event()
+        self.last_frame:  float               = 0.0
+        self.reconnects:  int                 = 0
+        return
+
+    def start(self) -> None:
+        if self.__thread is None:
+            self.__thread = Thread(target=self.__run, name=self.name, daemon=True)
+            self.__thread.start()
+        return
+
+    def stop(self) -> None:
+        self.__stop.set()
+        if self.__ws is not None:
+            self.__ws.close()
+        return
+
+    def is_connected(self) -> bool:
+        return self.connected.is_set()
+
+    def wait_connected(self, timeout: float = None) -> bool:
+        return self.connected.wait(timeout)
+
+    def send(self, payload: dict) -> bool:
+        """ Returns False if there is no open connection, the caller can rely on _on_open to send it later. """
+        if not self.is_connected():
+            return False
+        try:
+            with self.__send_lock:
+                self.__ws.send(json.dumps(payload))
+            return True
+        except Exception as e:
+            G.log.print_and_log(e=e, error_type=type(e).__name__, filename=__file__, tb_lineno=e.__traceback__.tb_lineno)
+        return False
+
+    def _on_open(self) -> None:
+        """ Called on the connection thread after every (re)connect. """
+        return
+
+    def _on_close(self) -> None:
+        """ Called on the connection thread whenever the connection is lost. """
+        return
+
+    def _on_event(self, message: dict) -> None:
+        """ {"event": ...} frames other than heartbeats. """
+        return
+
+    def _on_data(self, message: list) -> None:
+        """ Channel updates, [channelID, data..., channelName, pair] on the public feeds. """
+        return
+
+    def __connect(self) -> bool:
+        try:
+            self.__ws = websocket.create_connection(self.url, timeout=WebSocket_.CONNECT_TIMEOUT)
+            self.__ws.settimeout(WebSocket_.RECV_TIMEOUT)
+            self.last_frame = time.monotonic()
+            self.connected.set()
+            return True
+        except Exception as e:
+            G.log.print_and_log(Color.FG_YELLOW + f"{self.name} could not connect{Color.ENDC} {type(e).__name__}: {e}")
+        return False
+
+    def __receive(self) -> None:
+        """ Dispatch frames until the connection drops, goes quiet or stop() is called. """
+        while not self.__stop.is_set():
+            try:
+                frame = self.__ws.recv()
+            except websocket.WebSocketTimeoutException:
+                if time.monotonic() - self.last_frame > WebSocket_.HEARTBEAT_TIMEOUT:
+                    G.log.print_and_log(Color.FG_YELLOW + f"{self.name} missed its heartbeats, reconnecting{Color.ENDC}")
+                    return
+                continue
+
+            self.last_frame = time.monotonic()
+            if not frame:
+                return
+
+            message = json.loads(frame)
+            if isinstance(message, dict):
+                if message.get("event") != WSEvent.HEARTBEAT:
+                    self._on_event(message)
+            else:
+                self._on_data(message)
+
+    def __run(self) -> None:
+        attempt = 0
+        while not self.__stop.is_set():
+            if self.__connect():
+                attempt = 0
+                try:
+                    self._on_open()
+                    self.__receive()
+                except Exception as e:
+                    if not self.__stop.is_set():
+                        G.log.print_and_log(e=e, error_type=type(e).__name__, filename=__file__, tb_lineno=e.__traceback__.tb_lineno)
+                finally:
+                    self.connected.clear()
+                    self.__ws.close()
+                    self._on_close()
+
+            if self.__stop.is_set():
+                return
+
+            delay = random.uniform(0, min(WebSocket_.BACKOFF_MAX, WebSocket_.BACKOFF_BASE * 2 ** attempt))
+            attempt += 1
+            self.reconnects += 1
+            self.__stop.wait(delay)
+
+
+class KrakenMarketData(KrakenWebSocket):
+    def __init__(self, url: str = WebSocket_.URL_PUBLIC) -> None:
+        """
+        Public feeds (ticker, spread, trade, ohlc, book) for any number of pairs on one connection.
+
+        Pairs can be given by any name G.asset_pairs knows (XXBTZUSD, XBTUSD, XBT/USD).
+        Updates are delivered as (feed, pair, data) with pair being kraken's pair name:
+            add_callback(feed, callback) calls callback(feed, pair, data) on the connection thread, so keep it short
+            get_queue(feed)              returns a queue that receives every update of the feed, the oldest are dropped when it is full
+
+        The latest ticker/spread of every subscribed pair is kept, get_quote returns it while the connection is up.
+
+        """
+        super().__init__(url, "ws-market-data")
+        self.__lock:          Lock = Lock()
+        self.__subscriptions: dict = {} # (feed, options) -> {wsname}
+        self.__callbacks:     dict = {} # feed -> [callback]
+        self.__queues:        dict = {} # feed -> [queue.Queue]
+        self.__quotes:        dict = {} # pair -> Quote
+        return
+
+    def __get_wsname(self, pair: str) -> str:
+        try:
+            return G.asset_pairs.get(pair).wsname
+        except KeyError:
+            G.log.print_and_log(Color.FG_YELLOW + f"No websocket name for {pair}{Color.ENDC}")
+        return ""
+
+    def __subscription(self, event: str, feed: str, options: tuple, wsnames: list) -> dict:
+        return {"event": event, "pair": sorted(wsnames), "subscription": {"name": feed, **dict(options)}}
+
+    def subscribe(self, feed: str, pairs: list, **options) -> None:
+        """
+        options are passed on in the subscription, for example depth=WebSocket_.BOOK_DEPTH for book or interval=WebSocket_.OHLC_INTERVAL for ohlc.
+        Subscriptions are remembered and sent again after every reconnect.
+
+        """
+        key     = (feed, tuple(sorted(options.items())))
+        wsnames = {self.__get_wsname(pair) for pair in pairs} - {""}
+
+        with self.__lock:
+            new = wsnames - self.__subscriptions.setdefault(key, set())
+            self.__subscriptions[key] |= new
+
+        if len(new) > 0:
+            self.send(self.__subscription(WSEvent.SUBSCRIBE, feed, key[1], new))
+        return
+
+    def unsubscribe(self, feed: str, pairs: list, **options) -> None:
+        key     = (feed, tuple(sorted(options.items())))
+        wsnames = {self.__get_wsname(pair) for pair in pairs} - {""}
+
+        with self.__lock:
+            removed = wsnames & self.__subscriptions.get(key, set())
+            self.__subscriptions[key] = self.__subscriptions.get(key, set()) - removed
+            if feed in (WSFeed.TICKER, WSFeed.SPREAD):
+                for pair in removed:
+                    self.__quotes.pop(G.asset_pairs.resolve(pair), None)
+
+        if len(removed) > 0:
+            self.send(self.__subscription(WSEvent.UNSUBSCRIBE, feed, key[1], removed))
+        return
+
+    def add_callback(self, feed: str, callback) -> None:
+        with self.__lock:
+            self.__callbacks.setdefault(feed, []).append(callback)
+        return
+
+    def get_queue(self, feed: str, maxsize: int = WebSocket_.QUEUE_MAX) -> queue.Queue:
+        updates = queue.Queue(maxsize)
+        with self.__lock:
+            self.__queues.setdefault(feed, []).append(updates)
+        return updates
+
+    def get_quote(self, pair: str) -> Quote:
+        """ The latest quote pushed for the pair, or None if it isn't subscribed or the connection is down. """
+        if not self.is_connected():
+            return None
+        return self.__quotes.get(G.asset_pairs.resolve(pair))
+
+    def _on_open(self) -> None:
+        G.log.print_and_log(Color.FG_BRIGHT_BLACK + f"{self.name} connected" + Color.ENDC)
+        with self.__lock:
+            subscriptions = [(key, set(wsnames)) for key, wsnames in self.__subscriptions.items() if len(wsnames) > 0]
+
+        for (feed, options), wsnames in subscriptions:
+            self.send(self.__subscription(WSEvent.SUBSCRIBE, feed, options, wsnames))
+        return
+
+    def _on_close(self) -> None:
+        # quotes stop updating without a connection, so don't let anyone read them as current
+        self.__quotes = {}
+        return
+
+    def _on_event(self, message: dict) -> None:
+        event = message.get("event")
+        if event == WSEvent.SUBSCRIPTION_STATUS and message.get("status") == WSEvent.ERROR:
+            G.log.print_and_log(Color.FG_YELLOW + f"{self.name} subscription failed{Color.ENDC} {message.get('pair', '')} {message.get('errorMessage')}")
+        elif event == WSEvent.SYSTEM_STATUS and message.get("status") != "online":
+            G.log.print_and_log(Color.FG_YELLOW + f"Kraken system status{Color.ENDC} {message.get('status')}")
+        return
+
+    def __update_quote(self, feed: str, pair: str, data) -> None:
+        if feed == WSFeed.TICKER:
+            self.__quotes[pair] = KrakenRestAPI.parse_quote(data)
+        elif feed == WSFeed.SPREAD:
+            # [bid, ask, timestamp, bidVolume, askVolume], moves on every change of the best price between ticker updates
+            last = self.__quotes[pair].last if pair in self.__quotes else 0.0
+            self.__quotes[pair] = Quote(float(data[1]), float(data[0]), last)
+        return
+
+    def _on_data(self, message: list) -> None:
+        # book updates can carry the asks and the bids as two separate objects
+        feed = message[-2].split("-")[0]
+        pair = G.asset_pairs.resolve(message[-1]) or message[-1]
+        data = message[1] if len(message) == 4 else message[1:-2]
+
+        self.__update_quote(feed, pair, data)
+
+        for callback in self.__callbacks.get(feed, []):
+            try:
+                callback(feed, pair, data)
+            except Exception as e:
+                G.log.print_and_log(e=e, error_type=type(e).__name__, filename=__file__, tb_lineno=e.__traceback__.tb_lineno)
+
+        for updates in self.__queues.get(feed, []):
+            # this thread is the only producer, so once there is room the put can't fail
+            if updates.full():
+                try:
+                    updates.get_nowait()
+                except queue.Empty:
+                    pass
+            updates.put_nowait((feed, pair, data))
+        return
+
+
+class KrakenAuthWebSocket(KrakenWebSocket):
+    def __init__(self, get_token, url: str, name: str) -> None:
+        """
+        get_token: callable returning the raw GetWebSocketsToken response.
+                   A token has to be used within 15 minutes, so a new one is fetched for every (re)connect.
+
+        """
+        super().__init__(url, name)
+        self.__get_token: object = get_token
+        self.token:       str    = ""
+        return
+
+    def _authenticate(self) -> None:
+        """ Called first thing in _on_open. Raising makes the connection thread back off and reconnect. """
+        response = self.__get_token()
+        if Dicts.RESULT not in response.keys():
+            raise Exception(f"{self.name}: can't get a websocket token {response.get(Dicts.ERROR)}")
+        self.token = response[Dicts.RESULT]["token"]
+        return
+
+
+class FillEvent(NamedTuple):
+    order_txid: str
+    pair:       str # kraken's pair name, empty if the feed didn't say
+    trade_txid: str # empty for an order that was reported closed by openOrders
+    source:     str # the feed it came from
+
+
+class KrakenPrivateFeed(KrakenAuthWebSocket):
+    def __init__(self, get_token, url: str = WebSocket_.URL_PRIVATE) -> None:
+        """
+        ownTrades and openOrders on the authenticated endpoint, turned into FillEvents.
+
+        Every new trade is added to G.trade_history before its FillEvent is sent, so the polling checks agree with the feed.
+        ownTrades sends the latest trades as a snapshot on every subscribe, fills missed while disconnected are picked up from it.
+        An ownTrades FillEvent is sent for every trade, so a partial fill sends one too and only openOrders says the order is done.
+        An order reported closed by openOrders with volume executed is sent as well, so one fill can arrive twice
+        and add_fill_callback callbacks have to be idempotent. They are called on the connection thread, so keep them short.
+
+        """
+        super().__init__(get_token, url, "ws-private")
+        self.__callbacks:   list = []
+        self.__order_pairs: dict = {} # order txid -> pair, status updates of openOrders don't repeat the pair
+        return
+
+    def add_fill_callback(self, callback) -> None:
+        self.__callbacks.append(callback)
+        return
+
+    def _on_open(self) -> None:
+        self._authenticate()
+        self.send({"event": WSEvent.SUBSCRIBE, "subscription": {"name": WSFeed.OWN_TRADES,  "token": self.token, "snapshot": True}})
+        self.send({"event": WSEvent.SUBSCRIBE, "subscription": {"name": WSFeed.OPEN_ORDERS, "token": self.token}})
+        G.log.print_and_log(Color.FG_BRIGHT_BLACK + f"{self.name} connected" + Color.ENDC)
+        return
+
+    def _on_event(self, message: dict) -> None:
+        if message.get("event") == WSEvent.SUBSCRIPTION_STATUS and message.get("status") == WSEvent.ERROR:
+            G.log.print_and_log(Color.FG_YELLOW + f"{self.name} subscription failed{Color.ENDC} {message.get('errorMessage')}")
+        return
+
+    def __emit(self, event: FillEvent) -> None:
+        for callback in self.__callbacks:
+            try:
+                callback(event)
+            except Exception as e:
+                G.log.print_and_log(e=e, error_type=type(e).__name__, filename=__file__, tb_lineno=e.__traceback__.tb_lineno)
+        return
+
+    def __on_own_trades(self, updates: list) -> None:
+        trades = dict()
+        for update in updates:
+            for trade_txid, trade in update.items():
+                # the feed uses the websocket name (XBT/USD), the store and the database use kraken's pair name
+                trades[trade_txid] = dict(trade, pair=G.asset_pairs.resolve(trade[Data.PAIR]) or trade[Data.PAIR])
+
+        for trade_txid in G.trade_history.add_trades(trades):
+            trade = trades[trade_txid]
+            self.__emit(FillEvent(trade[Data.ORDER_TXID], trade[Data.PAIR], trade_txid, WSFeed.OWN_TRADES))
+        return
+
+    def __on_open_orders(self, updates: list) -> None:
+        for update in updates:
+            for order_txid, order in update.items():
+                descr = order.get(Dicts.DESCR, {})
+                if Data.PAIR in descr:
+                    self.__order_pairs[order_txid] = G.asset_pairs.resolve(descr[Data.PAIR]) or descr[Data.PAIR]
+
+                if order.get("status") in ("closed", "canceled", "expired"):
+                    pair = self.__order_pairs.pop(order_txid, "")
+                    if order.get("status") == "closed" and float(order.get("vol_exec", 0)) > 0:
+                        self.__emit(FillEvent(order_txid, pair, "", WSFeed.OPEN_ORDERS))
+        return
+
+    def _on_data(self, message: list) -> None:
+        # [updates, channelName, {"sequence": n}]
+        if message[1] == WSFeed.OWN_TRADES:
+            self.__on_own_trades(message[0])
+        elif message[1] == WSFeed.OPEN_ORDERS:
+            self.__on_open_orders(message[0])
+        return
+
+
+class KrakenOrderGateway(KrakenAuthWebSocket):
+    def __init__(self, get_token, url: str = WebSocket_.URL_PRIVATE) -> None:
+        """
+        addOrder, cancelOrder and cancelAll over one persistent ws-auth connection,
+        so a burst of cancel/replace orders doesn't pay for a signed HTTP exchange per order.
+
+        Every request carries a reqid and the *Status event with that reqid resolves the Future returned for it.
+        Results are shaped like the REST responses ({"error": [...], "result": {...}}) so callers treat both the same.
+
+        The *_async methods return None when the request couldn't be sent, so the caller can fall back to REST.
+        Once a request is sent it is never resent, an addOrder that wasn't answered may still have been placed.
+        Every addOrder carries a random userref, which the WS_TIMEOUT and WS_DISCONNECTED results repeat
+        so the caller can look the order up before calling it failed.
+
+        """
+        super().__init__(get_token, url, "ws-orders")
+        self.__lock:    Lock            = Lock()
+        self.__reqids:  itertools.count = itertools.count(1)
+        self.__pending: dict            = {} # reqid -> (Future, request)
+        return
+
+    def _on_open(self) -> None:
+        self._authenticate()
+        G.log.print_and_log(Color.FG_BRIGHT_BLACK + f"{self.name} connected" + Color.ENDC)
+        return
+
+    def _on_close(self) -> None:
+        with self.__lock:
+            pending, self.__pending = self.__pending, {}
+
+        for future, request in pending.values():
+            future.set_result(self.__unanswered(request, KError.WS_DISCONNECTED))
+        return
+
+    def __unanswered(self, request: dict, error: str) -> dict:
+        result = {Dicts.ERROR: [error]}
+        if Data.USER_REF in request:
+            result[Data.USER_REF] = int(request[Data.USER_REF])
+        return result
+
+    def __to_rest(self, request: dict, message: dict) -> dict:
+        if message.get("status") != WSEvent.OK:
+            return {Dicts.ERROR: [message.get("errorMessage", "")]}
+
+        if request["event"] == WSEvent.ADD_ORDER:
+            return {Dicts.ERROR: [], Dicts.RESULT: {Dicts.DESCR: {Dicts.ORDER: message.get("descr", "")}, Data.TXID: [message.get(Data.TXID)]}}
+        elif request["event"] == WSEvent.CANCEL_ORDER:
+            return {Dicts.ERROR: [], Dicts.RESULT: {Dicts.COUNT: len(request[Data.TXID])}}
+        return {Dicts.ERROR: [], Dicts.RESULT: {Dicts.COUNT: message.get(Dicts.COUNT, 0)}}
+
+    def _on_event(self, message: dict) -> None:
+        with self.__lock:
+            entry = self.__pending.pop(message.get("reqid"), None)
+
+        if entry is not None:
+            future, request = entry
+            future.set_result(self.__to_rest(request, message))
+        return
+
+    def __submit(self, request: dict) -> Future:
+        if not self.is_connected():
+            return None
+
+        future = Future()
+        with self.__lock:
+            request["reqid"] = future.reqid = next(self.__reqids)
+            self.__pending[request["reqid"]] = (future, request)
+
+        if not self.send(dict(request, token=self.token)):
+            with self.__lock:
+                self.__pending.pop(request["reqid"], None)
+            return None
+        return future
+
+    def __result(self, future: Future) -> dict:
+        """ Wait for a Future of this gateway like a REST call would, None if it was never sent. """
+        if future is None:
+            return None
+        try:
+            return future.result(timeout=WebSocket_.ORDER_TIMEOUT)
+        except TimeoutError:
+            with self.__lock:
+                entry = self.__pending.pop(future.reqid, None)
+
+            # answered between the timeout and the pop
+            if entry is None:
+                return future.result()
+            return self.__unanswered(entry[1], KError.WS_TIMEOUT)
+
+    def add_order_async(self, ordertype: str, type: str, volume, pair: str, price=None) -> Future:
+        try:
+            info = G.asset_pairs.get(pair)
+        except KeyError:
+            return None
+
+        # the websocket wants decimal strings, a float like 1e-05 would be rejected
+        request = {"event": WSEvent.ADD_ORDER, Data.ORDER_TYPE: ordertype, Data.TYPE: type, Data.PAIR: info.wsname,
+                   Data.VOLUME: volume if isinstance(volume, str) else f"{volume:.{info.lot_decimals}f}",
+                   Data.USER_REF: str(random.randint(1, 2**31 - 1))}
+        if price is not None and ordertype != Data.MARKET:
+            request[Data.PRICE] = price if isinstance(price, str) else f"{price:.{info.pair_decimals}f}"
+        return self.__submit(request)
+
+    def cancel_order_async(self, txid: str) -> Future:
+        return self.__submit({"event": WSEvent.CANCEL_ORDER, Data.TXID: txid.split(",")})
+
+    def cancel_all_async(self) -> Future:
+        return self.__submit({"event": WSEvent.CANCEL_ALL})
+
+    def add_order(self, ordertype: str, type: str, volume, pair: str, price=None) -> dict:
+        return self.__result(self.add_order_async(ordertype, type, volume, pair, price))
+
+    def cancel_order(self, txid: str) -> dict:
+        return self.__result(self.cancel_order_async(txid))
+
+    def cancel_all(self) -> dict:
+        return self.__result(self.cancel_all_async())
+
+
+######################################################################
+### SHARED
+######################################################################
+
+_market_data:      KrakenMarketData = None
+_market_data_lock: Lock             = Lock()
+
+def get_market_data() -> KrakenMarketData:
+    """ One public market data connection per process, created on first use and started by whoever subscribes first. """
+    global _market_data
+    with _market_data_lock:
+        if _market_data is None:
+            _market_data = KrakenMarketData()
+    return _market_data
+
+_order_gateway:      KrakenOrderGateway = None
+_order_gateway_lock: Lock               = Lock()
+
+def get_order_gateway(get_token) -> KrakenOrderGateway:
+    """ One order gateway per process. get_token is only used by the first caller, every bot in a process trades with the same key. """
+    global _order_gateway
+    with _order_gateway_lock:
+        if _order_gateway is None:
+            _order_gateway = KrakenOrderGateway(get_token)
+    return _order_gateway
@@ -0,0 +1,145 @@
+"""price_trigger_index.py: The price of every open ladder order in memory, sorted per pair so a tick only looks at the levels it crossed."""
+
+from array                                   import array
+from bisect                                  import bisect_left, bisect_right
+from threading                               import Lock
+from bot_features.low_level.kraken_enums     import *
+from bot_features.low_level.kraken_websocket import KrakenMarketData
+
+
+class TriggerSide():
+    def __init__(self) -> None:
+        """Armed levels of one side of one pair: prices ascending in an array('d') and the order txids in a parallel list."""
+        self.prices: array = array('d')
+        self.keys:   list  = []
+        return
+
+    def __len__(self) -> int:
+        return len(self.prices)
+
+    def add(self, price: float, key: str) -> None:
+        i = bisect_right(self.prices, price)
+        self.prices.insert(i, price)
+        self.keys.insert(i, key)
+        return
+
+    def remove(self, price: float, key: str) -> bool:
+        i = bisect_left(self.prices, price)
+        while i < len(self.prices) and self.prices[i] == price:
+            if self.keys[i] == key:
+                del self.prices[i]
+                del self.keys[i]
+                return True
+            i += 1
+        return False
+
+    def between(self, low: float, high: float, include_low: bool) -> list:
+        """(price, key) of the levels in (low, high], or [low, high) with include_low."""
+        if include_low:
+            i, j = bisect_left(self.prices, low), bisect_left(self.prices, high)
+        else:
+            i, j = bisect_right(self.prices, low), bisect_right(self.prices, high)
+        return list(zip(self.prices[i:j], self.keys[i:j]))
+
+
+class PriceTriggerIndex():
+    def __init__(self) -> None:
+        """
+        Buy levels fire when the ask falls to them, sell levels when the bid rises to them.
+        Each pair remembers the ask and bid of its previous tick, so a tick fires exactly the levels between
+        the previous price and the new one: two bisects per side, however many orders are armed.
+
+        Levels are armed and disarmed by order txid as orders are placed, filled and cancelled.
+
+        """
+        self.__lock:      Lock = Lock()
+        self.__sides:     dict = {} # (pair, Trade.BUY or Trade.SELL) -> TriggerSide
+        self.__armed:     dict = {} # order txid -> (pair, side, price)
+        self.__last:      dict = {} # pair -> (ask, bid) of the previous tick
+        self.__callbacks: list = []
+        self.fired:       int  = 0
+        return
+
+    def __len__(self) -> int:
+        return len(self.__armed)
+
+    def add_callback(self, callback) -> None:
+        """callback(pair, side, price, order txid), called on the thread that delivered the tick."""
+        self.__callbacks.append(callback)
+        return
+
+    def arm(self, pair: str, side: str, price: float, key: str) -> None:
+        """Arm `key` at `price`, moving it if it was armed elsewhere."""
+        with self.__lock:
+            self.__disarm(key)
+            self.__sides.setdefault((pair, side), TriggerSide()).add(float(price), key)
+            self.__armed[key] = (pair, side, float(price))
+        return
+
+    def __disarm(self, key: str) -> bool:
+        if key not in self.__armed:
+            return False
+        pair, side, price = self.__armed.pop(key)
+        return self.__sides[(pair, side)].remove(price, key)
+
+    def disarm(self, key: str) -> bool:
+        with self.__lock:
+            return self.__disarm(key)
+
+    def replace(self, pair: str, side: str, levels: list) -> None:
+        """Make levels, [(price, order txid)], the only armed levels of the pair's side."""
+        with self.__lock:
+            for key in [key for key, (armed_pair, armed_side, _) in self.__armed.items() if armed_pair == pair and armed_side == side]:
+                self.__disarm(key)
+            for price, key in levels:
+                self.__sides.setdefault((pair, side), TriggerSide()).add(float(price), key)
+                self.__armed[key] = (pair, side, float(price))
+        return
+
+    def clear(self, pair: str) -> None:
+        self.replace(pair, Trade.BUY, [])
+        self.replace(pair, Trade.SELL, [])
+        return
+
+    def get_levels(self, pair: str) -> list:
+        """Every armed price of the pair, both sides."""
+        with self.__lock:
+            return [price for side in (Trade.BUY, Trade.SELL) for price in self.__sides.get((pair, side), TriggerSide()).prices]
+
+    def check(self, pair: str, ask: float, bid: float) -> list:
+        """
+        Feed a tick, returns the (side, price, order txid) levels it crossed and hands each to the callbacks.
+        The first tick of a pair only sets its previous prices.
+
+        """
+        fired = []
+        with self.__lock:
+            last              = self.__last.get(pair)
+            self.__last[pair] = (ask, bid)
+
+            if last is not None:
+                buys  = self.__sides.get((pair, Trade.BUY))
+                sells = self.__sides.get((pair, Trade.SELL))
+
+                # ask fell from last[0] to ask: buy levels in [ask, last ask)
+                if buys is not None and ask < last[0]:
+                    fired.extend((Trade.BUY, price, key) for price, key in buys.between(ask, last[0], include_low=True))
+                # bid rose from last[1] to bid: sell levels in (last bid, bid]
+                if sells is not None and bid > last[1]:
+                    fired.extend((Trade.SELL, price, key) for price, key in sells.between(last[1], bid, include_low=False))
+                self.fired += len(fired)
+
+        for side, price, key in fired:
+            for callback in self.__callbacks:
+                callback(pair, side, price, key)
+        return fired
+
+    def watch(self, market_data: KrakenMarketData) -> None:
+        """Check every ticker update of market_data."""
+        def on_ticker(feed: str, pair: str, data) -> None:
+            quote = market_data.get_quote(pair)
+            if quote is not None:
+                self.check(pair, quote.ask, quote.bid)
+
+        market_data.add_callback(WSFeed.TICKER, on_ticker)
+        return
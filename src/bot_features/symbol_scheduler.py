@@ -0,0 +1,167 @@
+"""symbol_scheduler.py: Decides when buy_loop checks each symbol next, often for coins close to an order price and rarely for idle ones."""
+
+import heapq
+import itertools
+import math
+import time
+
+from threading                               import Condition, Lock
+from bot_features.low_level.kraken_enums     import *
+from bot_features.low_level.kraken_websocket import KrakenMarketData
+
+
+class SymbolScheduler():
+    def __init__(self) -> None:
+        """
+        A heap of (due time, sequence, symbol). Rescheduling a symbol pushes a new entry and remembers its due time,
+        entries that no longer match are skipped when they reach the top, so every operation is O(log n).
+
+        The next check of a symbol with orders open is the time in which reaching the nearest order price
+        would be a Schedule_.SIGMAS move, going by the pair's recent volatility:
+            interval = (distance / (SIGMAS * volatility))^2
+        volatility being an EWMA of squared log returns per second of the ticker mid price.
+        Without a volatility estimate yet the interval is scaled linearly with the distance.
+
+        """
+        self.__lock:      Lock            = Lock()
+        self.__wakeup:    Condition       = Condition(self.__lock) # notified on every schedule, see wait()
+        self.__heap:      list            = [] # (due, sequence, symbol)
+        self.__due:       dict            = {} # symbol -> due time of its live entry
+        self.__sequence:  itertools.count = itertools.count()
+        self.__prices:    dict            = {} # pair -> (time, mid price)
+        self.__variances: dict            = {} # pair -> EWMA of squared log return per second
+        return
+
+    def __len__(self) -> int:
+        return len(self.__due)
+
+######################################################################
+### QUEUE
+######################################################################
+
+    def __push(self, symbol: str, due: float) -> None:
+        """Callers hold the lock."""
+        self.__due[symbol] = due
+        heapq.heappush(self.__heap, (due, next(self.__sequence), symbol))
+        self.__wakeup.notify_all()
+        return
+
+    def schedule(self, symbol: str, delay: float) -> None:
+        """Check `symbol` in `delay` seconds, replacing any earlier schedule of it."""
+        due = time.time() + max(0.0, delay)
+        with self.__lock:
+            self.__push(symbol, due)
+        return
+
+    def schedule_sooner(self, symbol: str, delay: float) -> None:
+        """
+        Like schedule, but never pushes an existing check back.
+        A symbol is out of the schedule while it is checked, so a check asked for meanwhile survives it being rescheduled with this.
+
+        """
+        due = time.time() + max(0.0, delay)
+        with self.__lock:
+            if self.__due.get(symbol, math.inf) > due:
+                self.__push(symbol, due)
+        return
+
+    def pop_due(self) -> list:
+        """Every symbol that is due, earliest first. They are out of the schedule until schedule() is called again."""
+        now = time.time()
+        due = []
+        with self.__lock:
+            while len(self.__heap) > 0 and self.__heap[0][0] <= now:
+                when, _, symbol = heapq.heappop(self.__heap)
+                if self.__due.get(symbol) == when:
+                    del self.__due[symbol]
+                    due.append(symbol)
+        return due
+
+    def __get_next_due(self) -> float:
+        """Callers hold the lock."""
+        while len(self.__heap) > 0 and self.__due.get(self.__heap[0][2]) != self.__heap[0][0]:
+            heapq.heappop(self.__heap)
+        return self.__heap[0][0] if len(self.__heap) > 0 else None
+
+    def get_next_wait(self) -> float:
+        """Seconds until the next symbol is due, None if nothing is scheduled."""
+        with self.__lock:
+            next_due = self.__get_next_due()
+        return max(0.0, next_due - time.time()) if next_due is not None else None
+
+    def wait(self, timeout: float) -> None:
+        """
+        Block until a symbol is due or `timeout` seconds have passed.
+        Every schedule wakes it to look at the next due time again, so a symbol moved up from another thread isn't left waiting.
+
+        """
+        deadline = time.time() + timeout
+        with self.__wakeup:
+            while True:
+                next_due  = self.__get_next_due()
+                remaining = min(deadline, next_due if next_due is not None else deadline) - time.time()
+                if remaining <= 0:
+                    return
+                self.__wakeup.wait(remaining)
+
+######################################################################
+### VOLATILITY
+######################################################################
+
+    def observe(self, pair: str, price: float) -> None:
+        if price <= 0:
+            return
+
+        now = time.time()
+        with self.__lock:
+            previous            = self.__prices.get(pair)
+            self.__prices[pair] = (now, price)
+            if previous is None or now - previous[0] <= 0:
+                return
+
+            rate = math.log(price / previous[1]) ** 2 / (now - previous[0])
+            if pair in self.__variances:
+                self.__variances[pair] += Schedule_.VOLATILITY_ALPHA * (rate - self.__variances[pair])
+            else:
+                self.__variances[pair] = rate
+        return
+
+    def get_volatility(self, pair: str) -> float:
+        """Standard deviation of the log return over one second, None before the pair's second tick."""
+        with self.__lock:
+            variance = self.__variances.get(pair)
+        return math.sqrt(variance) if variance is not None else None
+
+    def watch(self, market_data: KrakenMarketData) -> None:
+        """Sample every ticker update of market_data."""
+        def on_ticker(feed: str, pair: str, data) -> None:
+            quote = market_data.get_quote(pair)
+            if quote is not None:
+                self.observe(pair, (quote.ask + quote.bid) / 2)
+
+        market_data.add_callback(WSFeed.TICKER, on_ticker)
+        return
+
+######################################################################
+### INTERVALS
+######################################################################
+
+    def get_interval(self, pair: str, price: float, levels: list) -> float:
+        """
+        Seconds until the next check of a symbol whose open orders sit at `levels`.
+        A symbol without open orders is idle, one without a price to compare them to keeps the fixed Buy_.TIME_MINUTES.
+
+        """
+        if len(levels) == 0:
+            return Schedule_.IDLE_SECONDS
+        if price is None or price <= 0:
+            return Buy_.TIME_MINUTES * 60
+
+        distance   = min(abs(level - price) for level in levels) / price
+        volatility = self.get_volatility(pair)
+
+        if volatility is not None and volatility > 0:
+            interval = (distance / (Schedule_.SIGMAS * volatility)) ** 2
+        else:
+            interval = Schedule_.MAX_SECONDS * distance / Schedule_.FAR_DISTANCE
+        return min(Schedule_.MAX_SECONDS, max(Schedule_.MIN_SECONDS, interval))
@@ -1,10 +1,17 @@
 """tradingview.py - pulls data from tradingview.com to see which coins we should buy."""
 
-from tradingview_ta                      import TA_Handler, Interval
-from pprint                              import pprint
-from bot_features.low_level.kraken_enums import *
-from util.globals                        import G
-from my_sql.sql                          import SQL
+import datetime
+import time
+
+from concurrent.futures                      import ThreadPoolExecutor
+from threading                               import Lock
+from tradingview_ta                          import get_multiple_analysis, Interval
+from pprint                                  import pprint
+from bot_features.low_level.kraken_enums     import *
+from bot_features.low_level.kraken_transport import LatencyStats
+from bot_features.low_level.kraken_cache     import TTLCache
+from util.globals                            import G
+from my_sql.sql                              import SQL
 
 
 class TVData:
@@ -13,6 +20,21 @@ class TVData:
     RECOMMENDATION = "RECOMMENDATION"
     BUY            = "BUY"
     STRONG_BUY     = "STRONG_BUY"
+    WORKERS        = 8     # bulk requests sent at the same time by a scan
+    BATCH_MAX      = 200   # symbols per bulk request
+    CACHE_MAX      = 10000 # (symbol, interval) recommendations kept
+    CANDLE_DELAY   = 2     # seconds past a candle boundary before its new candle is asked for
+    # candle length of each interval, 1M is handled separately since months differ in length
+    INTERVAL_SECONDS = {
+        Interval.INTERVAL_1_MINUTE:   60,
+        Interval.INTERVAL_5_MINUTES:  5 * 60,
+        Interval.INTERVAL_15_MINUTES: 15 * 60,
+        Interval.INTERVAL_30_MINUTES: 30 * 60,
+        Interval.INTERVAL_1_HOUR:     60 * 60,
+        Interval.INTERVAL_2_HOURS:    2 * 60 * 60,
+        Interval.INTERVAL_4_HOURS:    4 * 60 * 60,
+        Interval.INTERVAL_1_DAY:      24 * 60 * 60,
+        Interval.INTERVAL_1_WEEK:     7 * 24 * 60 * 60}
     ALL_INTERVALS  = [
         Interval.INTERVAL_1_MINUTE, 
         Interval.INTERVAL_5_MINUTES, 
@@ -32,16 +54,126 @@ class TVData:
         Interval.INTERVAL_4_HOURS]
 
 
+class SignalCache():
+    def __init__(self) -> None:
+        """
+        TradingView recommendations keyed by (symbol pair, interval), each kept until its interval's next candle opens,
+        so a 1d recommendation is asked for once a day instead of every loop.
+        Stale ones are asked for in bulk, one scan request per interval for up to TVData.BATCH_MAX symbols.
+
+        Candles are aligned to UTC: minute and hour candles to multiples of their length since the epoch,
+        weeks start on monday and months on the 1st.
+
+        source, if set, is asked first: callable(symbol pairs, interval) returning {symbol pair: recommendation},
+        or None for an interval it can't do, which then goes to TradingView.
+
+        """
+        self.cache:  TTLCache = TTLCache(TVData.CACHE_MAX)
+        self.source           = None
+        return
+
+    def set_source(self, source) -> None:
+        self.source = source
+        self.cache.invalidate()
+        return
+
+    def get_next_candle(self, interval: str, now: float) -> float:
+        """Epoch time at which the candle after the one containing `now` opens."""
+        if interval == Interval.INTERVAL_1_MONTH:
+            today = datetime.datetime.fromtimestamp(now, datetime.timezone.utc)
+            first = datetime.datetime(today.year + today.month // 12, today.month % 12 + 1, 1, tzinfo=datetime.timezone.utc)
+            return first.timestamp()
+
+        seconds = TVData.INTERVAL_SECONDS[interval]
+        offset  = 4 * 24 * 60 * 60 if interval == Interval.INTERVAL_1_WEEK else 0 # the epoch was a thursday
+        return ((now - offset) // seconds + 1) * seconds + offset
+
+    def get_ttl(self, interval: str) -> float:
+        now = time.time()
+        return self.get_next_candle(interval, now) - now + TVData.CANDLE_DELAY
+
+    def __get_multiple_analysis(self, symbol_pairs: list, interval: str) -> dict:
+        """{symbol pair: recommendation} of one bulk scan request, pairs TradingView doesn't know are left out."""
+        analyses = get_multiple_analysis(screener=TVData.SCREENER, interval=interval, symbols=[f"{TVData.EXCHANGE}:{symbol_pair}".upper() for symbol_pair in symbol_pairs])
+        result   = dict()
+        for symbol_pair in symbol_pairs:
+            analysis = analyses.get(f"{TVData.EXCHANGE}:{symbol_pair}".upper())
+            if analysis is not None:
+                result[symbol_pair] = analysis.summary[TVData.RECOMMENDATION]
+        return result
+
+    def fetch(self, symbol_pairs: list, interval: str, stats: LatencyStats = None) -> dict:
+        """
+        {symbol pair: recommendation} for one interval, [] where TradingView has none.
+        Only the pairs without a cached recommendation are requested, in bulk. A failed request isn't cached.
+
+        """
+        result  = dict()
+        missing = []
+
+        for symbol_pair in dict.fromkeys(symbol_pairs):
+            hit, recommendation = self.cache.get((symbol_pair, interval))
+            if hit:
+                result[symbol_pair] = recommendation
+            else:
+                missing.append(symbol_pair)
+
+        for i in range(0, len(missing), TVData.BATCH_MAX):
+            chunk      = missing[i:i+TVData.BATCH_MAX]
+            start_time = time.time()
+            error      = False
+            try:
+                recommendations = self.source(chunk, interval) if self.source is not None else None
+                if recommendations is None:
+                    recommendations = self.__get_multiple_analysis(chunk, interval)
+                ttl = self.get_ttl(interval)
+
+                for symbol_pair in chunk:
+                    result[symbol_pair] = recommendations.get(symbol_pair, [])
+                    self.cache.set((symbol_pair, interval), result[symbol_pair], ttl)
+            except Exception as e:
+                error = True
+                G.log.print_and_log(e=e, error_type=type(e).__name__, filename=__file__, tb_lineno=e.__traceback__.tb_lineno)
+                result.update((symbol_pair, []) for symbol_pair in chunk)
+            finally:
+                if stats is not None:
+                    stats.record(interval, time.time() - start_time, error)
+        return result
+
+    def filter(self, symbol_pairs: list, intervals: list, accepted: set, stats: LatencyStats = None, pool: ThreadPoolExecutor = None, name: str = "") -> list:
+        """
+        The symbol pairs whose recommendation is in `accepted` on every interval.
+        Intervals are checked in order and a pair drops out at its first miss, so later intervals are only asked for the pairs still in.
+        With a pool, the bulk requests of an interval are sent at the same time.
+
+        """
+        candidates = list(dict.fromkeys(symbol_pairs))
+
+        for interval in intervals:
+            if len(candidates) == 0:
+                break
+
+            if pool is None:
+                recommendations = self.fetch(candidates, interval, stats)
+            else:
+                recommendations = dict()
+                chunks          = [candidates[i:i+TVData.BATCH_MAX] for i in range(0, len(candidates), TVData.BATCH_MAX)]
+                for chunk_result in pool.map(lambda chunk: self.fetch(chunk, interval, stats), chunks):
+                    recommendations.update(chunk_result)
+
+            candidates = [symbol_pair for symbol_pair in candidates if recommendations.get(symbol_pair) in accepted]
+            if len(name) > 0:
+                G.log.print_and_log(f"{name}: {len(candidates)} of {len(symbol_pairs)} still in after {interval}")
+        return candidates
+
+    def summary(self) -> str:
+        return "signals " + self.cache.summary()
+
+
 class TradingView():
     def __get_recommendation(self, symbol_pair: str, interval: str) -> list:
-        """Get a recommendation (buy or sell) for the symbol."""
-        try:
-            symbol_data = TA_Handler(symbol=symbol_pair, screener=TVData.SCREENER, exchange=TVData.EXCHANGE, interval=interval)
-            if symbol_data is not None and symbol_data.get_analysis() is not None:
-                return symbol_data.get_analysis().summary[TVData.RECOMMENDATION]
-        except Exception as e:
-            G.log.print_and_log(e=e, error_type=type(e).__name__, filename=__file__, tb_lineno=e.__traceback__.tb_lineno)
-        return []
+        """Get a recommendation (buy or sell) for the symbol, from the signal cache while its candle hasn't closed."""
+        return get_signal_cache().fetch([symbol_pair], interval)[symbol_pair]
 
     def _is_buy(self, symbol_pair: str):
         """Get recommendations for all intervals in TVData. 
@@ -70,58 +202,48 @@ class TradingView():
                 return False
         return True
 
-    def get_buy_set(self) -> set:
+    def _prefetch_buy(self, symbol_pairs: list) -> list:
+        """Bring the _is_buy intervals of many pairs into the signal cache with bulk requests. Returns the pairs that are a buy."""
+        return get_signal_cache().filter(symbol_pairs, TVData.SCALP_INTERVALS, {TVData.BUY, TVData.STRONG_BUY})
+
+    def __scan(self, intervals: list, accepted: set, name: str) -> set:
         """
-        For every coin on the kraken exchange, 
-        get the analysis to see which one is a buy according to the time intervals.
+        Check every coin in the kraken_coins table, with bulk requests of TVData.BATCH_MAX coins per interval
+        sent TVData.WORKERS at a time. Progress is logged after each interval, the scan time and request latencies per interval at the end.
         
         """
-
-        sql       = SQL()
-        buy_set   = set()
-        iteration = 1
+        sql        = SQL()
+        stats      = LatencyStats()
+        start_time = time.time()
 
         result_set = sql.con_query("SELECT symbol FROM kraken_coins")
-        
-        if result_set.rowcount > 0:
-            symbol_list = result_set.fetchall()
-            total       = len(symbol_list)
-            
-            for _tuple in symbol_list:
-                symbol = _tuple[0]
-                G.log.print_and_log(f"{iteration} of {total}: {symbol}")
-                
-                if symbol not in StableCoins.STABLE_COINS_LIST:
-                    if self._is_buy(symbol + StableCoins.USD):
-                        buy_set.add(symbol)
-                iteration+=1
+        symbols    = [row[0] for row in result_set.fetchall() if row[0] not in StableCoins.STABLE_COINS_LIST] if result_set.rowcount > 0 else []
+
+        with ThreadPoolExecutor(max_workers=TVData.WORKERS, thread_name_prefix="tradingview") as pool:
+            matches = get_signal_cache().filter([symbol + StableCoins.USD for symbol in symbols], intervals, accepted, stats, pool, name)
+
+        buy_set = {symbol_pair[:-len(StableCoins.USD)] for symbol_pair in matches}
+
+        G.log.print_and_log(f"{name}: {len(symbols)} coins scanned in {round(time.time() - start_time, 1)}s, {len(buy_set)} found, {get_signal_cache().summary()}")
+        for interval, latency in stats.get().items():
+            G.log.print_and_log(f"    {interval:>3} {latency['calls']} requests, avg {latency['avg_ms']}ms, max {latency['max_ms']}ms, {latency['errors']} errors")
         return buy_set
 
-    def get_buy_long_set(self) -> set:
+    def get_buy_set(self) -> set:
         """
         For every coin on the kraken exchange, 
         get the analysis to see which one is a buy according to the time intervals.
         
         """
-        sql       = SQL()
-        buy_set   = set()
-        iteration = 1
+        return self.__scan(TVData.SCALP_INTERVALS, {TVData.BUY, TVData.STRONG_BUY}, "buy set")
 
-        result_set = sql.con_query("SELECT symbol FROM kraken_coins")
+    def get_buy_long_set(self) -> set:
+        """
+        For every coin on the kraken exchange, 
+        get the analysis to see which one is a buy according to the time intervals.
         
-        if result_set.rowcount > 0:
-            symbol_list = result_set.fetchall()
-            total       = len(symbol_list)
-            
-            for _tuple in symbol_list:
-                symbol = _tuple[0]
-                G.log.print_and_log(f"{iteration} of {total}: {symbol}")
-                
-                if symbol not in StableCoins.STABLE_COINS_LIST:
-                    if self.is_buy_long(symbol + StableCoins.USD):
-                        buy_set.add(symbol)
-                iteration+=1
-        return buy_set        
+        """
+        return self.__scan(TVData.ALL_INTERVALS, {TVData.BUY, TVData.STRONG_BUY}, "buy long set")
 
     def get_strong_buy_set(self) -> set:
         """
@@ -129,22 +251,20 @@ class TradingView():
         get the analysis to see which one is a buy according to the time intervals.
         
         """
-        sql       = SQL()
-        buy_set   = set()
-        iteration = 1
+        return self.__scan(TVData.SCALP_INTERVALS, {TVData.STRONG_BUY}, "strong buy set")
 
-        result_set = sql.con_query("SELECT symbol FROM kraken_coins")
-        
-        if result_set.rowcount > 0:
-            symbol_list = result_set.fetchall()
-            total       = len(symbol_list)
-            
-            for _tuple in symbol_list:
-                symbol = _tuple[0]
-                G.log.print_and_log(f"{iteration} of {total}: {symbol}")
-                
-                if symbol not in StableCoins.STABLE_COINS_LIST:
-                    if self.is_strong_buy(symbol + StableCoins.USD):
-                        buy_set.add(symbol)
-                iteration+=1
-        return buy_set   
+
+######################################################################
+### SHARED
+######################################################################
+
+_signal_cache:      SignalCache = None
+_signal_cache_lock: Lock        = Lock()
+
+def get_signal_cache() -> SignalCache:
+    """ One cache per process, shared by the buy loop and the scans. """
+    global _signal_cache
+    with _signal_cache_lock:
+        if _signal_cache is None:
+            _signal_cache = SignalCache()
+    return _signal_cache
@@ -1,62 +1,80 @@
+-- The schema after every migration in sql_migrations.py, which is what creates and updates it.
+
 CREATE TABLE safety_orders (
     symbol_pair         VARCHAR(20) NOT NULL,
     symbol              VARCHAR(10) NOT NULL,
     safety_order_no     INT         NOT NULL,
-    deviation           FLOAT       NOT NULL,
-    quantity            FLOAT       NOT NULL,
-    total_quantity      FLOAT       NOT NULL,
-    price               FLOAT       NOT NULL,
-    average_price       FLOAT       NOT NULL,
-    required_price      FLOAT       NOT NULL,
-    required_change     FLOAT       NOT NULL,
-    profit              FLOAT       NOT NULL,
-    cost                FLOAT       NOT NULL,
-    total_cost          FLOAT       NOT NULL,
+    deviation           DOUBLE      NOT NULL,
+    quantity            DOUBLE      NOT NULL,
+    total_quantity      DOUBLE      NOT NULL,
+    price               DOUBLE      NOT NULL,
+    average_price       DOUBLE      NOT NULL,
+    required_price      DOUBLE      NOT NULL,
+    required_change     DOUBLE      NOT NULL,
+    profit              DOUBLE      NOT NULL,
+    cost                DOUBLE      NOT NULL,
+    total_cost          DOUBLE      NOT NULL,
     order_placed        BOOLEAN     NOT NULL,
     so_no               INT         NOT NULL AUTO_INCREMENT,
-    PRIMARY KEY (so_no)
+    PRIMARY KEY (so_no),
+    INDEX ix_safety_orders_pair_placed_no (symbol_pair, order_placed, safety_order_no)
 );  
 
 CREATE TABLE open_buy_orders (
     symbol_pair         VARCHAR(20) NOT NULL,
     symbol              VARCHAR(10) NOT NULL,
     safety_order_no     INT         NOT NULL,
-    deviation           FLOAT       NOT NULL,
-    quantity            FLOAT       NOT NULL,
-    total_quantity      FLOAT       NOT NULL,
-    price               FLOAT       NOT NULL,
-    average_price       FLOAT       NOT NULL,
-    required_price      FLOAT       NOT NULL,
-    required_change     FLOAT       NOT NULL,
-    profit              FLOAT       NOT NULL,
-    cost                FLOAT       NOT NULL,
-    total_cost          FLOAT       NOT NULL,
+    deviation           DOUBLE      NOT NULL,
+    quantity            DOUBLE      NOT NULL,
+    total_quantity      DOUBLE      NOT NULL,
+    price               DOUBLE      NOT NULL,
+    average_price       DOUBLE      NOT NULL,
+    required_price      DOUBLE      NOT NULL,
+    required_change     DOUBLE      NOT NULL,
+    profit              DOUBLE      NOT NULL,
+    cost                DOUBLE      NOT NULL,
+    total_cost          DOUBLE      NOT NULL,
     filled              BOOLEAN     NOT NULL,
     obo_txid            VARCHAR(30) NOT NULL,
     obo_no              INT         NOT NULL,
-    PRIMARY KEY (obo_no)
+    PRIMARY KEY (obo_no),
+    INDEX ix_open_buy_orders_pair_filled_no (symbol_pair, filled, safety_order_no),
+    INDEX ix_open_buy_orders_txid           (obo_txid)
 );  
 
 CREATE TABLE open_sell_orders (
     symbol_pair         VARCHAR(20) NOT NULL,
     symbol              VARCHAR(10) NOT NULL,
     safety_order_no     INT         NOT NULL,
-    deviation           FLOAT       NOT NULL,
-    quantity            FLOAT       NOT NULL,
-    total_quantity      FLOAT       NOT NULL,
-    price               FLOAT       NOT NULL,
-    average_price       FLOAT       NOT NULL,
-    required_price      FLOAT       NOT NULL,
-    required_change     FLOAT       NOT NULL,
-    profit              FLOAT       NOT NULL,
-    cost                FLOAT       NOT NULL,
-    total_cost          FLOAT       NOT NULL,
+    deviation           DOUBLE      NOT NULL,
+    quantity            DOUBLE      NOT NULL,
+    total_quantity      DOUBLE      NOT NULL,
+    price               DOUBLE      NOT NULL,
+    average_price       DOUBLE      NOT NULL,
+    required_price      DOUBLE      NOT NULL,
+    required_change     DOUBLE      NOT NULL,
+    profit              DOUBLE      NOT NULL,
+    cost                DOUBLE      NOT NULL,
+    total_cost          DOUBLE      NOT NULL,
     cancelled           BOOLEAN     NOT NULL,
     filled              BOOLEAN     NOT NULL,
     oso_txid            VARCHAR(30) NOT NULL,
-    oso_no              INT         NOT NULL
+    oso_no              INT         NOT NULL,
+    oso_id              INT         NOT NULL AUTO_INCREMENT,
+    PRIMARY KEY (oso_id),
+    INDEX ix_open_sell_orders_pair_filled (symbol_pair, filled, cancelled),
+    INDEX ix_open_sell_orders_txid        (oso_txid)
 );  
 
 CREATE TABLE kraken_coins (
-    symbol VARCHAR(10) NOT NULL
+    symbol     VARCHAR(10) NOT NULL,
+    symbol_no  INT         NOT NULL AUTO_INCREMENT,
+    PRIMARY KEY (symbol_no)
+);
+
+CREATE TABLE schema_version (
+    version     INT          NOT NULL,
+    description VARCHAR(100) NOT NULL,
+    applied_at  TIMESTAMP    NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (version)
 );
@@ -1,13 +1,73 @@
-import mysql.connector
 import os
+import struct
 
-from mysql.connector.cursor               import MySQLCursorBuffered
-from mysql.connector.connection           import MySQLConnection, MySQLCursor
+from mysql.connector.constants            import FieldType
+from mysql.connector.cursor               import MySQLCursor
+from mysql.connector.connection           import MySQLConnection
 from bot_features.low_level.kraken_enums  import *
+from my_sql.sql_pool                      import SQLPool, get_sql_pool
+from my_sql.sql_migrations                import KRAKEN_COINS_TABLE, SQLMigrations
+
+
+def _float32(value: float) -> float:
+    """The shortest decimal that is stored as the same float32 as `value`."""
+    if value is None:
+        return value
+    stored = struct.pack("<f", value)
+    for digits in range(6, 9):
+        rounded = float(f"{value:.{digits}g}")
+        if struct.pack("<f", rounded) == stored:
+            return rounded
+    return value
+
+
+class SQLResult():
+    def __init__(self, cursor: MySQLCursor) -> None:
+        """
+        The rows of a statement, read off its cursor right away so the connection can go back to the pool.
+        Has the rowcount, fetchone and fetchall of the buffered cursors queries used to return.
+
+        """
+        with_rows            = cursor.description is not None
+        self.columns:   list = [column[0] for column in cursor.description] if with_rows else []
+        self.rows:      list = cursor.fetchall() if with_rows else []
+
+        # the binary protocol of prepared statements hands out FLOAT columns as the float32 they are stored as, 2.3 reads 2.299999952.
+        # the text protocol reads them at the column's precision, so do the same
+        floats = [i for i, column in enumerate(cursor.description) if column[1] == FieldType.FLOAT] if with_rows else []
+        if len(floats) > 0:
+            self.rows = [tuple(_float32(value) if i in floats else value for i, value in enumerate(row)) for row in self.rows]
+        self.rowcount:  int  = len(self.rows) if with_rows else cursor.rowcount
+        self.lastrowid: int  = cursor.lastrowid
+        self.__next:    int  = 0
+        return
+
+    def __iter__(self):
+        return iter(self.rows)
+
+    def fetchone(self) -> tuple:
+        if self.__next >= len(self.rows):
+            return None
+        self.__next += 1
+        return self.rows[self.__next - 1]
+
+    def fetchall(self) -> list:
+        rows        = self.rows[self.__next:]
+        self.__next = len(self.rows)
+        return rows
 
 
 class SQL():
     def __init__(self, host_name: str = "localhost", user_name: str = "root", user_password: str = "12345", db_name: str = "dca") -> None:
+        """
+        Values are never put into the query text. Queries take %s placeholders and a tuple of parameters,
+        and run as server side prepared statements that each pooled connection keeps (see SQLPool.get_statement).
+        Queries without parameters, like DDL, go over the plain text protocol.
+
+        Connections come from the pool of Storage_.BACKEND: the MySQL server given here, or the embedded SQLite file Storage_.SQLITE_FILE.
+        Queries are written once, in the SQL both understand, with %s placeholders that the pool translates.
+
+        """
         self.host_name:     str              = host_name
         self.user_name:     str              = user_name
         self.user_password: str              = user_password
@@ -16,146 +76,126 @@ class SQL():
         self.obo_columns:   str              = "(symbol_pair, symbol, safety_order_no, deviation, quantity, total_quantity, price, average_price, required_price, required_change, profit, cost, total_cost, filled, obo_txid, obo_no)"
         self.oso_columns:   str              = "(symbol_pair, symbol, safety_order_no, deviation, quantity, total_quantity, price, average_price, required_price, required_change, profit, cost, total_cost, cancelled, filled, oso_txid, oso_no)"
         self.connection:    MySQLConnection  = None
+        self.pool:          SQLPool          = get_sql_pool(host_name, user_name, user_password, db_name)
         return
 
     def __create_db_connection(self) -> None:
-        self.connection = mysql.connector.connect(
-            host=self.host_name,
-            user=self.user_name,
-            passwd=self.user_password,
-            database=self.db_name)
+        """Borrow a connection from the pool, it is handed back by __close_db_connection."""
+        self.connection = self.pool.acquire()
         return 
     
     def __close_db_connection(self) -> None:
         if self.connection is not None:
-            cursor  = self.connection.cursor()
-            cursor.close()
-            self.connection.close()
+            self.pool.release(self.connection)
+            self.connection = None
         else:
             print("MySQL no connection open")
         return
 
-    def __update(self, query: str) -> MySQLCursor:
-        cursor = self.connection.cursor()
-        cursor.execute(query)
-        self.connection.commit()
-        return cursor
+    def __execute(self, query: str, params: tuple = None) -> SQLResult:
+        if params is None:
+            cursor = self.connection.cursor()
+            cursor.execute(query)
+            result = SQLResult(cursor)
+            cursor.close()
+            return result
+
+        query, cursor = self.pool.get_statement(self.connection, query)
+        cursor.execute(query, tuple(params))
+        return SQLResult(cursor)
 
-    def __query(self, query: str) -> MySQLCursorBuffered:
-        cursor = self.connection.cursor(buffered=True)
-        cursor.execute(query)
-        return cursor
-    
-    def con_query(self, query: str) -> MySQLCursorBuffered:
+    def placeholders(self, count: int) -> str:
+        """"%s, %s, ..." for `count` values, as in IN (...) or VALUES (...)."""
+        return ", ".join(["%s"] * count)
+
+    def insert_many(self, table_name: str, columns: str, rows: list) -> tuple:
+        """(query, params) of one multi-row INSERT of the rows, to run inside a con_update_batch."""
+        values = f"({self.placeholders(len(rows[0]))})"
+        return f"INSERT INTO {table_name} {columns} VALUES {', '.join([values] * len(rows))}", tuple(value for row in rows for value in row)
+
+    def con_query(self, query: str, params: tuple = None) -> SQLResult:
         self.__create_db_connection()
-        result_set = self.__query(query)
-        self.__close_db_connection()
+        try:
+            result_set = self.__execute(query, params)
+        finally:
+            self.__close_db_connection()
         return result_set
     
-    def con_update(self, query: str) -> None:
+    def con_update(self, query: str, params: tuple = None) -> int:
+        """Returns the number of rows the query changed."""
+        return self.con_update_batch([(query, params)])
+    
+    def con_update_batch(self, queries: list) -> int:
+        """
+        Run the queries, each a query or (query, params), on one connection and commit them together, so they are all applied or none are.
+        Returns the number of rows they changed.
+        
+        """
         self.__create_db_connection()
-        result_set = self.__update(query)
-        result_set.close()
-        self.__close_db_connection()
-        return
+        rowcount = 0
+        try:
+            self.pool.begin(self.connection)
+            for query in queries:
+                query, params = query if isinstance(query, tuple) else (query, None)
+                rowcount     += self.__execute(query, params).rowcount
+            self.connection.commit()
+        except Exception:
+            self.connection.rollback()
+            raise
+        finally:
+            self.__close_db_connection()
+        return rowcount
+
+    def con_insert_many(self, table_name: str, columns: str, rows: list) -> int:
+        """
+        Insert every row in one round trip: executemany turns a single-row INSERT into one multi-row INSERT.
+        columns is one of the *_columns strings, rows are tuples in the same order. Returns the number of rows inserted.
+
+        """
+        if len(rows) == 0:
+            return 0
+
+        self.__create_db_connection()
+        try:
+            self.pool.begin(self.connection)
+            cursor = self.connection.cursor()
+            cursor.executemany(self.pool.translate(f"INSERT INTO {table_name} {columns} VALUES ({self.placeholders(len(rows[0]))})"), rows)
+            rowcount = cursor.rowcount
+            cursor.close()
+            self.connection.commit()
+        except Exception:
+            self.connection.rollback()
+            raise
+        finally:
+            self.__close_db_connection()
+        return rowcount
     
     def drop_all_tables(self) -> None:
         self.con_update("DROP TABLE open_sell_orders")
         self.con_update("DROP TABLE open_buy_orders")
         self.con_update("DROP TABLE safety_orders")
+        self.con_update("DROP TABLE IF EXISTS schema_version")
         return
 
     def create_tables(self) -> None:
-        """Drops and creates the tables."""
-        
-        safety_orders = """
-            CREATE TABLE safety_orders (
-                symbol_pair         VARCHAR(20) NOT NULL,
-                symbol              VARCHAR(10) NOT NULL,
-                safety_order_no     INT         NOT NULL,
-                deviation           FLOAT       NOT NULL,
-                quantity            FLOAT       NOT NULL,
-                total_quantity      FLOAT       NOT NULL,
-                price               FLOAT       NOT NULL,
-                average_price       FLOAT       NOT NULL,
-                required_price      FLOAT       NOT NULL,
-                required_change     FLOAT       NOT NULL,
-                profit              FLOAT       NOT NULL,
-                cost                FLOAT       NOT NULL,
-                total_cost          FLOAT       NOT NULL,
-                order_placed        BOOLEAN     NOT NULL,
-                so_no               INT         NOT NULL AUTO_INCREMENT,
-                PRIMARY KEY (so_no)
-            );  """
-
-        open_buy_orders = """
-            CREATE TABLE open_buy_orders (
-                symbol_pair         VARCHAR(20) NOT NULL,
-                symbol              VARCHAR(10) NOT NULL,
-                safety_order_no     INT         NOT NULL,
-                deviation           FLOAT       NOT NULL,
-                quantity            FLOAT       NOT NULL,
-                total_quantity      FLOAT       NOT NULL,
-                price               FLOAT       NOT NULL,
-                average_price       FLOAT       NOT NULL,
-                required_price      FLOAT       NOT NULL,
-                required_change     FLOAT       NOT NULL,
-                profit              FLOAT       NOT NULL,
-                cost                FLOAT       NOT NULL,
-                total_cost          FLOAT       NOT NULL,
-                filled              BOOLEAN     NOT NULL,
-                obo_txid            VARCHAR(30) NOT NULL,
-                obo_no              INT         NOT NULL,
-                PRIMARY KEY (obo_no)
-            );  """
-
-        open_sell_orders = """
-            CREATE TABLE open_sell_orders (
-                symbol_pair         VARCHAR(20) NOT NULL,
-                symbol              VARCHAR(10) NOT NULL,
-                safety_order_no     INT         NOT NULL,
-                deviation           FLOAT       NOT NULL,
-                quantity            FLOAT       NOT NULL,
-                total_quantity      FLOAT       NOT NULL,
-                price               FLOAT       NOT NULL,
-                average_price       FLOAT       NOT NULL,
-                required_price      FLOAT       NOT NULL,
-                required_change     FLOAT       NOT NULL,
-                profit              FLOAT       NOT NULL,
-                cost                FLOAT       NOT NULL,
-                total_cost          FLOAT       NOT NULL,
-                cancelled           BOOLEAN     NOT NULL,
-                filled              BOOLEAN     NOT NULL,
-                oso_txid            VARCHAR(30) NOT NULL,
-                oso_no              INT         NOT NULL
-            );  """
-        
-        self.con_update(safety_orders)
-        self.con_update(open_buy_orders)
-        self.con_update(open_sell_orders)
+        """Creates the tables that don't exist yet and brings them up to the latest schema, see my_sql/sql_migrations.py."""
+        SQLMigrations(self).migrate()
         return
 
     def create_kraken_coins_table(self) -> None:
         self.con_update("DROP TABLE kraken_coins")
-        self.con_update("""
-            CREATE TABLE kraken_coins (
-                symbol     VARCHAR(10) NOT NULL,
-                symbol_no  INT         NOT NULL AUTO_INCREMENT,
-                PRIMARY KEY (symbol_no)
-                );""")
+        self.con_update(KRAKEN_COINS_TABLE[self.pool.dialect])
         
         if os.path.exists(KRAKEN_COINS_JSON):
             with open(KRAKEN_COINS_JSON, 'r') as file:
                 lines = file.readlines()
                 lines.sort()
-                for line in lines:
-                    symbol = line.replace("\n", "")
-                    self.con_update(f"INSERT INTO kraken_coins (symbol) VALUES ('{symbol}')")
+                self.con_insert_many("kraken_coins", "(symbol)", [(line.replace("\n", ""),) for line in lines])
         return
 
     def con_get_symbols(self) -> set:
         bought_set = set()
-        result_set: MySQLCursorBuffered = self.con_query("SELECT symbol FROM safety_orders")
+        result_set: SQLResult = self.con_query("SELECT symbol FROM safety_orders")
         if result_set.rowcount > 0:
             for symbol in result_set.fetchall():
                 bought_set.add(symbol[0])
@@ -164,40 +204,56 @@ class SQL():
     def con_get_symbol_pairs(self) -> set:
         """Gets the symbol pairs that are currently in the database under the safety_orders table."""
         bought_set = set()
-        result_set: MySQLCursorBuffered = self.con_query("SELECT symbol_pair FROM safety_orders")
+        result_set: SQLResult = self.con_query("SELECT symbol_pair FROM safety_orders")
         if result_set.rowcount > 0:
             for symbol in result_set.fetchall():
                 bought_set.add(symbol[0])
         return bought_set
         
     def con_get_required_price(self, table_name: str, symbol_pair: str) -> float:
-        # result_set: MySQLCursorBuffered = self.con_query(f"SELECT required_price FROM {table_name} WHERE symbol_pair='{symbol_pair}' AND order_placed=false LIMIT 1")
-        result_set: MySQLCursorBuffered = self.con_query(f"SELECT MAX(required_price) FROM {table_name} WHERE symbol_pair='{symbol_pair}' AND filled=false LIMIT 1")
+        result_set: SQLResult = self.con_query(f"SELECT MAX(required_price) FROM {table_name} WHERE symbol_pair=%s AND filled=false LIMIT 1", (symbol_pair,))
         if result_set.rowcount > 0:
             req_price_list = result_set.fetchall()
         return req_price_list[0][0] if result_set.rowcount > 0 else -1
     
     def con_get_open_buy_orders(self, symbol_pair: str) -> int:
-        result_set: MySQLCursorBuffered = self.con_query(f"SELECT symbol_pair FROM open_buy_orders WHERE symbol_pair='{symbol_pair}' AND filled=false")
+        result_set: SQLResult = self.con_query("SELECT symbol_pair FROM open_buy_orders WHERE symbol_pair=%s AND filled=false", (symbol_pair,))
         if result_set.rowcount > 0:
             return len(result_set.fetchall())
         return 0
+
+    def con_get_order_prices(self, symbol_pair: str) -> tuple:
+        """([(price, obo_txid) of every open buy order], [(required price, oso_txid) of every open sell order]) of the pair."""
+        return self.con_get_buy_order_prices(symbol_pair), self.con_get_sell_order_prices(symbol_pair)
+
+    def con_get_buy_order_prices(self, symbol_pair: str) -> list:
+        result_set: SQLResult = self.con_query("SELECT price, obo_txid FROM open_buy_orders WHERE symbol_pair=%s AND filled=false", (symbol_pair,))
+        return [(float(row[0]), row[1]) for row in result_set.fetchall()] if result_set.rowcount > 0 else []
+
+    def con_get_sell_order_prices(self, symbol_pair: str) -> list:
+        result_set: SQLResult = self.con_query("SELECT required_price, oso_txid FROM open_sell_orders WHERE symbol_pair=%s AND filled=false AND cancelled=false", (symbol_pair,))
+        return [(float(row[0]), row[1]) for row in result_set.fetchall()] if result_set.rowcount > 0 else []
         
     def con_get_quantities(self, symbol_pair: str) -> list:
-        result_set: MySQLCursorBuffered = self.con_query(f"SELECT quantity FROM safety_orders WHERE symbol_pair='{symbol_pair}' AND order_placed=false")
+        result_set: SQLResult = self.con_query("SELECT quantity FROM safety_orders WHERE symbol_pair=%s AND order_placed=false", (symbol_pair,))
         return [quantity[0] for quantity in result_set.fetchall()] if result_set.rowcount > 0 else []
     
     def con_get_prices(self, symbol_pair: str) -> list:
-        result_set: MySQLCursorBuffered = self.con_query(f"SELECT price FROM safety_orders WHERE symbol_pair='{symbol_pair}' AND order_placed=false")
+        result_set: SQLResult = self.con_query("SELECT price FROM safety_orders WHERE symbol_pair=%s AND order_placed=false", (symbol_pair,))
         return [price[0] for price in result_set.fetchall()] if result_set.rowcount > 0 else []
     
+    def con_get_safety_orders(self, symbol_pair: str, limit: int) -> list:
+        """The next `limit` safety order rows that haven't been placed, lowest safety_order_no first."""
+        result_set: SQLResult = self.con_query("SELECT * FROM safety_orders WHERE symbol_pair=%s AND order_placed=false ORDER BY safety_order_no LIMIT %s", (symbol_pair, limit))
+        return result_set.fetchall() if result_set.rowcount > 0 else []
+    
     def con_get_row(self, tablename: str, symbol_pair: str, safety_order_number: int) -> tuple:
-        result_set = self.con_query(f"SELECT * FROM {tablename} WHERE symbol_pair='{symbol_pair}' AND safety_order_no={safety_order_number}")
+        result_set = self.con_query(f"SELECT * FROM {tablename} WHERE symbol_pair=%s AND safety_order_no=%s", (symbol_pair, safety_order_number))
         if result_set.rowcount > 0:
             return result_set.fetchone()
         return tuple()
     
-    def parse_so_number(self, result_set: MySQLCursorBuffered) -> int:
+    def parse_so_number(self, result_set: SQLResult) -> int:
         """Return the safety order number that previously queried."""
         if result_set.rowcount > 0:
             num = result_set.fetchone()
@@ -0,0 +1,268 @@
+"""sql_migrations.py: Versioned schema changes for MySQL and SQLite, applied in order on startup, and an EXPLAIN check of the queries the bot runs most."""
+
+import re
+
+from util.globals                        import G
+from util.colors                         import Color
+from bot_features.low_level.kraken_enums import *
+
+
+KRAKEN_COINS_TABLE = {
+    Storage_.MYSQL: """
+        CREATE TABLE IF NOT EXISTS kraken_coins (
+            symbol     VARCHAR(10) NOT NULL,
+            symbol_no  INT         NOT NULL AUTO_INCREMENT,
+            PRIMARY KEY (symbol_no)
+        );  """,
+    Storage_.SQLITE: """
+        CREATE TABLE IF NOT EXISTS kraken_coins (
+            symbol     VARCHAR(10) NOT NULL,
+            symbol_no  INTEGER     PRIMARY KEY AUTOINCREMENT
+        );  """}
+
+FLOAT_COLUMNS = ["deviation", "quantity", "total_quantity", "price", "average_price", "required_price", "required_change", "profit", "cost", "total_cost"]
+
+def _modify_float_columns(table_name: str, column_type: str) -> dict:
+    """The MySQL ALTER TABLE that makes every FLOAT_COLUMNS column of the table a `column_type`."""
+    return {Storage_.MYSQL: f"ALTER TABLE {table_name} " + ", ".join(f"MODIFY {column} {column_type} NOT NULL" for column in FLOAT_COLUMNS)}
+
+# (version, description, statements). A statement is run on every backend, or is a {Storage_ backend: statement} of the ones that differ.
+# Append new versions at the end, never edit one that has shipped. MySQL statements have to be safe to run twice:
+# IF NOT EXISTS, an ALTER TABLE ... MODIFY, or a CREATE INDEX / ALTER TABLE ... ADD COLUMN, which are skipped once the index or column exists.
+MIGRATIONS = [
+    (1, "tables", [
+        {Storage_.MYSQL: """
+        CREATE TABLE IF NOT EXISTS safety_orders (
+            symbol_pair         VARCHAR(20) NOT NULL,
+            symbol              VARCHAR(10) NOT NULL,
+            safety_order_no     INT         NOT NULL,
+            deviation           FLOAT       NOT NULL,
+            quantity            FLOAT       NOT NULL,
+            total_quantity      FLOAT       NOT NULL,
+            price               FLOAT       NOT NULL,
+            average_price       FLOAT       NOT NULL,
+            required_price      FLOAT       NOT NULL,
+            required_change     FLOAT       NOT NULL,
+            profit              FLOAT       NOT NULL,
+            cost                FLOAT       NOT NULL,
+            total_cost          FLOAT       NOT NULL,
+            order_placed        BOOLEAN     NOT NULL,
+            so_no               INT         NOT NULL AUTO_INCREMENT,
+            PRIMARY KEY (so_no)
+        );  """,
+         Storage_.SQLITE: """
+        CREATE TABLE IF NOT EXISTS safety_orders (
+            symbol_pair         VARCHAR(20) NOT NULL,
+            symbol              VARCHAR(10) NOT NULL,
+            safety_order_no     INT         NOT NULL,
+            deviation           FLOAT       NOT NULL,
+            quantity            FLOAT       NOT NULL,
+            total_quantity      FLOAT       NOT NULL,
+            price               FLOAT       NOT NULL,
+            average_price       FLOAT       NOT NULL,
+            required_price      FLOAT       NOT NULL,
+            required_change     FLOAT       NOT NULL,
+            profit              FLOAT       NOT NULL,
+            cost                FLOAT       NOT NULL,
+            total_cost          FLOAT       NOT NULL,
+            order_placed        BOOLEAN     NOT NULL,
+            so_no               INTEGER     PRIMARY KEY AUTOINCREMENT
+        );  """},
+        """
+        CREATE TABLE IF NOT EXISTS open_buy_orders (
+            symbol_pair         VARCHAR(20) NOT NULL,
+            symbol              VARCHAR(10) NOT NULL,
+            safety_order_no     INT         NOT NULL,
+            deviation           FLOAT       NOT NULL,
+            quantity            FLOAT       NOT NULL,
+            total_quantity      FLOAT       NOT NULL,
+            price               FLOAT       NOT NULL,
+            average_price       FLOAT       NOT NULL,
+            required_price      FLOAT       NOT NULL,
+            required_change     FLOAT       NOT NULL,
+            profit              FLOAT       NOT NULL,
+            cost                FLOAT       NOT NULL,
+            total_cost          FLOAT       NOT NULL,
+            filled              BOOLEAN     NOT NULL,
+            obo_txid            VARCHAR(30) NOT NULL,
+            obo_no              INT         NOT NULL,
+            PRIMARY KEY (obo_no)
+        );  """,
+        """
+        CREATE TABLE IF NOT EXISTS open_sell_orders (
+            symbol_pair         VARCHAR(20) NOT NULL,
+            symbol              VARCHAR(10) NOT NULL,
+            safety_order_no     INT         NOT NULL,
+            deviation           FLOAT       NOT NULL,
+            quantity            FLOAT       NOT NULL,
+            total_quantity      FLOAT       NOT NULL,
+            price               FLOAT       NOT NULL,
+            average_price       FLOAT       NOT NULL,
+            required_price      FLOAT       NOT NULL,
+            required_change     FLOAT       NOT NULL,
+            profit              FLOAT       NOT NULL,
+            cost                FLOAT       NOT NULL,
+            total_cost          FLOAT       NOT NULL,
+            cancelled           BOOLEAN     NOT NULL,
+            filled              BOOLEAN     NOT NULL,
+            oso_txid            VARCHAR(30) NOT NULL,
+            oso_no              INT         NOT NULL
+        );  """,
+        KRAKEN_COINS_TABLE]),
+
+    # a sell order is replaced on every fill, so neither oso_no nor oso_txid is unique over a trade's rows
+    # sqlite can't add a primary key to a table, so it copies the rows into a new one
+    (2, "open_sell_orders primary key", [
+        {Storage_.MYSQL:  "ALTER TABLE open_sell_orders ADD COLUMN oso_id INT NOT NULL AUTO_INCREMENT PRIMARY KEY"},
+        {Storage_.SQLITE: """
+        CREATE TABLE open_sell_orders_new (
+            symbol_pair         VARCHAR(20) NOT NULL,
+            symbol              VARCHAR(10) NOT NULL,
+            safety_order_no     INT         NOT NULL,
+            deviation           FLOAT       NOT NULL,
+            quantity            FLOAT       NOT NULL,
+            total_quantity      FLOAT       NOT NULL,
+            price               FLOAT       NOT NULL,
+            average_price       FLOAT       NOT NULL,
+            required_price      FLOAT       NOT NULL,
+            required_change     FLOAT       NOT NULL,
+            profit              FLOAT       NOT NULL,
+            cost                FLOAT       NOT NULL,
+            total_cost          FLOAT       NOT NULL,
+            cancelled           BOOLEAN     NOT NULL,
+            filled              BOOLEAN     NOT NULL,
+            oso_txid            VARCHAR(30) NOT NULL,
+            oso_no              INT         NOT NULL,
+            oso_id              INTEGER     PRIMARY KEY AUTOINCREMENT
+        );  """},
+        {Storage_.SQLITE: "INSERT INTO open_sell_orders_new SELECT *, NULL FROM open_sell_orders"},
+        {Storage_.SQLITE: "DROP TABLE open_sell_orders"},
+        {Storage_.SQLITE: "ALTER TABLE open_sell_orders_new RENAME TO open_sell_orders"}]),
+
+    # one index per access pattern: the pair and its state flags first, then the column sorted or aggregated on
+    (3, "indexes for the pair, state and txid lookups", [
+        "CREATE INDEX ix_safety_orders_pair_placed_no   ON safety_orders    (symbol_pair, order_placed, safety_order_no)",
+        "CREATE INDEX ix_open_buy_orders_pair_filled_no ON open_buy_orders  (symbol_pair, filled, safety_order_no)",
+        "CREATE INDEX ix_open_buy_orders_txid           ON open_buy_orders  (obo_txid)",
+        "CREATE INDEX ix_open_sell_orders_pair_filled   ON open_sell_orders (symbol_pair, filled, cancelled)",
+        "CREATE INDEX ix_open_sell_orders_txid          ON open_sell_orders (oso_txid)"]),
+
+    # a mysql FLOAT is a float32, 2.3 is stored as 2.2999999523 and the binary protocol of prepared statements reads it so.
+    # the columns go through VARCHAR, which has the FLOAT's shortest decimal, on their way to DOUBLE so stored values keep it.
+    # sqlite's FLOAT columns already hold doubles
+    (4, "DOUBLE prices and quantities", [
+        _modify_float_columns("safety_orders",    "VARCHAR(32)"),
+        _modify_float_columns("safety_orders",    "DOUBLE"),
+        _modify_float_columns("open_buy_orders",  "VARCHAR(32)"),
+        _modify_float_columns("open_buy_orders",  "DOUBLE"),
+        _modify_float_columns("open_sell_orders", "VARCHAR(32)"),
+        _modify_float_columns("open_sell_orders", "DOUBLE")]),
+]
+
+# what buy, sell and dca run on every check and fill, with sample parameters for EXPLAIN
+HOT_QUERIES = [
+    ("SELECT * FROM safety_orders WHERE symbol_pair=%s AND order_placed=false ORDER BY safety_order_no LIMIT %s",         ("XBTUSD", 1)),
+    ("SELECT * FROM safety_orders WHERE symbol_pair=%s AND safety_order_no=%s",                                           ("XBTUSD", 1)),
+    ("SELECT MIN(so_no) FROM safety_orders WHERE symbol_pair=%s",                                                         ("XBTUSD",)),
+    ("SELECT price, obo_txid FROM open_buy_orders WHERE symbol_pair=%s AND filled=false",                                 ("XBTUSD",)),
+    ("SELECT MAX(safety_order_no) FROM open_buy_orders WHERE symbol_pair=%s AND filled=true",                             ("XBTUSD",)),
+    ("SELECT symbol_pair FROM open_buy_orders WHERE obo_txid=%s AND filled=false",                                        ("TXID",)),
+    ("SELECT * FROM open_buy_orders WHERE symbol_pair=%s AND obo_txid=%s",                                                ("XBTUSD", "TXID")),
+    ("UPDATE open_buy_orders SET filled=true WHERE obo_txid=%s AND filled=false AND symbol_pair=%s",                      ("TXID", "XBTUSD")),
+    ("SELECT required_price, oso_txid FROM open_sell_orders WHERE symbol_pair=%s AND filled=false AND cancelled=false",   ("XBTUSD",)),
+    ("SELECT profit FROM open_sell_orders WHERE symbol_pair=%s AND filled=false",                                         ("XBTUSD",)),
+    ("SELECT symbol_pair FROM open_sell_orders WHERE oso_txid=%s AND filled=false",                                       ("TXID",)),
+    ("UPDATE open_sell_orders SET cancelled=true WHERE symbol_pair=%s AND cancelled=false AND filled=false and oso_txid=%s", ("XBTUSD", "TXID")),
+]
+
+
+class SQLMigrations():
+    def __init__(self, sql) -> None:
+        """
+        sql: the my_sql.sql.SQL to run on.
+        The schema_version table holds one row per applied migration. migrate() applies the ones above the highest version in it,
+        each recorded once all of its statements went through.
+        On SQLite a migration is one transaction and a failed one leaves nothing behind.
+        MySQL commits every DDL statement on its own, so a failed migration can leave some of its statements applied.
+        On the next run the indexes and columns that already exist are skipped and the migration carries on from where it stopped.
+
+        """
+        self.sql = sql
+        return
+
+    def get_version(self) -> int:
+        self.sql.con_update("""
+            CREATE TABLE IF NOT EXISTS schema_version (
+                version     INT          NOT NULL,
+                description VARCHAR(100) NOT NULL,
+                applied_at  TIMESTAMP    NOT NULL DEFAULT CURRENT_TIMESTAMP,
+                PRIMARY KEY (version)
+            );  """)
+        result_set = self.sql.con_query("SELECT MAX(version) FROM schema_version")
+        version    = result_set.fetchone()[0] if result_set.rowcount > 0 else None
+        return version if version is not None else 0
+
+    def __is_applied(self, statement: str) -> bool:
+        """True for a MySQL CREATE INDEX or ADD COLUMN whose index or column is already there."""
+        index = re.search(r"CREATE INDEX (\w+)\s+ON (\w+)", statement)
+        if index is not None:
+            result_set = self.sql.con_query("SELECT 1 FROM information_schema.statistics WHERE table_schema=DATABASE() AND index_name=%s AND table_name=%s",
+                                            (index.group(1), index.group(2)))
+            return result_set.rowcount > 0
+
+        column = re.search(r"ALTER TABLE (\w+) ADD COLUMN (\w+)", statement)
+        if column is not None:
+            result_set = self.sql.con_query("SELECT 1 FROM information_schema.columns WHERE table_schema=DATABASE() AND table_name=%s AND column_name=%s",
+                                            (column.group(1), column.group(2)))
+            return result_set.rowcount > 0
+        return False
+
+    def migrate(self) -> int:
+        """Bring the schema up to the last migration, returns the version it is at."""
+        version = self.get_version()
+        dialect = self.sql.pool.dialect
+
+        for migration_version, description, statements in MIGRATIONS:
+            if migration_version <= version:
+                continue
+
+            G.log.print_and_log(f"Schema migration {migration_version}: {description}")
+            statements = [statement.get(dialect) if isinstance(statement, dict) else statement for statement in statements]
+            statements = [statement for statement in statements if statement is not None]
+            record     = ("INSERT INTO schema_version (version, description) VALUES (%s, %s)", (migration_version, description))
+
+            if dialect == Storage_.MYSQL:
+                for statement in statements:
+                    if not self.__is_applied(statement):
+                        self.sql.con_update(statement)
+                self.sql.con_update(*record)
+            else:
+                self.sql.con_update_batch(statements + [record])
+            version = migration_version
+        return version
+
+    def explain(self, query: str, params: tuple) -> list:
+        """The tables EXPLAIN says `query` reads with a full scan."""
+        if self.sql.pool.dialect == Storage_.SQLITE:
+            # details read "SCAN table", "SCAN table USING COVERING INDEX ..." or "SEARCH table USING INDEX ..."
+            result_set = self.sql.con_query("EXPLAIN QUERY PLAN " + query, params)
+            detail     = result_set.columns.index("detail")
+            return [row[detail].split()[1] for row in result_set.fetchall() if row[detail].startswith("SCAN ") and " USING " not in row[detail]]
+
+        result_set = self.sql.con_query("EXPLAIN " + query, params)
+        table      = result_set.columns.index("table")
+        access     = result_set.columns.index("type")
+        return [row[table] for row in result_set.fetchall() if row[access] == "ALL"]
+
+    def check(self) -> list:
+        """EXPLAIN every query in HOT_QUERIES and log the ones that scan a whole table. Returns those queries."""
+        scanning = []
+        for query, params in HOT_QUERIES:
+            try:
+                tables = self.explain(query, params)
+                if len(tables) > 0:
+                    scanning.append(query)
+                    G.log.print_and_log(Color.FG_YELLOW + f"Full scan of {', '.join(tables)}{Color.ENDC}: {query}")
+            except Exception as e:
+                G.log.print_and_log(e=e, error_type=type(e).__name__, filename=__file__, tb_lineno=e.__traceback__.tb_lineno)
+        return scanning
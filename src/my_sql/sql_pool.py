@@ -0,0 +1,273 @@
+"""sql_pool.py: Thread-safe pools of open MySQL or SQLite connections shared by every SQL object of a process."""
+
+import mysql.connector
+import sqlite3
+import time
+
+from collections                         import OrderedDict
+from queue                               import LifoQueue, Empty
+from threading                           import Lock
+from mysql.connector.connection          import MySQLConnection
+from mysql.connector.errors              import PoolError
+from bot_features.low_level.kraken_enums import *
+
+
+class SQLPool():
+    def __init__(self, host_name: str, user_name: str, user_password: str, db_name: str, size: int = None, timeout: float = None) -> None:
+        """
+        Up to `size` connections, opened on demand and handed out most recently used first, so the ones left idle can age out.
+        When all of them are in use, acquire() waits up to `timeout` seconds for one to come back and raises PoolError after that.
+
+        A connection idle for more than SQLPool_.PING_SECONDS is pinged before it is handed out and replaced if the server dropped it.
+        release() ends whatever transaction is left open, so the next user doesn't read from an old snapshot.
+
+        Each connection keeps its last SQLPool_.STATEMENTS_MAX prepared statements, so a query is parsed by the server
+        once per connection rather than on every call.
+
+        """
+        self.dialect:       str       = Storage_.MYSQL
+        self.host_name:     str       = host_name
+        self.user_name:     str       = user_name
+        self.user_password: str       = user_password
+        self.db_name:       str       = db_name
+        self.size:          int       = size    if size    is not None else SQLPool_.SIZE
+        self.timeout:       float     = timeout if timeout is not None else SQLPool_.TIMEOUT
+        self.__idle:        LifoQueue = LifoQueue() # (connection, time it was released)
+        self.__lock:        Lock      = Lock()
+        self.__open:        int       = 0
+        self.__statements:  dict      = {} # id(connection) -> OrderedDict of query -> (query, prepared cursor)
+        self.__stats:       dict      = {}
+        self.reset()
+        return
+
+    def _connect(self) -> MySQLConnection:
+        return mysql.connector.connect(
+            host=self.host_name,
+            user=self.user_name,
+            passwd=self.user_password,
+            database=self.db_name)
+
+    def _ping(self, connection: MySQLConnection) -> None:
+        """Raises if the connection is no longer usable."""
+        connection.ping(reconnect=False)
+        return
+
+    def translate(self, query: str) -> str:
+        """The query in this backend's placeholder style, queries are written with %s."""
+        return query
+
+    def begin(self, connection: MySQLConnection) -> None:
+        """Open the transaction of a write. MySQL opens one with the first statement, though DDL still commits on its own."""
+        return
+
+    def __discard(self, connection: MySQLConnection) -> None:
+        try:
+            connection.close()
+        except Exception:
+            pass
+        with self.__lock:
+            self.__open -= 1
+            self.__statements.pop(id(connection), None)
+        return
+
+    def get_statement(self, connection: MySQLConnection, query: str) -> tuple:
+        """
+        (query, prepared cursor) of `query` on a connection that was acquired.
+        The cursor only skips preparing when it is given the very query object it prepared, so execute it with the returned one.
+
+        """
+        with self.__lock:
+            statements = self.__statements.setdefault(id(connection), OrderedDict())
+            statement  = statements.get(query)
+            if statement is not None:
+                statements.move_to_end(query)
+                self.__stats["prepared_hits"] += 1
+                return statement
+
+            self.__stats["prepared"] += 1
+            evicted = statements.popitem(last=False)[1] if len(statements) >= SQLPool_.STATEMENTS_MAX else None
+
+        # closing a prepared cursor deallocates its statement on the server
+        if evicted is not None:
+            evicted[1].close()
+
+        statement = (query, connection.cursor(prepared=True))
+        with self.__lock:
+            self.__statements[id(connection)][query] = statement
+        return statement
+
+    def __is_alive(self, connection: MySQLConnection, released: float) -> bool:
+        if time.time() - released < SQLPool_.PING_SECONDS:
+            return True
+        try:
+            self._ping(connection)
+            return True
+        except Exception:
+            return False
+
+    def acquire(self) -> MySQLConnection:
+        start_time = time.time()
+        waited     = False
+
+        while True:
+            try:
+                connection, released = self.__idle.get_nowait()
+            except Empty:
+                with self.__lock:
+                    can_open = self.__open < self.size
+                    if can_open:
+                        self.__open += 1
+
+                if can_open:
+                    try:
+                        connection = self._connect()
+                    except Exception:
+                        with self.__lock:
+                            self.__open -= 1
+                        raise
+                    self.__record(start_time, waited, opened=True)
+                    return connection
+
+                remaining = self.timeout - (time.time() - start_time)
+                waited    = True
+                try:
+                    connection, released = self.__idle.get(timeout=max(0.0, remaining))
+                except Empty:
+                    with self.__lock:
+                        self.__stats["timeouts"] += 1
+                    raise PoolError(f"No {self.dialect} connection free after {self.timeout}s, all {self.size} are in use")
+
+            if self.__is_alive(connection, released):
+                self.__record(start_time, waited)
+                return connection
+
+            with self.__lock:
+                self.__stats["dropped"] += 1
+            self.__discard(connection)
+
+    def release(self, connection: MySQLConnection) -> None:
+        try:
+            if connection.in_transaction:
+                connection.rollback()
+        except Exception:
+            self.__discard(connection)
+            return
+        self.__idle.put((connection, time.time()))
+        return
+
+    def close(self) -> None:
+        """Close the idle connections, the ones in use are closed as they are released."""
+        while True:
+            try:
+                connection, _ = self.__idle.get_nowait()
+            except Empty:
+                break
+            self.__discard(connection)
+        return
+
+######################################################################
+### STATS
+######################################################################
+
+    def __record(self, start_time: float, waited: bool, opened: bool = False) -> None:
+        wait = time.time() - start_time
+        with self.__lock:
+            self.__stats["acquires"]  += 1
+            self.__stats["opened"]    += int(opened)
+            if waited:
+                self.__stats["waits"]     += 1
+                self.__stats["wait_time"] += wait
+                self.__stats["wait_max"]   = max(self.__stats["wait_max"], wait)
+        return
+
+    def get_stats(self) -> dict:
+        """Returns {open, idle, acquires, opened, dropped, timeouts, waits, avg_wait_ms, max_wait_ms, prepared, prepared_hits} since the last reset."""
+        with self.__lock:
+            stats = dict(self.__stats)
+            stats["open"] = self.__open
+        stats["idle"]        = self.__idle.qsize()
+        stats["avg_wait_ms"] = round(1000 * stats["wait_time"] / stats["waits"], 1) if stats["waits"] > 0 else 0.0
+        stats["max_wait_ms"] = round(1000 * stats.pop("wait_max"), 1)
+        del stats["wait_time"]
+        return stats
+
+    def reset(self) -> None:
+        with self.__lock:
+            self.__stats = {"acquires": 0, "opened": 0, "dropped": 0, "timeouts": 0, "waits": 0, "wait_time": 0.0, "wait_max": 0.0, "prepared": 0, "prepared_hits": 0}
+        return
+
+    def summary(self) -> str:
+        s = self.get_stats()
+        return (f"{self.dialect} pool {s['open']}/{self.size} open ({s['idle']} idle), {s['acquires']} acquires, {s['opened']} opened, {s['dropped']} dropped, "
+                f"{s['waits']} waited avg {s['avg_wait_ms']}ms max {s['max_wait_ms']}ms, {s['timeouts']} timeouts, "
+                f"{s['prepared']} statements prepared, {s['prepared_hits']} reused")
+
+
+class SQLitePool(SQLPool):
+    def __init__(self, path: str, size: int = None, timeout: float = None) -> None:
+        """
+        The same pool over an embedded SQLite database file, for running on a single machine without a MySQL server.
+
+        The database is in WAL mode, so readers never wait on the writer and every connection of the pool can read at the same time.
+        Connections are in autocommit mode and begin() opens every write transaction with BEGIN IMMEDIATE:
+        sqlite3's implicit transactions leave DDL outside of them, explicit ones make a migration all or nothing.
+        The write lock is taken when the transaction begins instead of when it first writes,
+        so two writers queue for up to Storage_.SQLITE_BUSY_MS rather than deadlocking.
+        sqlite3 keeps compiled statements per connection itself, Storage_.SQLITE_STATEMENTS of them.
+
+        """
+        super().__init__(None, None, None, path, size, timeout)
+        self.dialect = Storage_.SQLITE
+        return
+
+    def _connect(self) -> sqlite3.Connection:
+        # a connection is only used by the thread that acquired it, but not always the one that opened it
+        connection = sqlite3.connect(self.db_name, timeout=Storage_.SQLITE_BUSY_MS / 1000, isolation_level=None,
+                                     check_same_thread=False, cached_statements=Storage_.SQLITE_STATEMENTS)
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=NORMAL")   # durable at every checkpoint, a crash can only lose the last commits
+        connection.execute(f"PRAGMA busy_timeout={Storage_.SQLITE_BUSY_MS}")
+        connection.execute(f"PRAGMA cache_size=-{Storage_.SQLITE_CACHE_KB}")
+        connection.execute(f"PRAGMA mmap_size={Storage_.SQLITE_MMAP_BYTES}")
+        connection.execute("PRAGMA temp_store=MEMORY")
+        return connection
+
+    def _ping(self, connection: sqlite3.Connection) -> None:
+        connection.execute("SELECT 1")
+        return
+
+    def translate(self, query: str) -> str:
+        return query.replace("%s", "?")
+
+    def begin(self, connection: sqlite3.Connection) -> None:
+        connection.execute("BEGIN IMMEDIATE")
+        return
+
+    def get_statement(self, connection: sqlite3.Connection, query: str) -> tuple:
+        """(query in ? style, cursor), the statement cache is sqlite3's."""
+        return self.translate(query), connection.cursor()
+
+
+
+######################################################################
+### SHARED
+######################################################################
+
+_pools:     dict = {} # (host, user, database) -> SQLPool
+_pool_lock: Lock = Lock()
+
+def get_sql_pool(host_name: str, user_name: str, user_password: str, db_name: str) -> SQLPool:
+    """ One pool per server, user and database in a process, created on first use. With Storage_.SQLITE, one pool for the database file. """
+    if Storage_.BACKEND == Storage_.SQLITE:
+        key = (Storage_.SQLITE, Storage_.SQLITE_FILE)
+    else:
+        key = (host_name, user_name, db_name)
+
+    with _pool_lock:
+        if key not in _pools:
+            _pools[key] = SQLitePool(Storage_.SQLITE_FILE) if Storage_.BACKEND == Storage_.SQLITE else SQLPool(host_name, user_name, user_password, db_name)
+        return _pools[key]
+
+def get_sql_pools() -> list:
+    with _pool_lock:
+        return list(_pools.values())
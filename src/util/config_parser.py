@@ -11,20 +11,18 @@ from bot_features.low_level.kraken_enums import *
 class ConfigParser():
     def assign_enum_values() -> dict:
         """Assign values to the enums"""
-        reg_list = ['ETC',  'ETH',  'LTC',  'MLN',  'REP',  'XBT',  'XDG',  'XLM',  'XMR',  'XRP',  'ZEC' ]
-        
         if os.path.exists(CONFIG_JSON):
             with open(CONFIG_JSON) as file:
                 try:
                     config = json.load(file)[ConfigKeys.CONFIG]
                 
+                    # symbols are turned into kraken's asset codes (ETH -> XETH) by the symbol resolver once it is built
                     for symbol in config[ConfigKeys.BUY_SET]:
-                        if symbol in reg_list:
-                            Buy_.SET.add("X" + symbol)
-                        else:
-                            Buy_.SET.add(symbol)
+                        Buy_.SET.add(symbol.upper())
                     
                     Buy_.SET = sorted(Buy_.SET)
+                    Buy_.WORKERS = max(1, int(config.get(ConfigKeys.BUY_WORKERS, Buy_.WORKERS)))
+                    Signal_.SOURCE = config.get(ConfigKeys.SIGNAL_SOURCE, Signal_.SOURCE).lower()
                     
                     # DCA
                     DCA_.TARGET_PROFIT_PERCENT          = float(config[ConfigKeys.DCA_TARGET_PROFIT_PERCENT])
@@ -33,6 +31,23 @@ class ConfigParser():
                     DCA_.SAFETY_ORDERS_ACTIVE_MAX       = int  (config[ConfigKeys.DCA_SAFETY_ORDERS_ACTIVE_MAX])
                     DCA_.SAFETY_ORDER_STEP_SCALE        = float(config[ConfigKeys.DCA_SAFETY_ORDER_STEP_SCALE])
                     DCA_.SAFETY_ORDER_PRICE_DEVIATION   = float(config[ConfigKeys.DCA_SAFETY_ORDER_PRICE_DEVIATION])
+
+                    # Transport (optional)
+                    Transport_.POOL_MAXSIZE             = int  (config.get(ConfigKeys.TRANSPORT_POOL_MAXSIZE, Transport_.POOL_MAXSIZE))
+                    Transport_.TIMEOUT                  = float(config.get(ConfigKeys.TRANSPORT_TIMEOUT,      Transport_.TIMEOUT))
+                    Transport_.RETRIES_MAX              = int  (config.get(ConfigKeys.TRANSPORT_RETRIES_MAX,  Transport_.RETRIES_MAX))
+
+                    # MySQL connection pool (optional)
+                    SQLPool_.SIZE                       = int  (config.get(ConfigKeys.SQL_POOL_SIZE,    SQLPool_.SIZE))
+                    SQLPool_.TIMEOUT                    = float(config.get(ConfigKeys.SQL_POOL_TIMEOUT, SQLPool_.TIMEOUT))
+
+                    # Storage (optional)
+                    Storage_.BACKEND                    = str  (config.get(ConfigKeys.STORAGE_BACKEND, Storage_.BACKEND)).lower()
+                    Storage_.SQLITE_FILE                = str  (config.get(ConfigKeys.SQLITE_FILE,     Storage_.SQLITE_FILE))
+
+                    # Rate limit (optional)
+                    RateLimit_.TIER                     = str  (config.get(ConfigKeys.KRAKEN_TIER, RateLimit_.TIER)).lower()
+                    G.rate_limiter.set_tier(RateLimit_.TIER)
                 except Exception as e:
                     G.log.print_and_log(e=e, error_type=type(e).__name__, filename=__file__, tb_lineno=e.__traceback__.tb_lineno)
                     sys.exit()
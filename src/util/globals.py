@@ -1,12 +1,23 @@
 "globals.py - Uses global variables that are shared between files in order to write to the log file."
 
-from util.log  import Log
-from threading import Event
+from util.log                                      import Log
+from threading                                     import Event
+from bot_features.low_level.kraken_rate_limiter    import RateLimiter
+from bot_features.low_level.kraken_cache           import TTLCache
+from bot_features.low_level.kraken_asset_pairs     import AssetPairIndex
+from bot_features.low_level.kraken_symbol_resolver import SymbolResolver
+from bot_features.low_level.kraken_trade_history   import TradeHistory
+from bot_features.low_level.kraken_enums           import Cache_
 
 
 class Globals:
-    event: Event = Event()
-    log:   Log   = Log()
+    event:         Event          = Event()
+    log:           Log            = Log()
+    rate_limiter:  RateLimiter    = RateLimiter()
+    public_cache:  TTLCache       = TTLCache(Cache_.MAX_SIZE)
+    asset_pairs:   AssetPairIndex = AssetPairIndex()
+    symbols:       SymbolResolver = SymbolResolver()
+    trade_history: TradeHistory   = TradeHistory()
     
 
 # Global variable "G" is shared between files and classes
@@ -0,0 +1,6 @@
+"""conftest.py: Puts src on the import path, the bot's modules import each other from there."""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
@@ -0,0 +1,38 @@
+"""test_float_columns.py: prices and quantities read from FLOAT columns over the binary protocol floor to the tick they were stored at."""
+
+import struct
+
+from types                                  import SimpleNamespace
+from mysql.connector.constants              import FieldType
+from bot_features.low_level.kraken_rest_api import KrakenRestAPI
+from my_sql.sql                             import SQLResult
+
+
+def as_float32(value: float) -> float:
+    """What a prepared statement reads from a FLOAT column holding `value`."""
+    return struct.unpack("<f", struct.pack("<f", value))[0]
+
+
+def cursor(description: list, rows: list) -> SimpleNamespace:
+    return SimpleNamespace(description=description, fetchall=lambda: rows, rowcount=-1, lastrowid=None)
+
+
+def test_float_columns_read_at_their_precision():
+    description = [("symbol_pair", FieldType.VAR_STRING), ("quantity", FieldType.FLOAT), ("price", FieldType.FLOAT), ("profit", FieldType.DOUBLE)]
+    rows        = [("XBTUSD", as_float32(2.3), as_float32(45.3), 0.1 + 0.2), ("ETHUSD", as_float32(0.7), as_float32(65432.1), 1.5)]
+
+    result = SQLResult(cursor(description, rows))
+
+    assert result.fetchall() == [("XBTUSD", 2.3, 45.3, 0.1 + 0.2), ("ETHUSD", 0.7, 65432.1, 1.5)]
+
+
+def test_round_decimals_down_keeps_the_last_tick():
+    api  = object.__new__(KrakenRestAPI)
+    rows = SQLResult(cursor([("quantity", FieldType.FLOAT), ("price", FieldType.FLOAT)], [(as_float32(2.3), as_float32(45.3))])).fetchall()
+
+    assert api.round_decimals_down(rows[0][0], 2) == 2.3
+    assert api.round_decimals_down(rows[0][1], 2) == 45.3
+    assert api.round_decimals_down(2.3, 2)        == 2.3
+    assert api.round_decimals_down(0.7, 3)        == 0.7
+    assert api.round_decimals_down(2.299, 2)      == 2.29
+    assert api.round_decimals_down(1.23456789999, 8) == 1.23456789
@@ -0,0 +1,69 @@
+"""test_indicator_engine.py: IndicatorEngine's weekly candles, short histories and unscored pairs."""
+
+import datetime
+import warnings
+import numpy as np
+
+from bot_features.low_level.kraken_enums import *
+from bot_features.indicator_engine       import IndicatorEngine
+
+DAY = 24 * 60 * 60
+
+
+def utc(*args) -> float:
+    return datetime.datetime(*args, tzinfo=datetime.timezone.utc).timestamp()
+
+
+def ohlc(pair: str, start: float, count: int, seconds: int) -> dict:
+    """A raw OHLC response of `count` candles rising by 1 from `start`."""
+    rows = [[start + i * seconds, 100 + i, 101 + i, 99 + i, 100.5 + i, 100 + i, 10, 5] for i in range(count)]
+    return {Dicts.ERROR: [], Dicts.RESULT: {pair: rows, "last": start + count * seconds}}
+
+
+def test_weekly_candles_start_on_monday():
+    requested = []
+    def fetch_ohlc(pairs, minutes):
+        requested.append(minutes)
+        # thursday 2024-03-07 to wednesday 2024-03-20
+        return [ohlc(pair, utc(2024, 3, 7), 14, DAY) for pair in pairs]
+
+    weeks = IndicatorEngine(fetch_ohlc).get_candles(["XBTUSD"], "1W")["XBTUSD"]
+
+    assert requested == [1440]
+    assert [datetime.datetime.fromtimestamp(t, datetime.timezone.utc).date() for t in weeks[:, 0]] == \
+           [datetime.date(2024, 3, 4), datetime.date(2024, 3, 11), datetime.date(2024, 3, 18)]
+    # thursday to sunday, monday to sunday, monday to wednesday
+    assert list(weeks[:, 4]) == [103.5, 110.5, 113.5]
+    assert list(weeks[:, 6]) == [40, 70, 30]
+
+
+def candles(count: int) -> np.ndarray:
+    return np.array(ohlc("XBTUSD", utc(2024, 3, 7), count, DAY)[Dicts.RESULT]["XBTUSD"], dtype=float)[:, :7]
+
+
+def test_unscored_pairs_are_nan_without_warnings():
+    engine   = IndicatorEngine(None)
+    no_price = candles(50)
+    no_price[:, 1:] = np.nan
+
+    with warnings.catch_warnings():
+        warnings.simplefilter("error")
+        scores = engine.get_scores([no_price, candles(50)])
+
+    assert np.isnan(scores[0]) and not np.isnan(scores[1])
+    assert engine.classify(scores[0]) is None
+
+
+def test_recommend_leaves_unscored_pairs_empty():
+    engine = IndicatorEngine(lambda pairs, minutes: [ohlc(pair, utc(2024, 3, 7), 2, DAY) for pair in pairs])
+    assert engine.recommend(["XBTUSD"], "1d") == {"XBTUSD": []}
+    assert engine.recommend(["XBTUSD"], "1M") is None
+
+
+def test_classify_thresholds():
+    engine = IndicatorEngine(None)
+    assert engine.classify(0.6)  == Signal_.STRONG_BUY
+    assert engine.classify(0.2)  == Signal_.BUY
+    assert engine.classify(-0.1) == Signal_.NEUTRAL
+    assert engine.classify(-0.3) == Signal_.SELL
+    assert engine.classify(-0.6) == Signal_.STRONG_SELL
@@ -0,0 +1,41 @@
+"""test_limit_orders.py: limit_orders returns one result per order, also when AddOrderBatch leaves some out."""
+
+from types                                  import SimpleNamespace
+from util.globals                           import G
+from bot_features.low_level.kraken_enums    import *
+from bot_features.low_level.kraken_bot_base import KrakenBotBase
+
+
+ORDERS = [(1.0, 99.0), (2.0, 98.0), (3.0, 97.0)]
+
+def make_bot(monkeypatch, batch_orders: list, open_orders: dict = None) -> tuple:
+    bot  = object.__new__(KrakenBotBase)
+    sent = []
+    monkeypatch.setattr(G.asset_pairs, "get", lambda pair: SimpleNamespace(lot_decimals=8, pair_decimals=1))
+    bot.add_order_batch = lambda batch, pair: sent.append(batch) or {Dicts.ERROR: [], Dicts.RESULT: {Data.ORDERS: batch_orders}}
+    bot.get_open_orders = lambda trades, userref: {Dicts.ERROR: [], Dicts.RESULT: {Dicts.OPEN: open_orders or {}}}
+    return bot, sent
+
+def order(price: str) -> dict:
+    return {Dicts.DESCR: {Data.PRICE: price, Dicts.ORDER: f"buy @ limit {price}"}}
+
+
+def test_results_follow_the_batch_order(monkeypatch):
+    batch_orders = [{Data.TXID: "O1", Dicts.DESCR: {}}, {Dicts.ERROR: KError.INSUFFICIENT_FUNDS}, {Data.TXID: "O3", Dicts.DESCR: {}}]
+    bot, sent    = make_bot(monkeypatch, batch_orders)
+
+    results = bot.limit_orders(Data.BUY, ORDERS, "XXBTZUSD")
+
+    assert [r.get(Dicts.RESULT, {}).get(Data.TXID) for r in results] == [["O1"], None, ["O3"]]
+    assert results[1][Dicts.ERROR] == [KError.INSUFFICIENT_FUNDS]
+    assert len({order[Data.USER_REF] for order in sent[0]}) == 1
+
+def test_short_answer_is_matched_by_price(monkeypatch):
+    bot, _ = make_bot(monkeypatch, [{Data.TXID: "O1", Dicts.DESCR: {}}], {"O3": order("97.0"), "O1": order("99.0")})
+
+    results = bot.limit_orders(Data.BUY, ORDERS, "XXBTZUSD")
+
+    assert len(results) == len(ORDERS)
+    assert results[0][Dicts.RESULT][Data.TXID] == ["O1"]
+    assert results[1][Dicts.ERROR] == [KError.BATCH_UNMATCHED]
+    assert results[2][Dicts.RESULT][Data.TXID] == ["O3"]
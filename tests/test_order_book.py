@@ -0,0 +1,53 @@
+"""test_order_book.py: OrderBook checksums against kraken's algorithm computed on the strings it sends."""
+
+import zlib
+
+from bot_features.low_level.kraken_order_book import OrderBook
+
+
+ASKS = [["0.05005", "0.00000500"], ["0.05010", "0.00000500"], ["0.05015", "0.00000500"], ["0.05020", "0.00000500"], ["0.05025", "0.00000500"],
+        ["0.05030", "0.00000500"], ["0.05035", "0.00000500"], ["0.05040", "0.00000500"], ["0.05045", "0.00000500"], ["0.05050", "0.00000500"]]
+BIDS = [["0.05000", "0.00000500"], ["0.04995", "0.00000500"], ["0.04990", "0.00000500"], ["0.04980", "0.00000500"], ["0.04975", "0.00000500"],
+        ["0.04970", "0.00000500"], ["0.04965", "0.00000500"], ["0.04960", "0.00000500"], ["0.04955", "0.00000500"], ["0.04950", "0.00000500"]]
+
+def kraken_checksum(asks: list, bids: list) -> int:
+    """The documented algorithm: top 10 asks low to high, then top 10 bids high to low, '.' removed and leading zeros stripped."""
+    def text(levels: list) -> str:
+        return "".join(price.replace(".", "").lstrip("0") + volume.replace(".", "").lstrip("0") for price, volume in levels[:10])
+    return zlib.crc32((text(sorted(asks, key=lambda l: float(l[0]))) + text(sorted(bids, key=lambda l: -float(l[0])))).encode())
+
+def make_book() -> OrderBook:
+    book = OrderBook("XETHXXBT", 10)
+    book.apply_snapshot({"as": [level + ["0"] for level in ASKS], "bs": [level + ["0"] for level in BIDS]}, 0)
+    return book
+
+
+def test_update_with_matching_checksum():
+    book = make_book()
+    asks = [["0.05001", "0.00000200"]] + ASKS[:9]
+
+    assert book.apply_update([{"a": [["0.05001", "0.00000200", "0"]], "c": str(kraken_checksum(asks, BIDS))}])
+    assert book.synced
+    assert book.best_ask() == 0.05001
+
+def test_removed_and_truncated_levels_leave_the_checksum():
+    book = make_book()
+    bids = [["0.04999", "0.00001000"]] + BIDS[1:] + [["0.04945", "0.00000500"]]
+
+    update = [{"b": [["0.05000", "0.00000000", "0"], ["0.04999", "0.00001000", "0"], ["0.04945", "0.00000500", "0"]],
+               "c": str(kraken_checksum(ASKS, bids))}]
+    assert book.apply_update(update)
+    assert book.best_bid() == 0.04999
+
+def test_mismatch_is_reported_once_until_the_next_snapshot():
+    book = make_book()
+
+    assert not book.apply_update([{"a": [["0.05001", "0.00000200", "0"]], "c": "1"}])
+    assert not book.synced and book.checksum_failures == 1
+
+    # ignored until the resubscribe's snapshot, so __on_book resubscribes only once
+    assert book.apply_update([{"a": [["0.05002", "0.00000200", "0"]], "c": "2"}])
+    assert book.checksum_failures == 1
+
+    book.apply_snapshot({"as": [level + ["0"] for level in ASKS], "bs": [level + ["0"] for level in BIDS]}, 1)
+    assert book.synced and book.best_ask() == 0.05005
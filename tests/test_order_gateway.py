@@ -0,0 +1,48 @@
+"""test_order_gateway.py: Unanswered websocket orders are looked up by userref before they are reported as failed."""
+
+from types                                   import SimpleNamespace
+from util.globals                            import G
+from bot_features.low_level.kraken_enums     import *
+from bot_features.low_level.kraken_websocket import KrakenOrderGateway
+from bot_features.low_level.kraken_bot_base  import KrakenBotBase
+
+
+def test_timeout_repeats_the_userref(monkeypatch):
+    sent    = []
+    gateway = KrakenOrderGateway(lambda: {})
+    gateway.connected.set()
+    monkeypatch.setattr(gateway, "send", lambda payload: sent.append(payload) or True)
+    monkeypatch.setattr(G.asset_pairs, "get", lambda pair: SimpleNamespace(wsname="XBT/USD", lot_decimals=8, pair_decimals=1))
+    monkeypatch.setattr(WebSocket_, "ORDER_TIMEOUT", 0.01)
+
+    result = gateway.add_order(Data.LIMIT, Data.BUY, 0.5, "XXBTZUSD", 100.0)
+
+    assert result[Dicts.ERROR] == [KError.WS_TIMEOUT]
+    assert result[Data.USER_REF] == int(sent[0][Data.USER_REF])
+
+def bot_with(result: dict, open_orders: dict, closed_orders: dict) -> KrakenBotBase:
+    bot         = object.__new__(KrakenBotBase)
+    bot.gateway = SimpleNamespace(add_order=lambda *args: result)
+    bot.get_open_orders   = lambda trades, userref: {Dicts.ERROR: [], Dicts.RESULT: {Dicts.OPEN: open_orders}}
+    bot.get_closed_orders = lambda userref: {Dicts.ERROR: [], Dicts.RESULT: {Dicts.CLOSED: closed_orders}}
+    return bot
+
+def test_unanswered_order_that_was_placed_is_returned_as_placed():
+    order = {Dicts.DESCR: {Dicts.ORDER: "buy 0.5 XBTUSD @ limit 100.0"}}
+    bot   = bot_with({Dicts.ERROR: [KError.WS_TIMEOUT], Data.USER_REF: 7}, {"OABC": order}, {})
+
+    result = bot.limit_order(Data.BUY, "0.5", "XXBTZUSD", "100.0")
+
+    assert result[Dicts.ERROR] == []
+    assert result[Dicts.RESULT][Data.TXID] == ["OABC"]
+
+def test_unanswered_market_order_is_found_in_closed_orders():
+    order = {Dicts.DESCR: {Dicts.ORDER: "buy 0.5 XBTUSD @ market"}}
+    bot   = bot_with({Dicts.ERROR: [KError.WS_DISCONNECTED], Data.USER_REF: 7}, {}, {"OMKT": order})
+
+    assert bot.market_order(Data.BUY, "0.5", "XXBTZUSD")[Dicts.RESULT][Data.TXID] == ["OMKT"]
+
+def test_unanswered_order_that_was_not_placed_stays_failed():
+    bot = bot_with({Dicts.ERROR: [KError.WS_TIMEOUT], Data.USER_REF: 7}, {}, {})
+
+    assert bot.limit_order(Data.BUY, "0.5", "XXBTZUSD", "100.0")[Dicts.ERROR] == [KError.WS_TIMEOUT]
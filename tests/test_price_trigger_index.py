@@ -0,0 +1,53 @@
+"""test_price_trigger_index.py: PriceTriggerIndex.check fires exactly the levels a tick crossed."""
+
+from bot_features.low_level.kraken_enums import *
+from bot_features.price_trigger_index    import PriceTriggerIndex
+
+
+def make_index() -> PriceTriggerIndex:
+    index = PriceTriggerIndex()
+    index.replace("XXBTZUSD", Trade.BUY,  [(99.0, "B1"), (98.0, "B2"), (97.0, "B3")])
+    index.replace("XXBTZUSD", Trade.SELL, [(101.0, "S1")])
+    return index
+
+
+def test_first_tick_only_sets_the_previous_prices():
+    index = make_index()
+    assert index.check("XXBTZUSD", 90.0, 110.0) == []
+
+def test_ask_falling_fires_the_buy_levels_it_crossed():
+    index = make_index()
+    index.check("XXBTZUSD", 100.0, 99.5)
+
+    assert index.check("XXBTZUSD", 98.0, 97.5) == [(Trade.BUY, 98.0, "B2"), (Trade.BUY, 99.0, "B1")]
+    # staying at a level doesn't fire it again
+    assert index.check("XXBTZUSD", 98.0, 97.5) == []
+    assert index.fired == 2
+
+def test_bid_rising_fires_the_sell_levels_it_crossed():
+    index = make_index()
+    index.check("XXBTZUSD", 100.5, 100.0)
+
+    assert index.check("XXBTZUSD", 101.5, 101.0) == [(Trade.SELL, 101.0, "S1")]
+    assert index.check("XXBTZUSD", 100.5, 100.0) == []
+
+def test_callbacks_and_disarm():
+    index = make_index()
+    calls = []
+    index.add_callback(lambda pair, side, price, key: calls.append(key))
+    index.check("XXBTZUSD", 100.0, 99.5)
+
+    assert index.disarm("B1")
+    assert not index.disarm("B1")
+    index.check("XXBTZUSD", 96.0, 95.5)
+    assert calls == ["B3", "B2"]
+    assert len(index) == 3
+
+def test_arm_moves_a_level_and_pairs_are_separate():
+    index = make_index()
+    index.arm("XXBTZUSD", Trade.BUY, 95.0, "B1")
+    index.arm("XETHZUSD", Trade.BUY, 10.0, "E1")
+
+    assert sorted(index.get_levels("XXBTZUSD")) == [95.0, 97.0, 98.0, 101.0]
+    index.clear("XXBTZUSD")
+    assert index.get_levels("XXBTZUSD") == [] and index.get_levels("XETHZUSD") == [10.0]
@@ -0,0 +1,49 @@
+"""test_signal_cache.py: SignalCache keeps a recommendation until the next candle of its interval opens."""
+
+import datetime
+
+from tradingview_ta                      import Interval
+from bot_features.low_level.kraken_enums import *
+from bot_features.tradingview            import SignalCache, TVData
+
+
+def utc(*args) -> float:
+    return datetime.datetime(*args, tzinfo=datetime.timezone.utc).timestamp()
+
+
+def test_minute_and_hour_candles_are_aligned_to_the_epoch():
+    cache = SignalCache()
+    assert cache.get_next_candle(Interval.INTERVAL_5_MINUTES, utc(2024, 3, 6, 10, 7, 30)) == utc(2024, 3, 6, 10, 10)
+    assert cache.get_next_candle(Interval.INTERVAL_4_HOURS,   utc(2024, 3, 6, 10, 7, 30)) == utc(2024, 3, 6, 12)
+    assert cache.get_next_candle(Interval.INTERVAL_1_DAY,     utc(2024, 3, 6, 23, 59, 59)) == utc(2024, 3, 7)
+
+def test_weeks_start_on_monday():
+    cache = SignalCache()
+    # wednesday, sunday night and monday midnight itself
+    assert cache.get_next_candle(Interval.INTERVAL_1_WEEK, utc(2024, 3, 6, 12)) == utc(2024, 3, 11)
+    assert cache.get_next_candle(Interval.INTERVAL_1_WEEK, utc(2024, 3, 10, 23, 59)) == utc(2024, 3, 11)
+    assert cache.get_next_candle(Interval.INTERVAL_1_WEEK, utc(2024, 3, 11)) == utc(2024, 3, 18)
+    assert datetime.datetime.fromtimestamp(cache.get_next_candle(Interval.INTERVAL_1_WEEK, utc(2024, 3, 6)), datetime.timezone.utc).weekday() == 0
+
+def test_months_start_on_the_first():
+    cache = SignalCache()
+    assert cache.get_next_candle(Interval.INTERVAL_1_MONTH, utc(2024, 2, 29, 12)) == utc(2024, 3, 1)
+    assert cache.get_next_candle(Interval.INTERVAL_1_MONTH, utc(2024, 12, 31, 23)) == utc(2025, 1, 1)
+
+def test_ttl_runs_to_the_next_candle_plus_the_delay():
+    cache = SignalCache()
+    ttl   = cache.get_ttl(Interval.INTERVAL_1_HOUR)
+    assert TVData.CANDLE_DELAY < ttl <= 3600 + TVData.CANDLE_DELAY
+
+def test_fetch_asks_the_source_once_per_candle():
+    cache = SignalCache()
+    calls = []
+
+    def source(symbol_pairs: list, interval: str) -> dict:
+        calls.append(list(symbol_pairs))
+        return {symbol_pair: Signal_.BUY for symbol_pair in symbol_pairs if symbol_pair != "UNKNOWNUSD"}
+
+    cache.set_source(source)
+    assert cache.fetch(["XBTUSD", "UNKNOWNUSD"], Interval.INTERVAL_1_HOUR) == {"XBTUSD": Signal_.BUY, "UNKNOWNUSD": []}
+    assert cache.fetch(["XBTUSD", "ETHUSD"], Interval.INTERVAL_1_HOUR) == {"XBTUSD": Signal_.BUY, "ETHUSD": Signal_.BUY}
+    assert calls == [["XBTUSD", "UNKNOWNUSD"], ["ETHUSD"]]
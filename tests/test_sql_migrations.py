@@ -0,0 +1,97 @@
+"""test_sql_migrations.py: a migration that fails part way is applied again from where it stopped on the next start."""
+
+import re
+import pytest
+import my_sql.sql_migrations as sql_migrations
+
+from types                               import SimpleNamespace
+from util.globals                        import G
+from bot_features.low_level.kraken_enums import *
+from my_sql.sql                          import SQL
+from my_sql.sql_migrations               import SQLMigrations
+
+
+@pytest.fixture(autouse=True)
+def quiet_log(monkeypatch):
+    monkeypatch.setattr(G.log, "print_and_log", lambda *args, **kwargs: None)
+
+
+@pytest.fixture
+def sqlite_sql(monkeypatch, tmp_path):
+    # pools are shared per database file, a new file per test gets a new pool
+    monkeypatch.setattr(Storage_, "BACKEND",     Storage_.SQLITE)
+    monkeypatch.setattr(Storage_, "SQLITE_FILE", str(tmp_path / "dca.sqlite3"))
+    return SQL()
+
+
+def table_names(sql) -> set:
+    return {row[0] for row in sql.con_query("SELECT name FROM sqlite_master WHERE type IN ('table', 'index')").fetchall()}
+
+
+def test_sqlite_failed_migration_leaves_nothing_and_reruns(monkeypatch, sqlite_sql):
+    migrations = SQLMigrations(sqlite_sql)
+    version    = migrations.migrate()
+
+    broken = (version + 1, "broken", ["CREATE TABLE extra (a INT)", "CREATE INDEX ix_extra_a ON missing (a)"])
+    monkeypatch.setattr(sql_migrations, "MIGRATIONS", sql_migrations.MIGRATIONS + [broken])
+    with pytest.raises(Exception):
+        migrations.migrate()
+
+    assert migrations.get_version() == version
+    assert "extra" not in table_names(sqlite_sql)
+
+    fixed = (version + 1, "fixed", ["CREATE TABLE extra (a INT)", "CREATE INDEX ix_extra_a ON extra (a)"])
+    monkeypatch.setattr(sql_migrations, "MIGRATIONS", sql_migrations.MIGRATIONS[:-1] + [fixed])
+    assert migrations.migrate() == version + 1
+    assert migrations.get_version() == version + 1
+    assert {"extra", "ix_extra_a"} <= table_names(sqlite_sql)
+
+
+class FakeMySQL():
+    """Commits every statement on its own like MySQL DDL, and fails the statement given to fail_on once."""
+    def __init__(self, fail_on: str) -> None:
+        self.pool     = SimpleNamespace(dialect=Storage_.MYSQL)
+        self.fail_on  = fail_on
+        self.indexes  = set()
+        self.versions = []
+        self.run      = []
+        return
+
+    def con_update(self, query: str, params: tuple = None) -> int:
+        if query == self.fail_on:
+            self.fail_on = None
+            raise Exception("Lost connection to MySQL server during query")
+        self.run.append(query)
+        index = re.search(r"CREATE INDEX (\w+)", query)
+        if index is not None:
+            if index.group(1) in self.indexes:
+                raise Exception(f"Duplicate key name '{index.group(1)}'")
+            self.indexes.add(index.group(1))
+        if query.startswith("INSERT INTO schema_version"):
+            self.versions.append(params[0])
+        return 1
+
+    def con_query(self, query: str, params: tuple = None) -> SimpleNamespace:
+        if "information_schema.statistics" in query:
+            rows = [(1,)] if params[0] in self.indexes else []
+        else:
+            rows = [(max(self.versions, default=None),)]
+        return SimpleNamespace(rowcount=len(rows), fetchone=lambda: rows[0])
+
+
+def test_mysql_failed_migration_resumes_after_its_applied_statements(monkeypatch):
+    statements = ["CREATE INDEX ix_a ON safety_orders (a)", "CREATE INDEX ix_b ON safety_orders (b)", "CREATE INDEX ix_c ON safety_orders (c)"]
+    monkeypatch.setattr(sql_migrations, "MIGRATIONS", [(1, "indexes", statements)])
+    sql        = FakeMySQL(fail_on=statements[1])
+    migrations = SQLMigrations(sql)
+
+    with pytest.raises(Exception):
+        migrations.migrate()
+    assert migrations.get_version() == 0
+    assert sql.indexes == {"ix_a"}
+
+    sql.run.clear()
+    assert migrations.migrate() == 1
+    assert sql.indexes == {"ix_a", "ix_b", "ix_c"}
+    assert statements[0] not in sql.run
+    assert migrations.get_version() == 1
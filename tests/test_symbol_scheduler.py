@@ -0,0 +1,57 @@
+"""test_symbol_scheduler.py: Due order, schedule_sooner and the wake-up of SymbolScheduler.wait."""
+
+import threading
+import time
+
+from bot_features.low_level.kraken_enums import *
+from bot_features.symbol_scheduler       import SymbolScheduler
+
+
+def test_pop_due_returns_due_symbols_earliest_first():
+    scheduler = SymbolScheduler()
+    scheduler.schedule("XBT", 0)
+    scheduler.schedule("ETH", -10) # no earlier than now
+    scheduler.schedule("ADA", 60)
+
+    assert scheduler.pop_due() == ["XBT", "ETH"]
+    assert scheduler.pop_due() == []
+    assert len(scheduler) == 1
+
+def test_schedule_replaces_and_schedule_sooner_only_moves_up():
+    scheduler = SymbolScheduler()
+    scheduler.schedule("XBT", 0)
+    scheduler.schedule("XBT", 60)
+    assert scheduler.pop_due() == []
+
+    scheduler.schedule_sooner("XBT", 120)
+    assert 55 < scheduler.get_next_wait() <= 60
+
+    scheduler.schedule_sooner("XBT", 0)
+    assert scheduler.pop_due() == ["XBT"]
+    assert scheduler.get_next_wait() is None
+
+def test_wake_during_a_check_survives_the_reschedule():
+    scheduler = SymbolScheduler()
+    scheduler.schedule("XBT", 0)
+    assert scheduler.pop_due() == ["XBT"]
+
+    # the fill thread wakes the symbol while it is checked, then the check reschedules it
+    scheduler.schedule_sooner("XBT", 0)
+    scheduler.schedule_sooner("XBT", 300)
+    assert scheduler.pop_due() == ["XBT"]
+
+def test_wait_returns_when_a_symbol_is_moved_up():
+    scheduler = SymbolScheduler()
+    scheduler.schedule("XBT", 300)
+    threading.Timer(0.05, lambda: scheduler.schedule_sooner("XBT", 0)).start()
+
+    start_time = time.time()
+    scheduler.wait(5)
+    assert time.time() - start_time < 2
+    assert scheduler.pop_due() == ["XBT"]
+
+def test_get_interval_is_bounded():
+    scheduler = SymbolScheduler()
+    assert scheduler.get_interval("XXBTZUSD", 100.0, []) == Schedule_.IDLE_SECONDS
+    assert scheduler.get_interval("XXBTZUSD", 100.0, [99.99]) == Schedule_.MIN_SECONDS
+    assert scheduler.get_interval("XXBTZUSD", 100.0, [50.0]) == Schedule_.MAX_SECONDS
@@ -0,0 +1,66 @@
+"""test_trade_history.py: First sync seeding, cursor and pruning of TradeHistory."""
+
+import time
+
+from bot_features.low_level.kraken_enums         import *
+from bot_features.low_level.kraken_trade_history import TradeHistory
+
+
+def trade(order_txid: str, seconds_ago: float) -> dict:
+    return {Data.ORDER_TXID: order_txid, Data.PAIR: "XXBTZUSD", Dicts.TIME: time.time() - seconds_ago}
+
+def response(trades: dict) -> dict:
+    return {Dicts.ERROR: [], Dicts.RESULT: {Data.TRADES: trades, Dicts.COUNT: len(trades)}}
+
+
+def test_first_sync_starts_at_the_oldest_open_order(tmp_path):
+    history = TradeHistory(str(tmp_path / "trades.json"))
+    starts  = []
+    opened  = time.time() - 90 * 86400
+    trades  = {"T1": trade("O1", 80 * 86400)}
+
+    def fetch(start, ofs):
+        starts.append(start)
+        return response(trades)
+
+    assert history.sync(fetch, lambda: opened)
+    assert starts == [opened - TradeHistory_.OVERLAP_SECONDS]
+    assert history.has_filled("O1")
+
+    # later syncs go on from the newest trade and don't ask for the seed again
+    assert history.sync(fetch, lambda: 1 / 0)
+    assert starts[1] == trades["T1"][Dicts.TIME] - TradeHistory_.OVERLAP_SECONDS
+
+def test_first_sync_without_open_orders_only_reads_new_trades(tmp_path):
+    history = TradeHistory(str(tmp_path / "trades.json"))
+    starts  = []
+
+    def fetch(start, ofs):
+        starts.append(start)
+        return response({})
+
+    assert history.sync(fetch)
+    assert time.time() - starts[0] <= TradeHistory_.OVERLAP_SECONDS + 5
+    assert not (tmp_path / "trades.json").exists()
+
+def test_failed_seed_leaves_the_history_unsynced(tmp_path):
+    history = TradeHistory(str(tmp_path / "trades.json"))
+
+    def get_since():
+        raise Exception("QueryOrders failed")
+
+    assert not history.sync(lambda start, ofs: response({}), get_since)
+    assert history.cursor == 0
+
+def test_prune_keeps_open_orders_and_the_overlap(tmp_path):
+    history = TradeHistory(str(tmp_path / "trades.json"))
+    trades  = {"OLD": trade("DONE", 3600), "OPEN": trade("WAITING", 3600), "NEW": trade("DONE", 0)}
+    history.sync(lambda start, ofs: response(trades), lambda: time.time() - 7200)
+
+    assert history.prune({"WAITING"}) == 1
+    assert len(history) == 2
+    assert history.has_filled("WAITING")
+    assert [t[Dicts.TIME] for t in history.get_order_trades("DONE")] == [trades["NEW"][Dicts.TIME]]
+
+    reloaded = TradeHistory(str(tmp_path / "trades.json"))
+    assert reloaded.load() and len(reloaded) == 2